@@ -0,0 +1,689 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+技术指标增量计算内核
+===================
+将策略使用的均线、RSI、MACD、KDJ、ATR、ADX和成交量均值写成纯标量运算，
+全部状态保存在一个float64数组中，每根K线只做O(1)更新。
+
+安装了numba时以 @njit(cache=True) 编译为本地代码；
+未安装时装饰器原样返回函数，以纯Python运行，计算结果相同。
+
+使用方法:
+    params = make_params(fast_window=10, slow_window=20, ...)
+    state = warmup_state(close_array, high_array, low_array, volume_array, params)
+    values = indicator_values(state)
+    values = step(state, close, high, low, volume)   # 每根新K线调用一次
+    series = indicator_series(close_array, high_array, low_array, volume_array, params)  # 整段序列
+
+指标数值约定与TA-Lib一致 (EMA与Wilder平均以前n个值的简单平均为初值)。
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """numba不可用时的替代装饰器，原样返回被装饰的函数"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
+
+
+# 参数下标 (参数保存在状态数组的最前面，step无需额外传参)
+P_FAST = 0
+P_SLOW = 1
+P_RSI = 2
+P_MACD_FAST = 3
+P_MACD_SLOW = 4
+P_MACD_SIGNAL = 5
+P_K = 6
+P_SLOWING = 7
+P_D = 8
+P_ATR = 9
+P_ADX = 10
+P_VOLUME = 11
+N_PARAMS = 12
+
+# 状态下标
+S_BARS = 12            # 已处理的K线数量
+S_PREV_HIGH = 13
+S_PREV_LOW = 14
+S_PREV_CLOSE = 15
+S_FAST_SUM = 16        # 快速均线窗口和
+S_SLOW_SUM = 17        # 慢速均线窗口和
+S_RSI_GAIN = 18        # RSI平均涨幅
+S_RSI_LOSS = 19        # RSI平均跌幅
+S_EMA_FAST = 20
+S_EMA_SLOW = 21
+S_MACD_SIGNAL = 22
+S_ATR = 23
+S_TR_SMOOTH = 24
+S_PLUS_DM = 25
+S_MINUS_DM = 26
+S_ADX = 27
+S_SLOWK = 28
+S_SLOWD = 29
+S_VOL_SUM = 30         # 成交量窗口和
+HEADER_SIZE = 31
+
+# indicator_values / step 返回值的顺序
+OUTPUT_FIELDS = (
+    "fast_ma", "slow_ma", "rsi", "macd_hist", "k", "d", "atr", "adx", "volume_ma"
+)
+
+
+def make_params(
+    fast_window: int,
+    slow_window: int,
+    rsi_length: int,
+    macd_fast_period: int,
+    macd_slow_period: int,
+    macd_signal_period: int,
+    k_period: int,
+    slowing_period: int,
+    d_period: int,
+    atr_length: int,
+    adx_length: int,
+    volume_window: int,
+) -> np.ndarray:
+    """
+    将指标周期参数打包为数组
+    """
+    return np.array([
+        fast_window, slow_window, rsi_length,
+        macd_fast_period, macd_slow_period, macd_signal_period,
+        k_period, slowing_period, d_period,
+        atr_length, adx_length, volume_window,
+    ], dtype=np.float64)
+
+
+@njit(cache=True)
+def new_state(params):
+    """
+    创建空的状态数组：头部 + 收盘价/最高价/最低价/快K/慢K/成交量环形缓冲区
+    """
+    window = max(int(params[P_FAST]), int(params[P_SLOW]))
+    size = (HEADER_SIZE + window + 2 * int(params[P_K]) + int(params[P_SLOWING])
+            + int(params[P_D]) + int(params[P_VOLUME]))
+    state = np.zeros(size, dtype=np.float64)
+    state[:N_PARAMS] = params
+    return state
+
+
+@njit(cache=True)
+def indicator_values(state):
+    """
+    读取当前指标值，顺序见 OUTPUT_FIELDS
+    """
+    gain_loss = state[S_RSI_GAIN] + state[S_RSI_LOSS]
+    rsi = 100.0 * state[S_RSI_GAIN] / gain_loss if gain_loss != 0.0 else 0.0
+    macd_hist = state[S_EMA_FAST] - state[S_EMA_SLOW] - state[S_MACD_SIGNAL]
+    volume_n = min(int(state[S_BARS]), int(state[P_VOLUME]))
+    volume_ma = state[S_VOL_SUM] / volume_n if volume_n > 0 else 0.0
+    return (
+        state[S_FAST_SUM] / state[P_FAST],
+        state[S_SLOW_SUM] / state[P_SLOW],
+        rsi,
+        macd_hist,
+        state[S_SLOWK],
+        state[S_SLOWD],
+        state[S_ATR],
+        state[S_ADX],
+        volume_ma,
+    )
+
+
+@njit(cache=True, fastmath=True)
+def step(state, close, high, low, volume):
+    """
+    用一根新K线原地更新状态数组，返回更新后的指标值
+    """
+    fast_n = int(state[P_FAST])
+    slow_n = int(state[P_SLOW])
+    rsi_n = int(state[P_RSI])
+    macd_fast_n = int(state[P_MACD_FAST])
+    macd_slow_n = int(state[P_MACD_SLOW])
+    signal_n = int(state[P_MACD_SIGNAL])
+    k_n = int(state[P_K])
+    slowing_n = int(state[P_SLOWING])
+    d_n = int(state[P_D])
+    atr_n = int(state[P_ATR])
+    adx_n = int(state[P_ADX])
+    volume_n = int(state[P_VOLUME])
+
+    # 环形缓冲区位置
+    window = max(fast_n, slow_n)
+    o_close = HEADER_SIZE
+    o_high = o_close + window
+    o_low = o_high + k_n
+    o_fastk = o_low + k_n
+    o_slowk = o_fastk + slowing_n
+    o_volume = o_slowk + d_n
+
+    count = int(state[S_BARS]) + 1
+    state[S_BARS] = count
+
+    # 均线：加入新值、减去 n 根之前的值
+    if count > fast_n:
+        state[S_FAST_SUM] -= state[o_close + (count - 1 - fast_n) % window]
+    if count > slow_n:
+        state[S_SLOW_SUM] -= state[o_close + (count - 1 - slow_n) % window]
+    state[o_close + (count - 1) % window] = close
+    state[S_FAST_SUM] += close
+    state[S_SLOW_SUM] += close
+
+    # 成交量均值
+    if count > volume_n:
+        state[S_VOL_SUM] -= state[o_volume + (count - 1 - volume_n) % volume_n]
+    state[o_volume + (count - 1) % volume_n] = volume
+    state[S_VOL_SUM] += volume
+
+    # 以下指标依赖前一根K线，m为第m个价格变化 (从1开始)
+    m = count - 1
+    if m >= 1:
+        prev_close = state[S_PREV_CLOSE]
+
+        # RSI：前n个变化取简单平均，之后按Wilder平滑 avg = (avg*(n-1) + x)/n
+        change = close - prev_close
+        gain = change if change > 0.0 else 0.0
+        loss = -change if change < 0.0 else 0.0
+        if m <= rsi_n:
+            state[S_RSI_GAIN] += gain / rsi_n
+            state[S_RSI_LOSS] += loss / rsi_n
+        else:
+            state[S_RSI_GAIN] = (state[S_RSI_GAIN] * (rsi_n - 1) + gain) / rsi_n
+            state[S_RSI_LOSS] = (state[S_RSI_LOSS] * (rsi_n - 1) + loss) / rsi_n
+
+        # ATR
+        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        if m <= atr_n:
+            state[S_ATR] += tr / atr_n
+        else:
+            state[S_ATR] = (state[S_ATR] * (atr_n - 1) + tr) / atr_n
+
+        # ADX：前n-1个值求和，之后 sum = sum - sum/n + x，ADX为DX的Wilder平均
+        up_move = high - state[S_PREV_HIGH]
+        down_move = state[S_PREV_LOW] - low
+        plus_dm = up_move if up_move > down_move and up_move > 0.0 else 0.0
+        minus_dm = down_move if down_move > up_move and down_move > 0.0 else 0.0
+        if m < adx_n:
+            state[S_TR_SMOOTH] += tr
+            state[S_PLUS_DM] += plus_dm
+            state[S_MINUS_DM] += minus_dm
+        else:
+            state[S_TR_SMOOTH] += tr - state[S_TR_SMOOTH] / adx_n
+            state[S_PLUS_DM] += plus_dm - state[S_PLUS_DM] / adx_n
+            state[S_MINUS_DM] += minus_dm - state[S_MINUS_DM] / adx_n
+
+            dx = 0.0
+            tr_smooth = state[S_TR_SMOOTH]
+            if tr_smooth != 0.0:
+                plus_di = 100.0 * state[S_PLUS_DM] / tr_smooth
+                minus_di = 100.0 * state[S_MINUS_DM] / tr_smooth
+                di_sum = plus_di + minus_di
+                if di_sum != 0.0:
+                    dx = 100.0 * abs(plus_di - minus_di) / di_sum
+
+            dx_count = m - adx_n + 1
+            if dx_count <= adx_n:
+                state[S_ADX] += dx / adx_n
+            else:
+                state[S_ADX] = (state[S_ADX] * (adx_n - 1) + dx) / adx_n
+
+    # MACD：EMA以前n个值的简单平均为初值，信号线在慢线有效后开始计算
+    if count <= macd_fast_n:
+        state[S_EMA_FAST] += close / macd_fast_n
+    else:
+        state[S_EMA_FAST] += 2.0 / (macd_fast_n + 1) * (close - state[S_EMA_FAST])
+    if count <= macd_slow_n:
+        state[S_EMA_SLOW] += close / macd_slow_n
+    else:
+        state[S_EMA_SLOW] += 2.0 / (macd_slow_n + 1) * (close - state[S_EMA_SLOW])
+
+    signal_count = count - macd_slow_n + 1
+    if signal_count >= 1:
+        macd = state[S_EMA_FAST] - state[S_EMA_SLOW]
+        if signal_count <= signal_n:
+            state[S_MACD_SIGNAL] += macd / signal_n
+        else:
+            state[S_MACD_SIGNAL] += 2.0 / (signal_n + 1) * (macd - state[S_MACD_SIGNAL])
+
+    # KDJ：快K = (收盘-最低)/(最高-最低)，慢K为快K的简单平均，D为慢K的简单平均
+    # 最高/最低价保存在长度为k_n的环形缓冲区中，窗口很短，直接对整段缓冲区做max/min归约
+    # (编译后为向量化的归约，比单调队列的维护开销更小)
+    state[o_high + (count - 1) % k_n] = high
+    state[o_low + (count - 1) % k_n] = low
+    if count >= k_n:
+        highest = state[o_high:o_high + k_n].max()
+        lowest = state[o_low:o_low + k_n].min()
+        price_range = highest - lowest
+        fastk = (close - lowest) / price_range * 100.0 if price_range != 0.0 else 0.0
+
+        fastk_count = count - k_n + 1
+        state[o_fastk + (fastk_count - 1) % slowing_n] = fastk
+        if fastk_count >= slowing_n:
+            total = 0.0
+            for i in range(slowing_n):
+                total += state[o_fastk + i]
+            slowk = total / slowing_n
+            state[S_SLOWK] = slowk
+
+            slowk_count = fastk_count - slowing_n + 1
+            state[o_slowk + (slowk_count - 1) % d_n] = slowk
+            if slowk_count >= d_n:
+                total = 0.0
+                for i in range(d_n):
+                    total += state[o_slowk + i]
+                state[S_SLOWD] = total / d_n
+
+    state[S_PREV_HIGH] = high
+    state[S_PREV_LOW] = low
+    state[S_PREV_CLOSE] = close
+
+    return indicator_values(state)
+
+
+@njit(cache=True)
+def warmup_state(close, high, low, volume, params):
+    """
+    用历史K线数组一次性播种状态数组
+    """
+    state = new_state(params)
+    for i in range(close.shape[0]):
+        step(state, close[i], high[i], low[i], volume[i])
+    return state
+
+
+@njit(cache=True)
+def kdj_cross(last_k, last_d, k, d):
+    """
+    判断本根K线的KDJ交叉，返回 (金叉, 死叉)，只比较前后两根K线的K/D值，不保留跨K线状态
+    """
+    return last_k < last_d and k > d, last_k > last_d and k < d
+
+
+@njit(cache=True)
+def signal_sum(rsi, macd_hist, k, cross_up, cross_dn, rsi_buy_level, rsi_sell_level):
+    """
+    分钟策略的RSI/MACD/KDJ三个方向信号 (1买入/-1卖出/0无信号)，返回 (信号之和, 非零信号数)
+    """
+    # 以比较结果的整数值做符号求和，不走分支；RSI买入条件优先，与原先的if/elif判断顺序一致
+    rsi_long = int(rsi <= rsi_buy_level)
+    rsi_short = int(rsi >= rsi_sell_level) & (1 - rsi_long)
+    macd_long = int(macd_hist > 0)
+    macd_short = int(macd_hist < 0)
+    # KDJ：金叉为买入，死叉或K值超买为卖出，两者同时成立时相互抵消
+    kdj_long = int(cross_up)
+    kdj_short = int(cross_dn or k > 80)
+
+    total = rsi_long - rsi_short + macd_long - macd_short + kdj_long - kdj_short
+    count = rsi_long + rsi_short + macd_long + macd_short + (kdj_long ^ kdj_short)
+    return total, count
+
+
+@njit(cache=True)
+def step_signals(state, close, high, low, volume, rsi_buy_level, rsi_sell_level):
+    """
+    分钟策略的逐K线内核：更新指标状态，并在同一次调用中判断KDJ交叉和累加信号
+
+    返回 (快线, 慢线, RSI, MACD柱, K, D, KDJ金叉, KDJ死叉, 信号之和, 非零信号数)
+    """
+    last_k = state[S_SLOWK]
+    last_d = state[S_SLOWD]
+    values = step(state, close, high, low, volume)
+    rsi = values[2]
+    macd_hist = values[3]
+    k = values[4]
+    d = values[5]
+    cross_up, cross_dn = kdj_cross(last_k, last_d, k, d)
+    total, count = signal_sum(rsi, macd_hist, k, cross_up, cross_dn, rsi_buy_level, rsi_sell_level)
+    return values[0], values[1], rsi, macd_hist, k, d, cross_up, cross_dn, total, count
+
+
+@lru_cache(maxsize=None)
+def make_step_kernel(rsi_buy_level, rsi_sell_level):
+    """
+    生成把RSI阈值固化为编译期常量的step_signals，签名为 (state, close, high, low, volume)
+
+    numba把闭包引用的外部变量当作常量编译，阈值比较可由编译器常量折叠；
+    同一进程中每组阈值只编译一次。周期参数仍从状态数组读取。
+
+    闭包按阈值特化，不写入磁盘缓存，每个进程对每组阈值都要编译一次 (约一秒)；
+    这是常量折叠的代价，策略在on_init中调用prime_step_kernel提前编译，不在首根实盘K线上编译
+    """
+    rsi_buy_level = float(rsi_buy_level)
+    rsi_sell_level = float(rsi_sell_level)
+
+    @njit
+    def kernel(state, close, high, low, volume):
+        return step_signals(state, close, high, low, volume, rsi_buy_level, rsi_sell_level)
+
+    return kernel
+
+
+def prime_step_kernel(kernel, params):
+    """
+    在临时状态数组上用一根假K线调用一次逐K线内核，触发numba编译 (Cython内核只是一次普通调用)
+    """
+    kernel(new_state(params), 1.0, 1.0, 1.0, 1.0)
+
+
+@njit(cache=True)
+def indicator_series(close, high, low, volume, params):
+    """
+    逐根计算整段K线的指标序列，返回形状为 (N, 9) 的数组，列顺序见 OUTPUT_FIELDS
+    """
+    n = close.shape[0]
+    out = np.empty((n, len(OUTPUT_FIELDS)), dtype=np.float64)
+    state = new_state(params)
+    for i in range(n):
+        values = step(state, close[i], high[i], low[i], volume[i])
+        for j in range(len(values)):
+            out[i, j] = values[j]
+    return out
+
+
+@njit(cache=True)
+def simulate_grid(
+    open_, high, low, close, rsi, trend, atr_stop_delta,
+    enter_long, enter_short, exit_long_rsi, exit_short_rsi,
+    start, signal_reversal, activation_pct, fixed_size,
+    pricetick, size, rate, slippage, capital,
+):
+    """
+    按1h策略的交易逻辑同时回测多组参数 (每列一组)，返回逐K线权益 (N, 列数) 和成交次数
+
+    撮合方式与vnpy回测引擎一致：第i根K线收盘时以收盘价发出限价单，第i+1根K线开盘撮合，
+    未成交则在该K线的on_bar开始时撤销。
+
+    参数:
+        enter_long, enter_short: (N, 列数) 通过三层过滤的开仓信号
+        exit_long_rsi: (N,) 多头RSI止盈条件；exit_short_rsi: (N, 列数) 空头RSI止盈条件
+        start: 第一根可交易K线 (数组管理器初始化完成) 的下标
+        signal_reversal: 反转平仓的信号数条件是否满足 (signal_count >= signal_num)
+    """
+    n_bars, n_cols = enter_long.shape
+    equity = np.empty((n_bars, n_cols), dtype=np.float64)
+    trade_count = np.zeros(n_cols, dtype=np.int64)
+
+    for j in range(n_cols):
+        cash = capital
+        pos = 0.0
+        order_dir = 0          # 挂单方向：1买入，-1卖出，0无挂单
+        order_price = 0.0
+        entry_price = 0.0
+        intra_high = 0.0
+        intra_low = 0.0
+        stop_price = 0.0
+        activation_long = 0.0
+        activation_short = 0.0
+
+        for i in range(n_bars):
+            # 撮合上一根K线发出的限价单
+            if order_dir != 0:
+                filled = False
+                if order_dir > 0 and order_price >= low[i]:
+                    price = min(order_price, open_[i])
+                    filled = True
+                elif order_dir < 0 and order_price <= high[i]:
+                    price = max(order_price, open_[i])
+                    filled = True
+
+                if filled:
+                    opening = pos == 0.0
+                    cash -= order_dir * price * fixed_size * size
+                    cash -= price * fixed_size * size * rate + fixed_size * size * slippage
+                    pos += order_dir * fixed_size
+                    trade_count[j] += 1
+
+                    # on_trade：开仓时设置入场价、激活价格和初始ATR止损，平仓时重置
+                    if opening:
+                        entry_price = price
+                        if order_dir > 0:
+                            intra_high = price
+                            activation_long = price * (1 + activation_pct)
+                            stop_price = price - atr_stop_delta[i - 1]
+                        else:
+                            intra_low = price
+                            activation_short = price * (1 - activation_pct)
+                            stop_price = price + atr_stop_delta[i - 1]
+                    else:
+                        entry_price = 0.0
+                        intra_high = 0.0
+                        intra_low = 0.0
+                        stop_price = 0.0
+                order_dir = 0
+
+            # on_bar：更新持仓期间最高价/最低价
+            if pos > 0.0:
+                if high[i] > intra_high:
+                    intra_high = high[i]
+            elif pos < 0.0:
+                if low[i] < intra_low:
+                    intra_low = low[i]
+
+            c = close[i]
+            if i >= start:
+                delta = atr_stop_delta[i]
+                if pos > 0.0:
+                    if c > activation_long:
+                        new_stop = intra_high - delta
+                        if new_stop > stop_price:
+                            stop_price = new_stop
+                    if (c <= stop_price or exit_long_rsi[i]
+                            or (signal_reversal and trend[i] == -1)):
+                        order_dir = -1
+                elif pos < 0.0:
+                    if c < activation_short:
+                        new_stop = intra_low + delta
+                        if stop_price == 0 or new_stop < stop_price:
+                            stop_price = new_stop
+                    if (c >= stop_price or exit_short_rsi[i, j]
+                            or (signal_reversal and trend[i] == 1)):
+                        order_dir = 1
+                elif enter_long[i, j]:
+                    order_dir = 1
+                elif enter_short[i, j]:
+                    order_dir = -1
+
+                if order_dir != 0:
+                    order_price = round(c / pricetick) * pricetick
+
+            equity[i, j] = cash + pos * c * size
+
+    return equity, trade_count
+
+
+@njit(cache=True)
+def simulate_signals(
+    open_, high, low, close, rsi, total, start, signal_num,
+    rsi_buy_level, rsi_sell_level, stop_long_mul, stop_short_mul, fixed_size,
+    pricetick, size, rate, slippage, capital,
+):
+    """
+    按分钟策略的开平仓逻辑回测一组参数，返回逐K线权益 (N,) 和成交次数
+
+    撮合方式与vnpy回测引擎一致：第i根K线收盘时以收盘价发出限价单，第i+1根K线开盘撮合，
+    未成交的挂单不再保留。
+
+    参数:
+        total: (N,) RSI/MACD/KDJ三个方向信号之和
+        start: 第一根可交易K线 (数组管理器初始化完成) 的下标
+        stop_long_mul, stop_short_mul: 多头/空头止损价相对开仓价的乘数
+    """
+    n_bars = close.shape[0]
+    equity = np.empty(n_bars, dtype=np.float64)
+    trade_count = 0
+
+    cash = capital
+    pos = 0.0
+    order_dir = 0          # 挂单方向：1买入，-1卖出，0无挂单
+    order_price = 0.0
+    stop_long = 0.0        # 多头/空头止损价，随开仓价一起更新
+    stop_short = 0.0
+
+    for i in range(n_bars):
+        # 撮合上一根K线发出的限价单
+        if order_dir != 0:
+            filled = False
+            if order_dir > 0 and order_price >= low[i]:
+                price = min(order_price, open_[i])
+                filled = True
+            elif order_dir < 0 and order_price <= high[i]:
+                price = max(order_price, open_[i])
+                filled = True
+
+            if filled:
+                opening = pos == 0.0
+                cash -= order_dir * price * fixed_size * size
+                cash -= price * fixed_size * size * rate + fixed_size * size * slippage
+                pos += order_dir * fixed_size
+                trade_count += 1
+
+                # on_trade：开仓时以成交价作为开仓价
+                if opening:
+                    stop_long = price * stop_long_mul
+                    stop_short = price * stop_short_mul
+            order_dir = 0
+
+        c = close[i]
+        if i >= start:
+            signal = total[i]
+            if pos == 0.0:
+                if signal >= signal_num:
+                    order_dir = 1
+                    stop_long = c * stop_long_mul
+                    stop_short = c * stop_short_mul
+                elif signal <= -signal_num:
+                    order_dir = -1
+                    stop_long = c * stop_long_mul
+                    stop_short = c * stop_short_mul
+            elif pos > 0.0:
+                if (c <= stop_long or rsi[i] >= rsi_sell_level
+                        or signal <= -signal_num):
+                    order_dir = -1
+            else:
+                if (c >= stop_short or rsi[i] <= rsi_buy_level
+                        or signal >= signal_num):
+                    order_dir = 1
+
+            if order_dir != 0:
+                order_price = round(c / pricetick) * pricetick
+
+        equity[i] = cash + pos * c * size
+
+    return equity, trade_count
+
+
+if NUMBA_AVAILABLE:
+    from numba import types
+
+    # 逐日净盈亏声明为只读数组：可写数组可安全转换为只读类型，
+    # pandas写时复制下to_numpy()返回的只读数组也能匹配这一签名
+    _LEVERAGE_CURVE_STATS_SIGNATURE = types.Tuple((types.boolean,) + (types.float64,) * 4)(
+        types.Array(types.float64, 1, "C", readonly=True), types.float64, types.float64
+    )
+else:
+    _LEVERAGE_CURVE_STATS_SIGNATURE = None
+
+
+@njit(_LEVERAGE_CURVE_STATS_SIGNATURE, cache=True, fastmath=True)
+def leverage_curve_stats(net_pnl, capital, leverage):
+    """
+    一次遍历逐日净盈亏，得到杠杆L下资金曲线 capital + L*cumsum(net_pnl) 的统计量
+
+    口径与vnpy的calculate_statistics一致，不生成中间数组。
+    返回 (资金是否始终为正, 总收益率%, 最大回撤比例%, 日对数收益均值%, 日对数收益标准差%)；
+    标准差为样本标准差 (ddof=1)
+    """
+    n = net_pnl.shape[0]
+    balance = capital
+    # 高水位只取资金曲线自身的历史最高值，不含初始资金 (与vnpy一致)；
+    # 资金为正时才会用到，初值0在第一天即被当日资金替换 (fastmath下避免使用-inf)
+    highlevel = 0.0
+    max_ddpercent = 0.0
+    mean = 0.0
+    m2 = 0.0
+    positive = n > 0
+
+    for i in range(n):
+        pre_balance = balance
+        balance += leverage * net_pnl[i]
+        if balance <= 0.0:
+            positive = False
+            break
+
+        if balance > highlevel:
+            highlevel = balance
+        ddpercent = (balance - highlevel) / highlevel * 100.0
+        if ddpercent < max_ddpercent:
+            max_ddpercent = ddpercent
+
+        # Welford算法累计对数收益的均值和方差
+        r = np.log(balance / pre_balance)
+        delta = r - mean
+        mean += delta / (i + 1)
+        m2 += delta * (r - mean)
+
+    if not positive:
+        return False, 0.0, 0.0, 0.0, 0.0
+
+    return_std = np.sqrt(m2 / (n - 1)) * 100.0 if n > 1 else 0.0
+    return True, (balance / capital - 1.0) * 100.0, max_ddpercent, mean * 100.0, return_std
+
+
+def warmup_kernels():
+    """
+    用几根假K线调用一遍各个内核，触发numba编译并写入磁盘缓存
+
+    在创建进程池之前于主进程中调用一次，spawn启动的工作进程首次调用时直接加载
+    __pycache__中已编译的机器码，不必各自再花数秒编译；numba不可用时什么也不做
+    """
+    if not NUMBA_AVAILABLE:
+        return
+
+    n = 64
+    close = np.linspace(100.0, 110.0, n)
+    high = close + 1.0
+    low = close - 1.0
+    volume = np.ones(n)
+    params = make_params(10, 20, 14, 12, 26, 9, 14, 3, 3, 14, 14, 20)
+
+    state = warmup_state(close, high, low, volume, params)
+    indicator_values(state)
+    step_signals(state, close[-1], high[-1], low[-1], volume[-1], 30.0, 70.0)
+    indicator_series(close, high, low, volume, params)
+    leverage_curve_stats(np.zeros(n), 100000.0, 1.0)
+
+
+def decide(rsi, macd, k, d, sc, trend, signal_num, vol_ma_x_mult, bar_vol, rsi_buy_level, rsi_sell_level):
+    """
+    开仓决策：返回带方向的信号数，正数为多头开仓，负数为空头开仓，0为不开仓
+
+    只做几次标量比较，从Python逐根调用时numba的调用开销反而更大，因此不编译
+    """
+    if not bar_vol > vol_ma_x_mult:
+        return 0
+
+    rsi_long = rsi <= rsi_buy_level
+    if trend == 1:
+        long_signals = int(rsi_long) + int(macd > 0) + int(sc)
+        if long_signals >= signal_num:
+            return long_signals
+    elif trend == -1:
+        rsi_short = not rsi_long and rsi >= rsi_sell_level
+        kdj_short = not sc and k > 80 and d > 80
+        short_signals = int(rsi_short) + int(macd < 0) + int(kdj_short)
+        if short_signals >= signal_num:
+            return -short_signals
+    return 0
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+策略逐K线计算的Cython内核
+========================
+step_indicators 与 _indicator_kernels.step 的计算完全一致 (状态数组布局相同，
+可直接接收 warmup_state 播种的状态)；decide 为开仓决策的信号计数与成交量确认；
+StepSignals 为分钟策略的逐K线内核，与 _indicator_kernels.make_step_kernel 生成的函数等价。
+
+编译方法 (在项目目录下执行，生成的扩展模块与源码放在一起):
+    pip install cython
+    python setup.py build_ext --inplace
+
+未编译时策略自动使用 _indicator_kernels 中的同名实现。
+"""
+
+from libc.math cimport fabs, fmax
+
+# 状态数组下标，须与 _indicator_kernels 保持一致
+cdef enum:
+    P_FAST = 0
+    P_SLOW = 1
+    P_RSI = 2
+    P_MACD_FAST = 3
+    P_MACD_SLOW = 4
+    P_MACD_SIGNAL = 5
+    P_K = 6
+    P_SLOWING = 7
+    P_D = 8
+    P_ATR = 9
+    P_ADX = 10
+    P_VOLUME = 11
+    S_BARS = 12
+    S_PREV_HIGH = 13
+    S_PREV_LOW = 14
+    S_PREV_CLOSE = 15
+    S_FAST_SUM = 16
+    S_SLOW_SUM = 17
+    S_RSI_GAIN = 18
+    S_RSI_LOSS = 19
+    S_EMA_FAST = 20
+    S_EMA_SLOW = 21
+    S_MACD_SIGNAL = 22
+    S_ATR = 23
+    S_TR_SMOOTH = 24
+    S_PLUS_DM = 25
+    S_MINUS_DM = 26
+    S_ADX = 27
+    S_SLOWK = 28
+    S_SLOWD = 29
+    S_VOL_SUM = 30
+    HEADER_SIZE = 31
+
+
+cdef inline tuple _indicator_values(double[::1] state):
+    """
+    读取当前指标值，顺序见 _indicator_kernels.OUTPUT_FIELDS
+    """
+    cdef double gain_loss = state[S_RSI_GAIN] + state[S_RSI_LOSS]
+    cdef double rsi = 100.0 * state[S_RSI_GAIN] / gain_loss if gain_loss != 0.0 else 0.0
+    cdef double macd_hist = state[S_EMA_FAST] - state[S_EMA_SLOW] - state[S_MACD_SIGNAL]
+    cdef int volume_n = min(<int>state[S_BARS], <int>state[P_VOLUME])
+    cdef double volume_ma = state[S_VOL_SUM] / volume_n if volume_n > 0 else 0.0
+    return (
+        state[S_FAST_SUM] / state[P_FAST],
+        state[S_SLOW_SUM] / state[P_SLOW],
+        rsi,
+        macd_hist,
+        state[S_SLOWK],
+        state[S_SLOWD],
+        state[S_ATR],
+        state[S_ADX],
+        volume_ma,
+    )
+
+
+cpdef tuple step_indicators(double close, double high, double low, double vol, double[::1] state):
+    """
+    用一根新K线原地更新状态数组，返回更新后的指标值
+    """
+    _update_state(close, high, low, vol, state)
+    return _indicator_values(state)
+
+
+cdef void _update_state(double close, double high, double low, double vol, double[::1] state):
+    """
+    用一根新K线原地更新状态数组
+    """
+    cdef int fast_n = <int>state[P_FAST]
+    cdef int slow_n = <int>state[P_SLOW]
+    cdef int rsi_n = <int>state[P_RSI]
+    cdef int macd_fast_n = <int>state[P_MACD_FAST]
+    cdef int macd_slow_n = <int>state[P_MACD_SLOW]
+    cdef int signal_n = <int>state[P_MACD_SIGNAL]
+    cdef int k_n = <int>state[P_K]
+    cdef int slowing_n = <int>state[P_SLOWING]
+    cdef int d_n = <int>state[P_D]
+    cdef int atr_n = <int>state[P_ATR]
+    cdef int adx_n = <int>state[P_ADX]
+    cdef int volume_n = <int>state[P_VOLUME]
+
+    cdef int i, m, dx_count, signal_count, fastk_count, slowk_count
+    cdef double prev_close, change, gain, loss, tr, up_move, down_move, plus_dm, minus_dm
+    cdef double dx, tr_smooth, plus_di, minus_di, di_sum, macd
+    cdef double highest, lowest, price_range, fastk, slowk, total
+
+    # 环形缓冲区位置
+    cdef int window = max(fast_n, slow_n)
+    cdef int o_close = HEADER_SIZE
+    cdef int o_high = o_close + window
+    cdef int o_low = o_high + k_n
+    cdef int o_fastk = o_low + k_n
+    cdef int o_slowk = o_fastk + slowing_n
+    cdef int o_volume = o_slowk + d_n
+
+    cdef int count = <int>state[S_BARS] + 1
+    state[S_BARS] = count
+
+    # 均线：加入新值、减去 n 根之前的值
+    if count > fast_n:
+        state[S_FAST_SUM] -= state[o_close + (count - 1 - fast_n) % window]
+    if count > slow_n:
+        state[S_SLOW_SUM] -= state[o_close + (count - 1 - slow_n) % window]
+    state[o_close + (count - 1) % window] = close
+    state[S_FAST_SUM] += close
+    state[S_SLOW_SUM] += close
+
+    # 成交量均值
+    if count > volume_n:
+        state[S_VOL_SUM] -= state[o_volume + (count - 1 - volume_n) % volume_n]
+    state[o_volume + (count - 1) % volume_n] = vol
+    state[S_VOL_SUM] += vol
+
+    # 以下指标依赖前一根K线，m为第m个价格变化 (从1开始)
+    m = count - 1
+    if m >= 1:
+        prev_close = state[S_PREV_CLOSE]
+
+        # RSI
+        change = close - prev_close
+        gain = change if change > 0.0 else 0.0
+        loss = -change if change < 0.0 else 0.0
+        if m <= rsi_n:
+            state[S_RSI_GAIN] += gain / rsi_n
+            state[S_RSI_LOSS] += loss / rsi_n
+        else:
+            state[S_RSI_GAIN] = (state[S_RSI_GAIN] * (rsi_n - 1) + gain) / rsi_n
+            state[S_RSI_LOSS] = (state[S_RSI_LOSS] * (rsi_n - 1) + loss) / rsi_n
+
+        # ATR
+        tr = fmax(high - low, fmax(fabs(high - prev_close), fabs(low - prev_close)))
+        if m <= atr_n:
+            state[S_ATR] += tr / atr_n
+        else:
+            state[S_ATR] = (state[S_ATR] * (atr_n - 1) + tr) / atr_n
+
+        # ADX
+        up_move = high - state[S_PREV_HIGH]
+        down_move = state[S_PREV_LOW] - low
+        plus_dm = up_move if up_move > down_move and up_move > 0.0 else 0.0
+        minus_dm = down_move if down_move > up_move and down_move > 0.0 else 0.0
+        if m < adx_n:
+            state[S_TR_SMOOTH] += tr
+            state[S_PLUS_DM] += plus_dm
+            state[S_MINUS_DM] += minus_dm
+        else:
+            state[S_TR_SMOOTH] += tr - state[S_TR_SMOOTH] / adx_n
+            state[S_PLUS_DM] += plus_dm - state[S_PLUS_DM] / adx_n
+            state[S_MINUS_DM] += minus_dm - state[S_MINUS_DM] / adx_n
+
+            dx = 0.0
+            tr_smooth = state[S_TR_SMOOTH]
+            if tr_smooth != 0.0:
+                plus_di = 100.0 * state[S_PLUS_DM] / tr_smooth
+                minus_di = 100.0 * state[S_MINUS_DM] / tr_smooth
+                di_sum = plus_di + minus_di
+                if di_sum != 0.0:
+                    dx = 100.0 * fabs(plus_di - minus_di) / di_sum
+
+            dx_count = m - adx_n + 1
+            if dx_count <= adx_n:
+                state[S_ADX] += dx / adx_n
+            else:
+                state[S_ADX] = (state[S_ADX] * (adx_n - 1) + dx) / adx_n
+
+    # MACD
+    if count <= macd_fast_n:
+        state[S_EMA_FAST] += close / macd_fast_n
+    else:
+        state[S_EMA_FAST] += 2.0 / (macd_fast_n + 1) * (close - state[S_EMA_FAST])
+    if count <= macd_slow_n:
+        state[S_EMA_SLOW] += close / macd_slow_n
+    else:
+        state[S_EMA_SLOW] += 2.0 / (macd_slow_n + 1) * (close - state[S_EMA_SLOW])
+
+    signal_count = count - macd_slow_n + 1
+    if signal_count >= 1:
+        macd = state[S_EMA_FAST] - state[S_EMA_SLOW]
+        if signal_count <= signal_n:
+            state[S_MACD_SIGNAL] += macd / signal_n
+        else:
+            state[S_MACD_SIGNAL] += 2.0 / (signal_n + 1) * (macd - state[S_MACD_SIGNAL])
+
+    # KDJ
+    state[o_high + (count - 1) % k_n] = high
+    state[o_low + (count - 1) % k_n] = low
+    if count >= k_n:
+        highest = state[o_high]
+        lowest = state[o_low]
+        for i in range(1, k_n):
+            if state[o_high + i] > highest:
+                highest = state[o_high + i]
+            if state[o_low + i] < lowest:
+                lowest = state[o_low + i]
+        price_range = highest - lowest
+        fastk = (close - lowest) / price_range * 100.0 if price_range != 0.0 else 0.0
+
+        fastk_count = count - k_n + 1
+        state[o_fastk + (fastk_count - 1) % slowing_n] = fastk
+        if fastk_count >= slowing_n:
+            total = 0.0
+            for i in range(slowing_n):
+                total += state[o_fastk + i]
+            slowk = total / slowing_n
+            state[S_SLOWK] = slowk
+
+            slowk_count = fastk_count - slowing_n + 1
+            state[o_slowk + (slowk_count - 1) % d_n] = slowk
+            if slowk_count >= d_n:
+                total = 0.0
+                for i in range(d_n):
+                    total += state[o_slowk + i]
+                state[S_SLOWD] = total / d_n
+
+    state[S_PREV_HIGH] = high
+    state[S_PREV_LOW] = low
+    state[S_PREV_CLOSE] = close
+
+
+cpdef int decide(
+    double rsi,
+    double macd,
+    double k,
+    double d,
+    bint sc,
+    int trend,
+    int signal_num,
+    double vol_ma_x_mult,
+    double bar_vol,
+    double rsi_buy_level,
+    double rsi_sell_level,
+):
+    """
+    开仓决策：返回带方向的信号数，正数为多头开仓，负数为空头开仓，0为不开仓
+    """
+    cdef int rsi_long = rsi <= rsi_buy_level
+    cdef int rsi_short = (not rsi_long) and rsi >= rsi_sell_level
+    cdef int kdj_long = sc
+    cdef int kdj_short = (not sc) and k > 80 and d > 80
+    cdef int long_signals, short_signals
+
+    if not bar_vol > vol_ma_x_mult:
+        return 0
+
+    if trend == 1:
+        long_signals = rsi_long + (macd > 0) + kdj_long
+        if long_signals >= signal_num:
+            return long_signals
+    elif trend == -1:
+        short_signals = rsi_short + (macd < 0) + kdj_short
+        if short_signals >= signal_num:
+            return -short_signals
+    return 0
+
+
+cdef class StepSignals:
+    """
+    分钟策略的逐K线内核：更新指标状态，并在同一次调用中判断KDJ交叉和累加信号
+
+    RSI阈值在创建时保存为C类型字段；调用签名为 (state, close, high, low, volume)，
+    返回 (快线, 慢线, RSI, MACD柱, K, D, KDJ金叉, KDJ死叉, 信号之和, 非零信号数)
+    """
+    cdef double rsi_buy_level
+    cdef double rsi_sell_level
+
+    def __init__(self, double rsi_buy_level, double rsi_sell_level):
+        self.rsi_buy_level = rsi_buy_level
+        self.rsi_sell_level = rsi_sell_level
+
+    def __call__(self, double[::1] state, double close, double high, double low, double volume):
+        cdef double last_k = state[S_SLOWK]
+        cdef double last_d = state[S_SLOWD]
+        cdef double gain_loss, rsi, macd_hist, k, d
+        cdef bint cross_up, cross_dn
+        cdef int rsi_long, rsi_short, macd_long, macd_short, kdj_long, kdj_short
+
+        _update_state(close, high, low, volume, state)
+
+        gain_loss = state[S_RSI_GAIN] + state[S_RSI_LOSS]
+        rsi = 100.0 * state[S_RSI_GAIN] / gain_loss if gain_loss != 0.0 else 0.0
+        macd_hist = state[S_EMA_FAST] - state[S_EMA_SLOW] - state[S_MACD_SIGNAL]
+        k = state[S_SLOWK]
+        d = state[S_SLOWD]
+
+        # KDJ交叉只比较前后两根K线的K/D值
+        cross_up = last_k < last_d and k > d
+        cross_dn = last_k > last_d and k < d
+
+        # 方向信号求和，RSI买入条件优先；KDJ金叉与死叉/超买同时成立时相互抵消
+        rsi_long = rsi <= self.rsi_buy_level
+        rsi_short = (rsi >= self.rsi_sell_level) & (1 - rsi_long)
+        macd_long = macd_hist > 0
+        macd_short = macd_hist < 0
+        kdj_long = cross_up
+        kdj_short = cross_dn or k > 80
+
+        return (
+            state[S_FAST_SUM] / state[P_FAST],
+            state[S_SLOW_SUM] / state[P_SLOW],
+            rsi,
+            macd_hist,
+            k,
+            d,
+            cross_up,
+            cross_dn,
+            rsi_long - rsi_short + macd_long - macd_short + kdj_long - kdj_short,
+            rsi_long + rsi_short + macd_long + macd_short + (kdj_long ^ kdj_short),
+        )
@@ -9,36 +9,158 @@ BTC实盘交易脚本
 创建时间: 2025-07
 """
 
+import os
 import sys
 import time
 import json
+import hmac
+import uuid
+import atexit
+import asyncio
+import hashlib
 import logging
-import datetime
-from decimal import Decimal, ROUND_DOWN
+import logging.handlers
+import queue
+from dataclasses import dataclass
+from decimal import Decimal
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote_plus
 
-from binance.client import Client
+import aiohttp
+import orjson
+import websockets
+from binance import AsyncClient
 from binance.enums import *
-from binance.exceptions import BinanceAPIException, BinanceOrderException
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler("binance_trading.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
+from binance.exceptions import BinanceAPIException, BinanceOrderException, BinanceRequestException
+
+# 配置日志: 业务代码只把日志记录放入队列，由后台线程负责写文件和输出到终端
+_log_formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+_file_handler = logging.handlers.RotatingFileHandler(
+    "binance_trading.log", maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8", delay=True
 )
+_stream_handler = logging.StreamHandler(sys.stdout)
+for _handler in (_file_handler, _stream_handler):
+    _handler.setFormatter(_log_formatter)
+
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, _file_handler, _stream_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+_root_logger = logging.getLogger()
+_root_logger.handlers[:] = [logging.handlers.QueueHandler(_log_queue)]
+_root_logger.setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 币安WebSocket交易API地址
+WS_API_URL = "wss://ws-api.binance.com:443/ws-api/v3"
+WS_API_TESTNET_URL = "wss://ws-api.testnet.binance.vision/ws-api/v3"
+
+# 币安WebSocket行情流地址
+WS_STREAM_URL = "wss://stream.binance.com:9443/ws"
+WS_STREAM_TESTNET_URL = "wss://testnet.binance.vision/ws"
+
+# 币安账户接口中零余额的字符串表示
+ZERO_BALANCE = "0.00000000"
+
+# 交易规则本地缓存文件
+EXCHANGE_INFO_CACHE_FILE = "exchange_info_cache.json"
+
+# 用户数据流listenKey续期间隔 (秒)，币安要求60分钟内至少续期一次
+LISTEN_KEY_KEEPALIVE_SECS = 30 * 60
+
+# WebSocket交易连接断线重连的初始与最大退避时间 (秒)
+WS_RECONNECT_DELAY_SECS = 1.0
+WS_RECONNECT_MAX_DELAY_SECS = 30.0
+
+# 启动检查失败后的最大重试次数与初始退避时间 (秒)
+STARTUP_MAX_RETRIES = 5
+STARTUP_RETRY_DELAY_SECS = 1.0
+
+# 订单终结状态，收到后从未完成订单缓存中移除
+FINAL_ORDER_STATUSES = frozenset({'FILLED', 'CANCELED', 'REJECTED', 'EXPIRED', 'EXPIRED_IN_MATCH'})
+
+class StartupError(RuntimeError):
+    """启动检查失败 (系统状态或交易规则不可用)，调用方可在保留已建立连接的情况下重试"""
+
+
+def _log_order(title: str, order: dict):
+    """记录订单摘要，完整订单内容只在DEBUG级别输出"""
+    logger.info("%s id=%s status=%s", title, order.get('orderId'), order.get('status'))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("order=%r", order)
+
+
+def _orjson_dumps(obj) -> str:
+    """orjson序列化 (返回str，供aiohttp会话和WebSocket文本帧使用)"""
+    return orjson.dumps(obj).decode()
+
+
+class _OrjsonAsyncClient(AsyncClient):
+    """使用orjson解析REST响应的AsyncClient"""
+    
+    async def _handle_response(self, response: aiohttp.ClientResponse):
+        if not str(response.status).startswith('2'):
+            raise BinanceAPIException(response, response.status, await response.text())
+        try:
+            return orjson.loads(await response.read())
+        except orjson.JSONDecodeError:
+            txt = await response.text()
+            raise BinanceRequestException(f"Invalid Response: {txt}")
+
+
+@dataclass(frozen=True, slots=True)
+class StrategyParams:
+    """策略参数 (来自回测优化结果)"""
+    rsi_buy_level: int = 40
+    rsi_sell_level: int = 80
+    stop_loss_pct: float = 0.03
+    signal_num: int = 2
+    fast_window: int = 5
+    slow_window: int = 30
+
+
+@dataclass(frozen=True, slots=True)
+class OrderIntent:
+    """一笔待执行的订单意图 (先生成计划，再由execute_plan一次性提交)"""
+    side: str                       # SIDE_BUY / SIDE_SELL
+    qty: float
+    type: str = ORDER_TYPE_MARKET   # ORDER_TYPE_MARKET / ORDER_TYPE_LIMIT
+    price: Optional[float] = None   # 限价单价格
+
+
 class BinanceLiveTrader:
     """比特币实盘交易类"""
     
+    __slots__ = (
+        # 账户与客户端
+        'api_key', 'api_secret', 'test_mode', 'client',
+        # WebSocket交易连接
+        '_ws_trade', '_ws_reader', '_ws_ready', '_pending', 'ws_trade_timeout_secs',
+        # 行情缓冲区与REST价格请求合并
+        '_price_buffer', '_price_task', 'price_stale_ns',
+        '_price_waiters', '_price_timer', '_flush_tasks', 'batch_window_ms', 'batch_threshold',
+        'exchange_info_cache_hours',
+        # 用户数据流与未完成订单缓存
+        '_user_task', '_open_orders',
+        # 交易参数与签名预处理
+        'symbol', 'order_precision', 'price_precision', '_signer', '_encoded_parts',
+        '_tpl_buy_mkt', '_tpl_sell_mkt', '_tpl_buy_lmt', '_tpl_sell_lmt',
+        'strategy_params',
+        # 交易状态
+        'position', 'entry_price',
+        # 交易规则 (在check_system_status中设置)
+        'min_qty', 'max_qty', 'step_size', '_qty_step_int', '_qty_scale', '_qty_inv',
+        'min_price', 'max_price', 'tick_size', '_price_step_int', '_price_scale', '_price_inv',
+    )
+    
     def __init__(self, api_key: str, api_secret: str, test_mode: bool = True):
         """
         初始化交易类
         
+        注意: 客户端需要异步创建，请使用 `await BinanceLiveTrader.create(...)` 获取实例
+        
         参数:
             api_key: 币安API密钥
             api_secret: 币安API密钥
@@ -48,119 +170,546 @@ class BinanceLiveTrader:
         self.api_secret = api_secret
         self.test_mode = test_mode
         
-        # 初始化客户端
-        if test_mode:
-            self.client = Client(api_key, api_secret, testnet=True)
-            logger.info("使用测试网络模式")
-        else:
-            self.client = Client(api_key, api_secret)
-            logger.info("使用实盘网络模式")
+        # 异步客户端 (在create()中初始化)
+        self.client: Optional[AsyncClient] = None
+        
+        # WebSocket交易连接 (下单/撤单走长连接，避免每笔订单的HTTP开销)
+        self._ws_trade = None
+        self._ws_reader: Optional[asyncio.Task] = None  # 维护连接并读取响应的后台任务，断线后自动重连
+        self._ws_ready = asyncio.Event()  # 连接可用时置位，断线期间的请求等待重连
+        self._pending: Dict[str, asyncio.Future] = {}  # 请求ID -> 等待响应的Future
+        self.ws_trade_timeout_secs = 5.0  # 等待交易API响应的超时时间
+        
+        # 行情缓冲区 (后台订阅bookTicker推送，读取价格无需REST请求)
+        self._price_buffer: Optional[Tuple[float, float, int]] = None  # (买一价, 卖一价, 接收时间 monotonic_ns)
+        self._price_task: Optional[asyncio.Task] = None
+        self.price_stale_ns = 500_000_000  # 缓冲区超过该时长 (纳秒) 未更新时回退到REST
+        
+        # REST价格请求合并 (窗口期内的并发调用共用一次请求)
+        self._price_waiters: List[asyncio.Future] = []
+        self._price_timer: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks = set()  # 持有进行中的合并请求任务，防止被回收
+        self.batch_window_ms = 50  # 合并窗口 (毫秒)
+        self.batch_threshold = 16  # 等待者达到该数量时立即发送
+        
+        # 用户数据流 (executionReport推送维护未完成订单，None表示尚未与交易所同步)
+        self._user_task: Optional[asyncio.Task] = None
+        self._open_orders: Optional[Dict[int, dict]] = None
+        
+        # 交易规则缓存有效期 (小时)，过期后重新从交易所获取
+        self.exchange_info_cache_hours = 24
         
         # 交易参数
         self.symbol = "BTCUSDT"  # 交易对
         self.order_precision = 5  # BTC数量精度 (5位小数)
         self.price_precision = 2  # 价格精度 (2位小数)
         
+        # 下单参数模板 (固定字段预先构造，下单时只补充数量和价格)
+        self._tpl_buy_mkt = {'symbol': self.symbol, 'side': SIDE_BUY, 'type': ORDER_TYPE_MARKET}
+        self._tpl_sell_mkt = {'symbol': self.symbol, 'side': SIDE_SELL, 'type': ORDER_TYPE_MARKET}
+        self._tpl_buy_lmt = {'symbol': self.symbol, 'side': SIDE_BUY, 'type': ORDER_TYPE_LIMIT,
+                             'timeInForce': TIME_IN_FORCE_GTC}
+        self._tpl_sell_lmt = {'symbol': self.symbol, 'side': SIDE_SELL, 'type': ORDER_TYPE_LIMIT,
+                              'timeInForce': TIME_IN_FORCE_GTC}
+        
+        # 签名预处理: 密钥只初始化一次，每次签名复制状态；固定参数预先编码
+        self._signer = hmac.new(api_secret.encode(), digestmod=hashlib.sha256)
+        self._encoded_parts = {
+            ('apiKey', api_key): f"apiKey={quote_plus(api_key)}",
+            ('symbol', self.symbol): f"symbol={self.symbol}",
+        }
+        
         # 策略参数 (来自回测优化结果)
-        self.rsi_buy_level = 40
-        self.rsi_sell_level = 80
-        self.stop_loss_pct = 0.03
-        self.signal_num = 2
-        self.fast_window = 5
-        self.slow_window = 30
+        self.strategy_params = StrategyParams()
         
         # 交易状态
         self.position = 0.0  # 当前持仓量
         self.entry_price = 0.0  # 入场价格
+    
+    @classmethod
+    async def create(cls, api_key: str, api_secret: str, test_mode: bool = True,
+                     check_status: bool = True) -> "BinanceLiveTrader":
+        """
+        创建交易类实例并完成异步初始化
+        
+        所有REST请求共用同一个aiohttp会话，连接器保持长连接并缓存DNS，
+        避免每次请求都重新进行TCP+TLS握手
+        
+        参数:
+            check_status: 是否立即执行启动检查；为False时由调用方自行调用
+                          check_system_status() (例如在失败后带退避重试)
+        
+        任何初始化失败 (网络错误、API密钥无效等) 都会关闭已建立的会话和连接，并以StartupError抛出
+        """
+        self = cls(api_key, api_secret, test_mode)
         
-        # 检查系统状态
-        self._check_system_status()
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=10,
+            ttl_dns_cache=300,
+            use_dns_cache=True,
+            keepalive_timeout=60,
+            enable_cleanup_closed=True
+        )
+        try:
+            self.client = await _OrjsonAsyncClient.create(
+                api_key,
+                api_secret,
+                testnet=test_mode,
+                session_params={"connector": connector, "json_serialize": _orjson_dumps}
+            )
+            logger.info("使用测试网络模式" if test_mode else "使用实盘网络模式")
+            
+            # 建立WebSocket交易连接
+            await self._connect_ws_trade()
+            
+            # 启动行情订阅
+            self._price_task = asyncio.create_task(self._price_daemon())
+            
+            # 启动用户数据流，维护未完成订单缓存
+            self._user_task = asyncio.create_task(self._user_stream_daemon())
+            
+            # 检查系统状态
+            if check_status:
+                await self.check_system_status()
+        except Exception as e:
+            await self.close()
+            if not connector.closed:
+                await connector.close()
+            if isinstance(e, StartupError):
+                raise
+            raise StartupError(f"初始化交易客户端失败: {str(e)}") from e
+        return self
+    
+    async def close(self):
+        """关闭客户端连接"""
+        if self._price_task:
+            self._price_task.cancel()
+            self._price_task = None
+        if self._user_task:
+            self._user_task.cancel()
+            self._user_task = None
+        if self._ws_reader:
+            self._ws_reader.cancel()
+            # 等待后台任务退出async with，由其关闭连接
+            await asyncio.gather(self._ws_reader, return_exceptions=True)
+            self._ws_reader = None
+        if self._ws_trade:
+            await self._ws_trade.close()
+            self._ws_trade = None
+        if self.client:
+            await self.client.close_connection()
+            self.client = None
+    
+    async def _connect_ws_trade(self):
+        """启动WebSocket交易连接的后台任务，等待连接建立后用一次轻量请求预热"""
+        self._ws_reader = asyncio.create_task(self._ws_trade_daemon())
+        
+        await self._ws_request("account.status", {}, signed=True)
+        logger.info("WebSocket交易连接已建立")
+    
+    async def _ws_trade_daemon(self):
+        """后台任务: 维护交易API连接并读取响应完成对应的Future，断线后按指数退避自动重连"""
+        url = WS_API_TESTNET_URL if self.test_mode else WS_API_URL
+        delay = WS_RECONNECT_DELAY_SECS
         
-    def _check_system_status(self):
-        """检查系统状态"""
+        while True:
+            try:
+                async with websockets.connect(url) as ws:
+                    self._ws_trade = ws
+                    self._ws_ready.set()
+                    delay = WS_RECONNECT_DELAY_SECS
+                    
+                    async for message in ws:
+                        self._on_ws_trade_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket交易连接异常，{delay:.0f}秒后重连: {str(e)}")
+            finally:
+                # 连接结束后，未完成的请求全部失败，新请求等待重连
+                self._ws_ready.clear()
+                self._ws_trade = None
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("WebSocket交易连接已断开"))
+                self._pending.clear()
+            
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WS_RECONNECT_MAX_DELAY_SECS)
+    
+    def _on_ws_trade_message(self, message):
+        """处理一条交易API响应；无法解析的消息只记录日志，不影响后续消息"""
         try:
-            status = self.client.get_system_status()
+            data = orjson.loads(message)
+        except orjson.JSONDecodeError as e:
+            logger.warning(f"无法解析WebSocket交易API消息: {str(e)}")
+            return
+        
+        future = self._pending.pop(data.get('id'), None)
+        if future is None or future.done():
+            return
+        
+        if data.get('status') == 200:
+            future.set_result(data['result'])
+        else:
+            error = data.get('error', {})
+            future.set_exception(BinanceAPIException(None, data.get('status'), json.dumps(error)))
+    
+    async def _price_daemon(self):
+        """后台任务: 订阅bookTicker并将最新买一/卖一价写入缓冲区，断线后自动重连"""
+        base_url = WS_STREAM_TESTNET_URL if self.test_mode else WS_STREAM_URL
+        url = f"{base_url}/{self.symbol.lower()}@bookTicker"
+        
+        while True:
+            try:
+                async with websockets.connect(url) as ws:
+                    async for message in ws:
+                        data = orjson.loads(message)
+                        self._price_buffer = (float(data['b']), float(data['a']), time.monotonic_ns())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"行情订阅异常，1秒后重连: {str(e)}")
+                await asyncio.sleep(1)
+    
+    async def _user_stream_daemon(self):
+        """后台任务: 订阅用户数据流，根据executionReport更新未完成订单缓存，断线后自动重连"""
+        base_url = WS_STREAM_TESTNET_URL if self.test_mode else WS_STREAM_URL
+        
+        while True:
+            keepalive = None
+            try:
+                listen_key = await self.client.stream_get_listen_key()
+                keepalive = asyncio.create_task(self._listen_key_keepalive(listen_key))
+                async with websockets.connect(f"{base_url}/{listen_key}") as ws:
+                    # 连接建立后用一次REST快照同步，之后完全依赖推送更新
+                    orders = await self.client.get_open_orders(symbol=self.symbol)
+                    self._open_orders = {order['orderId']: order for order in orders}
+                    logger.info(f"用户数据流已连接，未完成订单数量: {len(orders)}")
+                    
+                    async for message in ws:
+                        data = orjson.loads(message)
+                        if data.get('e') == 'executionReport':
+                            self._on_execution_report(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"用户数据流异常，1秒后重连: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                # 断线期间缓存不可信，查询回退到REST
+                self._open_orders = None
+                if keepalive:
+                    keepalive.cancel()
+    
+    async def _listen_key_keepalive(self, listen_key: str):
+        """后台任务: 定期续期listenKey"""
+        while True:
+            await asyncio.sleep(LISTEN_KEY_KEEPALIVE_SECS)
+            try:
+                await self.client.stream_keepalive(listen_key)
+            except Exception as e:
+                logger.error(f"listenKey续期失败: {str(e)}")
+    
+    def _on_execution_report(self, event: dict):
+        """将executionReport事件转换为订单信息并更新缓存"""
+        if self._open_orders is None or event['s'] != self.symbol:
+            return
+        
+        order_id = event['i']
+        if event['X'] in FINAL_ORDER_STATUSES:
+            self._open_orders.pop(order_id, None)
+            return
+        
+        # 字段名与REST接口返回的订单信息保持一致
+        self._open_orders[order_id] = {
+            'symbol': event['s'],
+            'orderId': order_id,
+            'clientOrderId': event['c'],
+            'price': event['p'],
+            'origQty': event['q'],
+            'executedQty': event['z'],
+            'status': event['X'],
+            'timeInForce': event['f'],
+            'type': event['o'],
+            'side': event['S'],
+            'updateTime': event['E'],
+        }
+    
+    def _sign(self, params: dict) -> str:
+        """按参数名排序后计算HMAC-SHA256签名"""
+        encoded = self._encoded_parts
+        payload = "&".join(
+            encoded.get((key, value)) or f"{key}={quote_plus(str(value))}"
+            for key, value in sorted(params.items())
+        )
+        signer = self._signer.copy()
+        signer.update(payload.encode())
+        return signer.hexdigest()
+    
+    async def _ws_request(self, method: str, params: dict, signed: bool = False) -> dict:
+        """
+        通过WebSocket交易API发送请求并等待响应
+        
+        参数:
+            method: API方法名，如 order.place
+            params: 请求参数
+            signed: 是否需要签名
+        返回:
+            响应中的result字段
+        
+        连接断开期间先等待后台任务重连 (最多ws_trade_timeout_secs)，不在已断开的连接上发送；
+        连接不可用或发送失败时统一抛出ConnectionError，调用方据此改用REST接口
+        """
+        if not self._ws_ready.is_set():
+            try:
+                await asyncio.wait_for(self._ws_ready.wait(), timeout=self.ws_trade_timeout_secs)
+            except asyncio.TimeoutError:
+                raise ConnectionError("WebSocket交易连接不可用，等待重连超时") from None
+        
+        # 等待返回后连接可能已被后台任务再次断开
+        ws = self._ws_trade
+        if ws is None:
+            raise ConnectionError("WebSocket交易连接已断开")
+        
+        params = dict(params)
+        if signed:
+            params['apiKey'] = self.api_key
+            params['timestamp'] = time.time_ns() // 1_000_000  # API要求的墙钟毫秒时间戳
+            params['signature'] = self._sign(params)
+        
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        
+        try:
+            try:
+                await ws.send(_orjson_dumps({"id": request_id, "method": method, "params": params}))
+            except websockets.exceptions.ConnectionClosed as e:
+                raise ConnectionError(f"WebSocket交易连接已断开: {str(e)}") from e
+            return await asyncio.wait_for(future, timeout=self.ws_trade_timeout_secs)
+        finally:
+            self._pending.pop(request_id, None)
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _fmt(value: float) -> str:
+        """
+        将数值格式化为不带科学计数法的字符串 (签名和下单参数共用)
+        
+        输入已按步长取整，重复出现的数量/价格直接命中缓存
+        """
+        return format(Decimal(repr(value)), 'f')
+        
+    async def _load_symbol_info(self) -> Optional[dict]:
+        """
+        获取交易对规则，优先读取本地缓存
+        
+        缓存过期或缺少当前交易对时，只请求当前交易对的exchangeInfo并写回缓存
+        
+        返回:
+            {'status': 交易状态, 'filters': {filterType: filter}} 或None(如果交易对不存在)
+        """
+        cache = {}
+        if os.path.exists(EXCHANGE_INFO_CACHE_FILE):
+            age = time.time() - os.path.getmtime(EXCHANGE_INFO_CACHE_FILE)
+            if age < self.exchange_info_cache_hours * 3600:
+                try:
+                    with open(EXCHANGE_INFO_CACHE_FILE, "r") as f:
+                        cache = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"读取交易规则缓存失败: {str(e)}")
+        
+        symbol_info = cache.get(self.symbol)
+        if symbol_info:
+            logger.info(f"使用本地缓存的交易规则: {EXCHANGE_INFO_CACHE_FILE}")
+            return symbol_info
+        
+        exchange_info = await self._ws_request("exchangeInfo", {'symbol': self.symbol})
+        symbols = exchange_info.get('symbols') or []
+        if not symbols:
+            return None
+        
+        symbol_info = {
+            'status': symbols[0]['status'],
+            'filters': {f['filterType']: f for f in symbols[0]['filters']}
+        }
+        cache[self.symbol] = symbol_info
+        try:
+            with open(EXCHANGE_INFO_CACHE_FILE, "w") as f:
+                json.dump(cache, f)
+        except OSError as e:
+            logger.warning(f"写入交易规则缓存失败: {str(e)}")
+        
+        return symbol_info
+    
+    async def check_system_status(self):
+        """
+        检查系统状态并加载交易规则
+        
+        失败时抛出StartupError，已建立的连接保持不变，可直接重试
+        """
+        try:
+            status = await self.client.get_system_status()
             logger.info(f"币安系统状态: {status}")
             
             # 获取交易规则
-            exchange_info = self.client.get_exchange_info()
-            symbol_info = next((s for s in exchange_info['symbols'] if s['symbol'] == self.symbol), None)
+            symbol_info = await self._load_symbol_info()
             
             if not symbol_info:
-                logger.error(f"找不到交易对信息: {self.symbol}")
-                sys.exit(1)
+                raise StartupError(f"找不到交易对信息: {self.symbol}")
                 
             logger.info(f"交易对信息: {self.symbol}")
             logger.info(f"状态: {symbol_info['status']}")
             
             # 提取交易规则
-            for filter_item in symbol_info['filters']:
-                if filter_item['filterType'] == 'LOT_SIZE':
-                    self.min_qty = float(filter_item['minQty'])
-                    self.max_qty = float(filter_item['maxQty'])
-                    self.step_size = float(filter_item['stepSize'])
-                    logger.info(f"交易量限制 - 最小: {self.min_qty}, 最大: {self.max_qty}, 步长: {self.step_size}")
-                    
-                elif filter_item['filterType'] == 'PRICE_FILTER':
-                    self.min_price = float(filter_item['minPrice'])
-                    self.max_price = float(filter_item['maxPrice'])
-                    self.tick_size = float(filter_item['tickSize'])
-                    logger.info(f"价格限制 - 最小: {self.min_price}, 最大: {self.max_price}, 步长: {self.tick_size}")
+            filters = symbol_info['filters']
+            lot_size = filters.get('LOT_SIZE')
+            if lot_size:
+                self.min_qty = float(lot_size['minQty'])
+                self.max_qty = float(lot_size['maxQty'])
+                self.step_size = float(lot_size['stepSize'])
+                self._qty_step_int, self._qty_scale = self._parse_step(lot_size['stepSize'])
+                self._qty_inv = self._qty_scale / self._qty_step_int  # 每单位数量包含的步长数
+                logger.info(f"交易量限制 - 最小: {self.min_qty}, 最大: {self.max_qty}, 步长: {self.step_size}")
+                
+            price_filter = filters.get('PRICE_FILTER')
+            if price_filter:
+                self.min_price = float(price_filter['minPrice'])
+                self.max_price = float(price_filter['maxPrice'])
+                self.tick_size = float(price_filter['tickSize'])
+                self._price_step_int, self._price_scale = self._parse_step(price_filter['tickSize'])
+                self._price_inv = self._price_scale / self._price_step_int  # 每单位价格包含的步长数
+                logger.info(f"价格限制 - 最小: {self.min_price}, 最大: {self.max_price}, 步长: {self.tick_size}")
+            
+            # 交易规则在运行期间不变，生成常量内联的专用子类
+            if lot_size and price_filter:
+                self._specialize()
             
+        except StartupError:
+            raise
         except Exception as e:
-            logger.error(f"检查系统状态时出错: {str(e)}")
-            sys.exit(1)
+            raise StartupError(f"检查系统状态时出错: {str(e)}") from e
     
-    def get_account_balance(self) -> dict:
+    async def get_account_balance(self) -> dict:
         """获取账户余额"""
         try:
-            account = self.client.get_account()
-            balances = {}
-            
-            for asset in account['balances']:
-                free = float(asset['free'])
-                locked = float(asset['locked'])
-                if free > 0 or locked > 0:
-                    balances[asset['asset']] = {
-                        'free': free,
-                        'locked': locked,
-                        'total': free + locked
-                    }
+            account = await self.client.get_account()
             
-            return balances
+            # 绝大多数资产余额为零，先用字符串比较过滤，只对非零资产做float转换
+            return {
+                asset['asset']: {'free': free, 'locked': locked, 'total': free + locked}
+                for asset in account['balances']
+                if asset['free'] != ZERO_BALANCE or asset['locked'] != ZERO_BALANCE
+                for free, locked in ((float(asset['free']), float(asset['locked'])),)
+            }
             
         except Exception as e:
             logger.error(f"获取账户余额失败: {str(e)}")
             return {}
     
-    def get_current_price(self) -> float:
-        """获取当前BTC价格"""
+    async def get_current_price(self) -> float:
+        """获取当前BTC价格 (优先读取行情缓冲区的中间价，缓冲区过期时回退到REST)"""
+        buffer = self._price_buffer
+        if buffer and time.monotonic_ns() - buffer[2] < self.price_stale_ns:
+            return (buffer[0] + buffer[1]) / 2
+        
+        # 缓冲区过期: 合并窗口期内的并发请求，只发送一次REST请求
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._price_waiters.append(future)
+        
+        if len(self._price_waiters) >= self.batch_threshold:
+            self._flush_price()
+        elif self._price_timer is None:
+            self._price_timer = loop.call_later(self.batch_window_ms / 1000, self._flush_price)
+        
+        return await future
+    
+    def _flush_price(self):
+        """结束当前合并窗口，为所有等待者发起一次价格请求"""
+        if self._price_timer:
+            self._price_timer.cancel()
+            self._price_timer = None
+        
+        waiters, self._price_waiters = self._price_waiters, []
+        if waiters:
+            task = asyncio.create_task(self._fetch_price(waiters))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+    
+    async def _fetch_price(self, waiters: List[asyncio.Future]):
+        """通过REST获取价格并返回给同一窗口内的所有等待者"""
         try:
-            ticker = self.client.get_symbol_ticker(symbol=self.symbol)
+            ticker = await self.client.get_symbol_ticker(symbol=self.symbol)
             price = float(ticker['price'])
             logger.info(f"当前{self.symbol}价格: {price}")
-            return price
         except Exception as e:
             logger.error(f"获取价格失败: {str(e)}")
-            return 0
+            price = 0
+        
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(price)
     
-    def round_quantity(self, quantity: float) -> float:
-        """根据交易对规则调整BTC数量精度"""
-        step_size_str = str(self.step_size).rstrip('0').rstrip('.') if '.' in str(self.step_size) else str(self.step_size)
-        precision = len(step_size_str.split('.')[-1]) if '.' in step_size_str else 0
+    @staticmethod
+    def _rounding_expr(var: str, inv: float, step_int: int, scale: int) -> str:
+        """生成向下取整到步长的表达式源码，步长为1个最小单位时省去乘法"""
+        steps = f"int({var} * {inv!r} + 1e-9)"
+        return f"{steps} / {scale}" if step_int == 1 else f"{steps} * {step_int} / {scale}"
+    
+    def _specialize(self):
+        """
+        根据已加载的交易规则生成专用子类，并切换当前实例的类型
         
-        # 使用Decimal确保精确舍入
-        return float(Decimal(str(quantity)).quantize(Decimal('0.' + '0' * precision), rounding=ROUND_DOWN))
+        步长、缩放倍数等作为字面常量写入生成的方法，省去每次调用时的属性读取；
+        重复执行启动检查时基于原始类重新生成
+        """
+        base = getattr(type(self), '_generic_class', type(self))
+        source = f'''
+class _Specialized(base):
+    __slots__ = ()
+    _generic_class = base
+
+    def round_quantity(self, quantity):
+        return {self._rounding_expr("quantity", self._qty_inv, self._qty_step_int, self._qty_scale)}
+
+    def round_price(self, price):
+        return {self._rounding_expr("price", self._price_inv, self._price_step_int, self._price_scale)}
+'''
+        namespace = {'base': base}
+        exec(compile(source, f"<specialized {self.symbol}>", "exec"), namespace)
+        specialized = namespace['_Specialized']
+        specialized.__name__ = specialized.__qualname__ = f"{base.__name__}_{self.symbol}"
+        specialized.round_quantity.__doc__ = base.round_quantity.__doc__
+        specialized.round_price.__doc__ = base.round_price.__doc__
+        
+        self.__class__ = specialized
+        logger.info(f"已生成专用交易类: {specialized.__name__}")
     
-    def round_price(self, price: float) -> float:
-        """根据交易对规则调整价格精度"""
-        tick_size_str = str(self.tick_size).rstrip('0').rstrip('.') if '.' in str(self.tick_size) else str(self.tick_size)
-        precision = len(tick_size_str.split('.')[-1]) if '.' in tick_size_str else 0
+    @staticmethod
+    def _parse_step(step: str) -> Tuple[int, int]:
+        """
+        将交易所返回的步长字符串解析为整数步长和缩放倍数
         
-        # 使用Decimal确保精确舍入
-        return float(Decimal(str(price)).quantize(Decimal('0.' + '0' * precision), rounding=ROUND_DOWN))
+        例如 "0.00001000" -> (1, 100000)，"0.50" -> (5, 10)
+        """
+        step_dec = Decimal(step).normalize()
+        decimals = max(-step_dec.as_tuple().exponent, 0)
+        scale = 10 ** decimals
+        return int(step_dec * scale), scale
     
-    def buy_market(self, quantity: float) -> Optional[dict]:
+    def round_quantity(self, quantity: float) -> float:
+        """根据交易对规则调整BTC数量精度 (向下取整到步长)"""
+        # 先换算成步长个数再还原；加上极小量，抵消浮点乘法误差 (如 0.29 * 100 = 28.999999999999996)
+        return int(quantity * self._qty_inv + 1e-9) * self._qty_step_int / self._qty_scale
+    
+    def round_price(self, price: float) -> float:
+        """根据交易对规则调整价格精度 (向下取整到步长)"""
+        return int(price * self._price_inv + 1e-9) * self._price_step_int / self._price_scale
+    
+    async def buy_market(self, quantity: float) -> Optional[dict]:
         """
         市价买入BTC
         
@@ -179,18 +728,16 @@ class BinanceLiveTrader:
             logger.info(f"准备市价买入 {quantity} BTC")
             
             # 创建市价买单
-            order = self.client.create_order(
-                symbol=self.symbol,
-                side=SIDE_BUY,
-                type=ORDER_TYPE_MARKET,
-                quantity=quantity
-            )
+            order = await self._ws_request("order.place", {
+                **self._tpl_buy_mkt,
+                'quantity': self._fmt(quantity)
+            }, signed=True)
             
-            logger.info(f"买单已提交: {order}")
+            _log_order("买单已提交", order)
             
             # 更新持仓信息
             self.position += quantity
-            self.entry_price = float(order['fills'][0]['price']) if 'fills' in order and order['fills'] else self.get_current_price()
+            self.entry_price = float(order['fills'][0]['price']) if 'fills' in order and order['fills'] else await self.get_current_price()
             
             logger.info(f"买入成功 - 数量: {quantity}, 价格: {self.entry_price}")
             return order
@@ -205,7 +752,7 @@ class BinanceLiveTrader:
             logger.error(f"买入过程中发生未知错误: {str(e)}")
             return None
     
-    def sell_market(self, quantity: float) -> Optional[dict]:
+    async def sell_market(self, quantity: float) -> Optional[dict]:
         """
         市价卖出BTC
         
@@ -224,14 +771,12 @@ class BinanceLiveTrader:
             logger.info(f"准备市价卖出 {quantity} BTC")
             
             # 创建市价卖单
-            order = self.client.create_order(
-                symbol=self.symbol,
-                side=SIDE_SELL,
-                type=ORDER_TYPE_MARKET,
-                quantity=quantity
-            )
+            order = await self._ws_request("order.place", {
+                **self._tpl_sell_mkt,
+                'quantity': self._fmt(quantity)
+            }, signed=True)
             
-            logger.info(f"卖单已提交: {order}")
+            _log_order("卖单已提交", order)
             
             # 更新持仓信息
             self.position -= quantity
@@ -252,7 +797,7 @@ class BinanceLiveTrader:
             logger.error(f"卖出过程中发生未知错误: {str(e)}")
             return None
     
-    def buy_limit(self, quantity: float, price: float) -> Optional[dict]:
+    async def buy_limit(self, quantity: float, price: float) -> Optional[dict]:
         """
         限价买入BTC
         
@@ -274,16 +819,13 @@ class BinanceLiveTrader:
             logger.info(f"准备限价买入 {quantity} BTC, 价格: {price}")
             
             # 创建限价买单
-            order = self.client.create_order(
-                symbol=self.symbol,
-                side=SIDE_BUY,
-                type=ORDER_TYPE_LIMIT,
-                timeInForce=TIME_IN_FORCE_GTC,
-                quantity=quantity,
-                price=str(price)
-            )
+            order = await self._ws_request("order.place", {
+                **self._tpl_buy_lmt,
+                'quantity': self._fmt(quantity),
+                'price': self._fmt(price)
+            }, signed=True)
             
-            logger.info(f"限价买单已提交: {order}")
+            _log_order("限价买单已提交", order)
             return order
             
         except BinanceAPIException as e:
@@ -296,7 +838,7 @@ class BinanceLiveTrader:
             logger.error(f"限价买入过程中发生未知错误: {str(e)}")
             return None
     
-    def sell_limit(self, quantity: float, price: float) -> Optional[dict]:
+    async def sell_limit(self, quantity: float, price: float) -> Optional[dict]:
         """
         限价卖出BTC
         
@@ -318,16 +860,13 @@ class BinanceLiveTrader:
             logger.info(f"准备限价卖出 {quantity} BTC, 价格: {price}")
             
             # 创建限价卖单
-            order = self.client.create_order(
-                symbol=self.symbol,
-                side=SIDE_SELL,
-                type=ORDER_TYPE_LIMIT,
-                timeInForce=TIME_IN_FORCE_GTC,
-                quantity=quantity,
-                price=str(price)
-            )
+            order = await self._ws_request("order.place", {
+                **self._tpl_sell_lmt,
+                'quantity': self._fmt(quantity),
+                'price': self._fmt(price)
+            }, signed=True)
             
-            logger.info(f"限价卖单已提交: {order}")
+            _log_order("限价卖单已提交", order)
             return order
             
         except BinanceAPIException as e:
@@ -340,7 +879,7 @@ class BinanceLiveTrader:
             logger.error(f"限价卖出过程中发生未知错误: {str(e)}")
             return None
     
-    def cancel_order(self, order_id: str) -> bool:
+    async def cancel_order(self, order_id: str) -> bool:
         """
         取消订单
         
@@ -350,32 +889,38 @@ class BinanceLiveTrader:
             是否取消成功
         """
         try:
-            result = self.client.cancel_order(
-                symbol=self.symbol,
-                orderId=order_id
-            )
-            logger.info(f"已取消订单: {result}")
+            result = await self._ws_request("order.cancel", {
+                'symbol': self.symbol,
+                'orderId': order_id
+            }, signed=True)
+            _log_order("已取消订单", result)
             return True
         except Exception as e:
             logger.error(f"取消订单失败: {str(e)}")
             return False
     
-    def get_open_orders(self) -> List[dict]:
+    async def get_open_orders(self) -> List[dict]:
         """
         获取当前未完成的订单
         
         返回:
             订单列表
         """
+        if self._open_orders is not None:
+            orders = list(self._open_orders.values())
+            logger.info(f"当前未完成订单数量: {len(orders)}")
+            return orders
+        
+        # 用户数据流尚未同步时回退到REST
         try:
-            orders = self.client.get_open_orders(symbol=self.symbol)
+            orders = await self.client.get_open_orders(symbol=self.symbol)
             logger.info(f"当前未完成订单数量: {len(orders)}")
             return orders
         except Exception as e:
             logger.error(f"获取未完成订单失败: {str(e)}")
             return []
     
-    def get_position(self) -> float:
+    async def get_position(self) -> float:
         """
         获取当前BTC持仓量
         
@@ -383,7 +928,7 @@ class BinanceLiveTrader:
             BTC持仓量
         """
         try:
-            balances = self.get_account_balance()
+            balances = await self.get_account_balance()
             if 'BTC' in balances:
                 self.position = balances['BTC']['free'] + balances['BTC']['locked']
                 logger.info(f"当前BTC持仓: {self.position}")
@@ -420,28 +965,81 @@ class BinanceLiveTrader:
         logger.info(f"USDT: {usdt_amount}, 价格: {current_price}, 可购买BTC: {final_quantity}")
         return final_quantity
     
-    def get_order_status(self, order_id: str) -> Optional[dict]:
+    async def batch_fetch(self, *coros):
+        """
+        并发执行多个查询请求，总耗时约为一次往返
+        
+        参数:
+            coros: 查询协程，如 get_current_price()、get_account_balance()
+        返回:
+            与参数顺序一致的结果列表
+        """
+        return await asyncio.gather(*coros)
+    
+    async def _submit(self, intent: OrderIntent) -> Optional[dict]:
+        """按订单意图分派到对应的下单方法"""
+        if intent.type == ORDER_TYPE_LIMIT:
+            place = self.buy_limit if intent.side == SIDE_BUY else self.sell_limit
+            return await place(intent.qty, intent.price)
+        place = self.buy_market if intent.side == SIDE_BUY else self.sell_market
+        return await place(intent.qty)
+    
+    async def execute_plan(self, intents: List[OrderIntent], cancel_ids: Tuple[str, ...] = ()) -> Tuple[list, list]:
+        """
+        非交互地执行交易计划，所有下单和撤单请求并发提交
+        
+        参数:
+            intents: 订单意图列表
+            cancel_ids: 需要取消的订单ID
+        返回:
+            (下单结果列表, 撤单结果列表)，与参数顺序一致
+        """
+        results = await asyncio.gather(
+            *(self._submit(i) for i in intents),
+            *(self.cancel_order(order_id) for order_id in cancel_ids)
+        )
+        return results[:len(intents)], results[len(intents):]
+    
+    async def get_order_status(self, order_id: str) -> Optional[dict]:
         """
         获取订单状态
         
         参数:
-            order_id: 订单ID
+            order_id: 订单ID，非数字时按客户端订单ID查询
         返回:
             订单信息或None(如果失败)
         """
         try:
-            order = self.client.get_order(
-                symbol=self.symbol,
-                orderId=order_id
-            )
-            logger.info(f"订单状态: {order}")
+            numeric_id = int(order_id)
+        except (TypeError, ValueError):
+            numeric_id = None  # 客户端订单ID，本地缓存按交易所订单ID索引，直接查询REST
+        
+        # 未完成订单直接读取本地缓存，其余情况回退到REST
+        if self._open_orders is not None and numeric_id is not None:
+            order = self._open_orders.get(numeric_id)
+            if order is not None:
+                _log_order("订单状态", order)
+                return order
+        
+        try:
+            if numeric_id is None:
+                order = await self.client.get_order(
+                    symbol=self.symbol,
+                    origClientOrderId=order_id
+                )
+            else:
+                order = await self.client.get_order(
+                    symbol=self.symbol,
+                    orderId=order_id
+                )
+            _log_order("订单状态", order)
             return order
         except Exception as e:
             logger.error(f"获取订单状态失败: {str(e)}")
             return None
 
 
-def demo_trading():
+async def demo_trading():
     """
     实盘交易演示函数
     """
@@ -449,17 +1047,53 @@ def demo_trading():
     api_key = "YOUR_API_KEY_HERE"  # 请替换为您的API密钥
     api_secret = "YOUR_API_SECRET_HERE"  # 请替换为您的API密钥
     
-    # 初始化交易类 (使用测试网络)
-    trader = BinanceLiveTrader(api_key, api_secret, test_mode=True)
-    
-    # 获取账户余额
-    balances = trader.get_account_balance()
+    # 初始化交易类 (使用测试网络)，失败时带退避重试；
+    # 启动检查单独执行，客户端已建立时只重试检查并复用已建立的连接
+    trader = None
+    try:
+        delay = STARTUP_RETRY_DELAY_SECS
+        for attempt in range(1, STARTUP_MAX_RETRIES + 1):
+            try:
+                if trader is None:
+                    trader = await BinanceLiveTrader.create(api_key, api_secret, test_mode=True, check_status=False)
+                await trader.check_system_status()
+                break
+            except StartupError as e:
+                if attempt == STARTUP_MAX_RETRIES:
+                    raise
+                logger.warning(f"启动检查失败 (第{attempt}次)，{delay:.0f}秒后重试: {str(e)}")
+                await asyncio.sleep(delay)
+                delay *= 2
+        
+        await _run_demo(trader)
+    finally:
+        if trader is not None:
+            await trader.close()
+
+
+async def _ask(prompt: str) -> bool:
+    """在线程中等待用户确认，期间事件循环继续维护WebSocket连接"""
+    answer = await asyncio.to_thread(input, prompt)
+    return answer.lower() == 'y'
+
+
+async def _run_demo(trader: BinanceLiveTrader):
+    """
+    演示流程主体: 先通过确认提示生成交易计划，再一次性执行
+    """
+    # 并发获取账户余额、当前BTC价格、未完成订单和BTC持仓
+    balances, btc_price, open_orders, btc_position = await trader.batch_fetch(
+        trader.get_account_balance(),
+        trader.get_current_price(),
+        trader.get_open_orders(),
+        trader.get_position()
+    )
     print("\n==== 账户余额 ====")
     for asset, balance in balances.items():
         print(f"{asset}: {balance['free']} (可用) + {balance['locked']} (锁定) = {balance['total']} (总计)")
     
-    # 获取当前BTC价格
-    btc_price = trader.get_current_price()
+    intents = []
+    cancel_ids = []
     
     # 演示: 如果想使用一定数量的USDT买入BTC
     if 'USDT' in balances:
@@ -474,19 +1108,13 @@ def demo_trading():
             print(f"\n==== 买入演示 ====")
             print(f"准备使用 {usdt_to_use} USDT 买入 {btc_amount} BTC")
             
-            # 确认是否执行买入操作
-            confirm = input("是否执行买入操作? (y/n): ")
-            if confirm.lower() == 'y':
-                order = trader.buy_market(btc_amount)
-                if order:
-                    print(f"买入订单已执行: {order['orderId']}")
+            # 确认是否加入买入操作
+            if await _ask("是否执行买入操作? (y/n): "):
+                intents.append(OrderIntent(SIDE_BUY, btc_amount))
             else:
                 print("取消买入操作")
     
-    # 获取当前BTC持仓
-    btc_position = trader.get_position()
-    
-    # 演示: 如果有BTC持仓，卖出一部分
+    # 演示: 如果有BTC持仓，卖出一部分 (按计划生成时的持仓计算)
     if btc_position > 0:
         print(f"\n==== 卖出演示 ====")
         print(f"当前BTC持仓: {btc_position}")
@@ -497,31 +1125,42 @@ def demo_trading():
         if btc_to_sell >= trader.min_qty:
             print(f"准备卖出 {btc_to_sell} BTC")
             
-            # 确认是否执行卖出操作
-            confirm = input("是否执行卖出操作? (y/n): ")
-            if confirm.lower() == 'y':
-                order = trader.sell_market(btc_to_sell)
-                if order:
-                    print(f"卖出订单已执行: {order['orderId']}")
+            # 确认是否加入卖出操作
+            if await _ask("是否执行卖出操作? (y/n): "):
+                intents.append(OrderIntent(SIDE_SELL, btc_to_sell))
             else:
                 print("取消卖出操作")
         else:
             print(f"卖出数量 {btc_to_sell} 小于最小交易量 {trader.min_qty}")
     
     # 演示: 查询未完成订单
-    open_orders = trader.get_open_orders()
     if open_orders:
         print("\n==== 未完成订单 ====")
         for order in open_orders:
             print(f"订单ID: {order['orderId']}, 类型: {order['type']}, 方向: {order['side']}, 价格: {order['price']}, 数量: {order['origQty']}")
             
             # 确认是否取消订单
-            confirm = input(f"是否取消订单 {order['orderId']}? (y/n): ")
-            if confirm.lower() == 'y':
-                if trader.cancel_order(order['orderId']):
-                    print(f"订单 {order['orderId']} 已取消")
+            if await _ask(f"是否取消订单 {order['orderId']}? (y/n): "):
+                cancel_ids.append(order['orderId'])
             else:
                 print(f"保留订单 {order['orderId']}")
+    
+    if not intents and not cancel_ids:
+        print("\n没有需要执行的操作")
+        return
+    
+    # 一次性并发执行交易计划
+    print("\n==== 执行交易计划 ====")
+    orders, cancelled = await trader.execute_plan(intents, tuple(cancel_ids))
+    for intent, order in zip(intents, orders):
+        action = "买入" if intent.side == SIDE_BUY else "卖出"
+        if order:
+            print(f"{action}订单已执行: {order['orderId']}")
+        else:
+            print(f"{action}订单执行失败")
+    for order_id, ok in zip(cancel_ids, cancelled):
+        if ok:
+            print(f"订单 {order_id} 已取消")
 
 
 def main():
@@ -533,7 +1172,11 @@ def main():
     choice = input("\n请选择操作: ")
     
     if choice == '1':
-        demo_trading()
+        try:
+            asyncio.run(demo_trading())
+        except StartupError as e:
+            logger.error(f"启动失败: {str(e)}")
+            sys.exit(1)
     else:
         print("退出程序")
 
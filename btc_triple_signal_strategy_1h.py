@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import itertools
 import math
 import sys
 import os
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
 
 # 添加当前目录到路径
 sys.path.append(os.path.abspath("."))
@@ -13,6 +18,7 @@ from vnpy_ctastrategy import (
     CtaTemplate,
     StopOrder,
 )
+from vnpy_ctastrategy.base import EngineType, INTERVAL_DELTA_MAP
 from vnpy.trader.object import (
     TickData,
     BarData,
@@ -20,9 +26,213 @@ from vnpy.trader.object import (
     OrderData,
 )
 from vnpy.trader.utility import BarGenerator, ArrayManager
-from vnpy.trader.constant import Interval, Direction, Status
+from vnpy.trader.constant import Interval, Direction, Offset, Status
 from vnpy.trader.object import ContractData
 
+from _indicator_kernels import make_params, warmup_state, indicator_values, indicator_series, simulate_grid
+
+# 优先使用Cython预编译的逐K线内核 (python setup.py build_ext --inplace)，未编译时使用同名的Python/numba实现
+try:
+    from _strategy_kernels import step_indicators, decide
+except ImportError:
+    from _indicator_kernels import step, decide
+
+    def step_indicators(close, high, low, vol, state):
+        """用一根新K线更新指标状态，参数顺序与Cython内核一致"""
+        return step(state, close, high, low, vol)
+
+
+# 回调中使用的枚举常量，导入时解析一次
+_LONG = Direction.LONG
+_OPEN = Offset.OPEN
+_STATUS_SUBMITTING = Status.SUBMITTING
+_STATUS_ALLTRADED = Status.ALLTRADED
+_STATUS_CANCELLED = Status.CANCELLED
+_STATUS_REJECTED = Status.REJECTED
+
+
+class ArrayManager32(ArrayManager):
+    """
+    使用float32存储K线数据的数组管理器，内存占用和数据搬运量减半
+    
+    注意：TA-Lib的指标函数只接受float64，本策略的指标由增量内核计算，不调用ArrayManager的指标方法
+    """
+    
+    def __init__(self, size: int = 100):
+        super().__init__(size)
+        for name in (
+            "open_array", "high_array", "low_array", "close_array",
+            "volume_array", "turnover_array", "open_interest_array",
+        ):
+            setattr(self, name, np.zeros(size, dtype=np.float32))
+
+
+# 网格回测的行情数据磁盘缓存目录 (多个工作进程共用)
+GRID_CACHE_DIR = ".grid_cache"
+
+
+def _load_bar_data(symbol, exchange, interval, start, end, source_stats=None):
+    """
+    从vnpy数据库读取K线数据
+    
+    source_stats不参与查询，只作为磁盘缓存键的一部分，见 load_bar_data_cached
+    """
+    from vnpy.trader.database import get_database
+    return get_database().load_bar_data(symbol, exchange, interval, start, end)
+
+
+def _connect_bar_db():
+    """连接vnpy配置中的MySQL数据库"""
+    import mysql.connector
+    from vnpy.trader.setting import SETTINGS
+    
+    return mysql.connector.connect(
+        host=SETTINGS["database.host"],
+        port=SETTINGS["database.port"],
+        user=SETTINGS["database.user"],
+        password=SETTINGS["database.password"],
+        database=SETTINGS["database.database"],
+        use_pure=False
+    )
+
+
+def _bar_source_stats(symbol, exchange, interval) -> tuple:
+    """
+    dbbardata中该标的和周期全部K线的数量和起止时间 (只走唯一索引，开销很小)
+    下载脚本直接写入dbbardata、不更新vnpy的K线汇总表，因此直接查询K线表
+    """
+    connection = _connect_bar_db()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+                SELECT COUNT(*), MIN(datetime), MAX(datetime)
+                FROM dbbardata
+                WHERE symbol = %s AND exchange = %s AND `interval` = %s
+            """,
+            (symbol, exchange.value, interval.value)
+        )
+        stats = cursor.fetchone()
+        cursor.close()
+    finally:
+        connection.close()
+    return stats
+
+
+def load_bar_data_cached(symbol, exchange, interval, start, end):
+    """
+    带磁盘缓存的K线读取，多个工作进程和多次运行共用
+    
+    缓存键包含数据库中该标的和周期K线的数量和起止时间，下载脚本补齐或修正K线后自动重新读取；
+    未安装joblib时不缓存，直接从数据库读取
+    """
+    try:
+        from joblib import Memory
+    except ImportError:
+        return _load_bar_data(symbol, exchange, interval, start, end)
+    
+    load = Memory(GRID_CACHE_DIR, verbose=0).cache(_load_bar_data)
+    return load(symbol, exchange, interval, start, end, _bar_source_stats(symbol, exchange, interval))
+
+
+def _bars_to_arrays(bars) -> np.ndarray:
+    """
+    将K线列表转为形状为 (5, N) 的float32 OHLCV数组 (开、高、低、收、量)
+    """
+    return np.array(
+        [(bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume) for bar in bars],
+        dtype=np.float32
+    ).reshape(-1, 5).T.copy()
+
+
+@lru_cache(maxsize=4)
+def _load_history_arrays(vt_symbol: str, interval: Interval, start, end) -> np.ndarray:
+    """
+    读取预热用的历史K线并转为形状为 (5, N) 的float32 OHLCV数组 (开、高、低、收、量)
+    同一进程内的网格回测各组参数共用，数组只读
+    """
+    from vnpy.trader.utility import extract_vt_symbol
+    from vnpy_ctastrategy.backtesting import load_bar_data
+    
+    symbol, exchange = extract_vt_symbol(vt_symbol)
+    bars = load_bar_data(symbol, exchange, interval, start, end)
+    
+    arrays = _bars_to_arrays(bars)
+    arrays.setflags(write=False)
+    return arrays
+
+
+@lru_cache(maxsize=64)
+def _cached_warmup_state(history_key: tuple, window: int, params: tuple) -> np.ndarray:
+    """
+    用历史数据的最后window根K线播种指标状态
+    状态只依赖指标周期参数，阈值、止损等参数不同的组合共用同一份结果，数组只读
+    """
+    _, high, low, close, volume = _load_history_arrays(*history_key)
+    state = warmup_state(
+        close[-window:], high[-window:], low[-window:], volume[-window:],
+        np.array(params, dtype=np.float64)
+    )
+    state.setflags(write=False)
+    return state
+
+
+@lru_cache(maxsize=64)
+def _cached_warmup_cross_over(history_key: tuple, window: int, params: tuple) -> bool:
+    """
+    从空的数组管理器 (大小为window) 逐根预热全部历史K线后的KDJ金叉状态
+    只依赖指标周期参数，与_cached_warmup_state一样在网格回测的各组参数之间共用
+    """
+    _, high, low, close, volume = _load_history_arrays(*history_key)
+    return _warmup_cross_over(high, low, close, volume, np.array(params, dtype=np.float64), window - 1)
+
+
+def _stoch_cross_over(k, d, start: int, last_k=0.0, last_d=0.0, cross_over=False) -> np.ndarray:
+    """
+    按策略逐根判断的方式求KDJ金叉状态序列：金叉后为True、死叉后为False，保持到下一次交叉为止
+    
+    参数:
+        k, d: K/D值序列
+        start: 第一根判断交叉的K线 (数组管理器初始化完成) 的下标，之前的K线不判断
+        last_k, last_d: start上一根K线的K/D值 (策略初始为0)
+        cross_over: start之前的金叉状态
+    """
+    prev_k = np.concatenate((np.full(start + 1, last_k), k[start:-1]))
+    prev_d = np.concatenate((np.full(start + 1, last_d), d[start:-1]))
+    event = np.where((prev_k < prev_d) & (k > d), 1, np.where((prev_k > prev_d) & (k < d), -1, 0))
+    event[:start] = 0
+    last_event = np.maximum.accumulate(np.where(event != 0, np.arange(len(event)), -1))
+    return np.where(last_event >= 0, event[last_event] == 1, cross_over)
+
+
+def _warmup_cross_over(high, low, close, volume, params: np.ndarray, start: int,
+                       last_k=0.0, last_d=0.0, cross_over=False) -> bool:
+    """
+    逐根预热结束时的KDJ金叉状态，参数含义见 _stoch_cross_over
+    """
+    k, d = indicator_series(
+        np.asarray(close, dtype=np.float64), np.asarray(high, dtype=np.float64),
+        np.asarray(low, dtype=np.float64), np.asarray(volume, dtype=np.float64), params
+    )[:, 4:6].T
+    return bool(_stoch_cross_over(k, d, start, last_k, last_d, cross_over)[-1])
+
+
+def _run_grid_setting(strategy_class, engine_factory, setting: dict):
+    """
+    在工作进程中用一组参数运行一次完整回测 (每次新建引擎，不共享状态)
+    """
+    engine = engine_factory()
+    engine.add_strategy(strategy_class, {"log_level": 0, **setting})
+    
+    # 行情数据在所有参数组合之间不变，首次读取后缓存到磁盘供其他进程复用
+    engine.history_data = load_bar_data_cached(
+        engine.symbol, engine.exchange, engine.interval, engine.start, engine.end
+    )
+    
+    engine.run_backtesting()
+    engine.calculate_result()
+    return setting, engine.calculate_statistics(output=False)
+
 
 class BtcTripleSignalStrategy1h(CtaTemplate):
     """
@@ -74,6 +284,9 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
     volume_window = 20       # 计算平均成交量的周期
     volume_multiplier = 1.2  # 成交量必须是平均值的多少倍
     
+    # 日志级别：0=静默（回测/优化时使用），1=仅交易相关，2=详细调试
+    log_level = 2
+    
     # 策略变量
     fast_ma0 = 0.0        # 当前快速均线值
     fast_ma1 = 0.0        # 上一个快速均线值
@@ -112,7 +325,8 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
         "adx_length",      # 【新增】ADX周期参数
         "adx_threshold",    # 【新增】ADX阈值参数
         "volume_window",    # 【新增】成交量窗口参数
-        "volume_multiplier" # 【新增】成交量倍数参数
+        "volume_multiplier", # 【新增】成交量倍数参数
+        "log_level"         # 日志级别
     ]
     
     # 状态变量
@@ -140,25 +354,197 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
         "adx_value"         # 【新增】ADX值变量
     ]
     
+    # 增量计算路径新增的热字段使用槽位存储 (基类仍有__dict__，参数和状态变量不受影响)
+    __slots__ = (
+        "_log_level",
+        "_is_backtest",
+        "_indicator_params",
+        "_indicator_state",
+        "_volume_ma",
+        "_macd_sign",
+        "_atr_stop_delta",
+        "_activation_price_long",
+        "_activation_price_short",
+        "last_tick",
+    )
+    
+    # 网格优化的参数名及取值
+    grid_keys = ("rsi_buy_level", "stop_loss_pct")
+    
     @classmethod
-    def generate_settings(cls):
+    def grid_combos(cls) -> np.ndarray:
+        """
+        生成网格参数矩阵，形状为 (参数组合数, 参数个数)，列顺序与grid_keys一致
+        可直接用 np.array_split 分块分发给工作进程
+        """
+        rsi_grid = np.arange(20, 45, 5)                             # 20, 25, 30, 35, 40
+        sl_grid = np.array([0.03, 0.04, 0.05, 0.06, 0.07, 0.08])
+        return np.array(list(itertools.product(rsi_grid, sl_grid)), dtype=np.float64)
+    
+    @classmethod
+    def generate_settings(cls, combos: np.ndarray = None):
         """
         生成策略优化参数设置
         这是vnpy 4.x版本优化引擎需要的方法
+        
+        参数:
+            combos: 参数矩阵 (默认使用grid_combos())，可传入其中一块
+        返回:
+            逐个生成参数字典的生成器，取值类型与类属性默认值一致
         """
-        settings = []
-        
-        # 生成RSI买入阈值参数组合
-        for rsi_buy_level in range(20, 45, 5):  # 20, 25, 30, 35, 40
-            # 生成止损百分比参数组合
-            for stop_loss_pct in [0.03, 0.04, 0.05, 0.06, 0.07, 0.08]:
-                setting = {
-                    "rsi_buy_level": rsi_buy_level,
-                    "stop_loss_pct": stop_loss_pct
-                }
-                settings.append(setting)
-                
-        return settings
+        if combos is None:
+            combos = cls.grid_combos()
+        casts = [type(getattr(cls, key)) for key in cls.grid_keys]
+        
+        for row in combos.tolist():
+            yield {key: cast(value) for key, cast, value in zip(cls.grid_keys, casts, row)}
+    
+    @classmethod
+    def run_grid(cls, engine_factory, n_jobs: int = -1, settings=None):
+        """
+        多进程并行回测 generate_settings() 中的全部参数组合
+        
+        参数:
+            engine_factory: 无参可调用对象，返回已调用set_parameters的BacktestingEngine
+            n_jobs: 并行进程数，-1表示使用全部CPU核心
+            settings: 参数组合列表，默认使用generate_settings()
+        返回:
+            按优化目标(target_name)从高到低排序的 [(参数, 统计结果), ...]，
+            可用于在最优区域附近生成更细的第二轮网格
+        """
+        from joblib import Parallel, delayed
+        
+        if settings is None:
+            settings = cls.generate_settings()
+        
+        results = Parallel(n_jobs=n_jobs, backend="loky")(
+            delayed(_run_grid_setting)(cls, engine_factory, setting) for setting in settings
+        )
+        results.sort(key=lambda item: item[1].get(cls.target_name) or 0, reverse=True)
+        return results
+    
+    @classmethod
+    def backtest_grid(
+        cls,
+        ohlcv: np.ndarray,
+        settings=None,
+        capital: float = 100000,
+        rate: float = 0.0003,
+        slippage: float = 0.5,
+        size: float = 1,
+        pricetick: float = 0.01,
+        bars_per_year: int = 24 * 365,
+        am_size: int = 200,
+    ):
+        """
+        单进程向量化网格回测：指标序列只计算一次，全部参数组合在同一个数值内核中并行推进
+        
+        网格参数只改变阈值比较，指标序列对所有组合相同，因此先算出整段指标，
+        再把各组合的阈值广播成 (K线数, 组合数) 的信号矩阵交给 simulate_grid。
+        撮合规则与vnpy回测引擎一致，但资金曲线按K线而非按日统计，
+        结果用于快速筛选，最优区域仍应通过 run_grid 用完整引擎确认。
+        
+        参数:
+            ohlcv: 形状为 (5, N) 的开、高、低、收、量数组，前am_size根K线用于指标预热
+            settings: 参数组合列表，默认使用generate_settings()，只能包含网格参数
+            capital, rate, slippage, size, pricetick: 与BacktestingEngine.set_parameters含义相同
+            bars_per_year: 年化夏普率使用的每年K线数
+            am_size: 数组管理器大小
+        返回:
+            按优化目标(target_name)从高到低排序的 [(参数, 统计结果), ...]
+        """
+        if settings is None:
+            settings = cls.generate_settings()
+        settings = list(settings)
+        
+        equity, trade_count = cls.grid_equity(
+            ohlcv, settings, capital, rate, slippage, size, pricetick, am_size
+        )
+        
+        # 逐列统计
+        curve = equity[am_size - 1:]
+        returns = curve[1:] / curve[:-1] - 1
+        std = returns.std(axis=0)
+        sharpe = np.divide(returns.mean(axis=0), std, out=np.zeros_like(std), where=std > 0) * math.sqrt(bars_per_year)
+        drawdown = (curve / np.maximum.accumulate(curve, axis=0) - 1).min(axis=0)
+        
+        results = [
+            (setting, {
+                "end_balance": float(curve[-1, j]),
+                "total_return": float((curve[-1, j] / capital - 1) * 100),
+                "max_ddpercent": float(drawdown[j] * 100),
+                "total_trade_count": int(trade_count[j]),
+                "sharpe_ratio": float(sharpe[j]),
+            })
+            for j, setting in enumerate(settings)
+        ]
+        results.sort(key=lambda item: item[1].get(cls.target_name) or 0, reverse=True)
+        return results
+    
+    @classmethod
+    def grid_equity(
+        cls,
+        ohlcv: np.ndarray,
+        settings: list,
+        capital: float = 100000,
+        rate: float = 0.0003,
+        slippage: float = 0.5,
+        size: float = 1,
+        pricetick: float = 0.01,
+        am_size: int = 200,
+    ):
+        """
+        backtest_grid的撮合部分：返回逐K线权益 (K线数, 组合数) 和各组合的成交次数，参数含义见backtest_grid
+        """
+        for setting in settings:
+            extra = set(setting) - set(cls.grid_keys)
+            if extra:
+                raise ValueError(f"向量化网格回测只支持网格参数 {cls.grid_keys}，收到: {sorted(extra)}")
+        
+        open_, high, low, close, volume = np.asarray(ohlcv, dtype=np.float64)
+        start = am_size - 1
+        
+        # 整段指标序列 (与逐根增量计算的结果相同)
+        params = make_params(
+            cls.fast_window, cls.slow_window, cls.rsi_length,
+            cls.macd_fast_period, cls.macd_slow_period, cls.macd_signal_period,
+            cls.k_period, cls.slowing_period, cls.d_period,
+            cls.atr_length, cls.adx_length, cls.volume_window
+        )
+        fast_ma, slow_ma, rsi, macd_hist, k, d, atr, adx, volume_ma = indicator_series(
+            close, high, low, volume, params
+        ).T
+        
+        # 与参数无关的状态序列
+        trend = np.sign(fast_ma - slow_ma).astype(np.int8)
+        
+        # KDJ金叉/死叉状态保持到下一次交叉为止，首根可交易K线的上一根K/D视为0
+        stoch_cross_over = _stoch_cross_over(k, d, start)
+        
+        passed = (adx >= cls.adx_threshold) & (volume > volume_ma * cls.volume_multiplier)
+        macd_long = (macd_hist > 0).astype(np.int8)
+        macd_short = (macd_hist < 0).astype(np.int8)
+        kdj_long = stoch_cross_over.astype(np.int8)
+        kdj_short = (~stoch_cross_over & (k > 80) & (d > 80)).astype(np.int8)
+        
+        # 随参数变化的信号矩阵，形状为 (K线数, 组合数)
+        # stop_loss_pct只在on_stop的统计输出中使用，不影响交易，因此只有rsi_buy_level进入信号矩阵
+        rsi_buy = np.array(
+            [setting.get("rsi_buy_level", cls.rsi_buy_level) for setting in settings], dtype=np.float64
+        ).reshape(1, -1)
+        rsi_long = rsi[:, None] <= rsi_buy
+        rsi_short = ~rsi_long & (rsi >= cls.rsi_sell_level)[:, None]
+        long_signals = rsi_long.astype(np.int8) + macd_long[:, None] + kdj_long[:, None]
+        short_signals = rsi_short.astype(np.int8) + macd_short[:, None] + kdj_short[:, None]
+        enter_long = (passed & (trend == 1))[:, None] & (long_signals >= cls.signal_num)
+        enter_short = (passed & (trend == -1))[:, None] & (short_signals >= cls.signal_num)
+        
+        return simulate_grid(
+            open_, high, low, close, rsi, trend, atr * cls.atr_multiplier,
+            enter_long, enter_short, rsi >= cls.rsi_sell_level, rsi_long,
+            start, cls.signal_count >= cls.signal_num, cls.trailing_stop_activation_pct,
+            cls.fixed_size, pricetick, size, rate, slippage, capital
+        )
 
     def __init__(self, cta_engine, strategy_name, vt_symbol, setting):
         """
@@ -169,8 +555,8 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
         # 创建K线生成器（直接使用1小时K线）
         self.bg = BarGenerator(self.on_bar, interval=Interval.HOUR)
         
-        # 创建数组管理器
-        self.am = ArrayManager(200)
+        # 创建数组管理器 (float32存储，指标累加状态仍为float64)
+        self.am = ArrayManager32(200)
         
         # 初始化策略状态
         self.pos = 0
@@ -194,6 +580,28 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
         # 滑点控制变量
         self.last_tick = None     # 最新的Tick数据
         
+        # 日志级别 (热路径上的日志先判断级别，避免无用的字符串格式化)
+        self._log_level = self.log_level
+        
+        # 是否运行在回测引擎中
+        self._is_backtest = self.get_engine_type() == EngineType.BACKTESTING
+        
+        # 增量指标状态 (数组管理器首次初始化时用历史数据播种，之后每根K线O(1)更新)
+        self._indicator_params = make_params(
+            self.fast_window, self.slow_window, self.rsi_length,
+            self.macd_fast_period, self.macd_slow_period, self.macd_signal_period,
+            self.k_period, self.slowing_period, self.d_period,
+            self.atr_length, self.adx_length, self.volume_window
+        )
+        self._indicator_state = None
+        self._volume_ma = 0.0     # 成交量均值 (由指标内核维护窗口和)
+        self._macd_sign = 0       # MACD柱状图符号缓存 (1/0/-1)，只在符号变化时更新
+        self._atr_stop_delta = 0.0  # ATR止损距离 (ATR * 倍数)，每根K线计算一次
+        
+        # 移动止损激活价格，开仓成交及策略启动时计算
+        self._activation_price_long = 0.0
+        self._activation_price_short = 0.0
+        
     def on_init(self):
         """
         策略初始化回调
@@ -204,8 +612,13 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
         # 至少需要 MACD 慢线周期 + 信号线周期 的长度
         init_days = 5  # 假设每天有24小时数据，加载5天的数据即可满足MACD计算需求
         
-        # 加载足够的历史数据进行指标预热
-        self.load_bar(init_days)
+        # 加载足够的历史数据进行指标预热，整段历史转为数组后批量预热，不逐根回调on_bar
+        # 回测时历史数据区间固定，直接使用缓存的数组，网格回测的各组参数无需重复读取
+        if self._is_backtest:
+            self.warmup_from_history(init_days)
+        else:
+            bars = self.cta_engine.load_bar(self.vt_symbol, init_days, Interval.MINUTE, self.on_bar, False)
+            self.warmup_from_arrays(*_bars_to_arrays(bars))
         
         self.write_log(f"策略初始化完成，预热期：{init_days}天，数组管理器大小：200")
         
@@ -214,6 +627,11 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
         策略启动回调
         """
         self.write_log("策略启动")
+
+        # 激活价格不在同步变量中，按 (可能由同步数据恢复的) 开仓价重算，避免重启后持仓立即触发移动止损
+        self._activation_price_long = self.entry_price * (1 + self.trailing_stop_activation_pct)
+        self._activation_price_short = self.entry_price * (1 - self.trailing_stop_activation_pct)
+
         self.write_log(f"合约代码：{self.vt_symbol}")
         self.write_log(f"策略名称：{self.strategy_name}")
         self.write_log(f"固定手数：{self.fixed_size}")
@@ -364,87 +782,177 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
         self.bar_count += 1
         self.last_price = bar.close_price
         
-        # 更新最高价/最低价
+        # 更新最高价/最低价 (直接比较，不经过max/min内置函数)
         if self.pos > 0:
-            self.intra_trade_high = max(self.intra_trade_high, bar.high_price)
+            high = bar.high_price
+            if high > self.intra_trade_high:
+                self.intra_trade_high = high
         elif self.pos < 0:
-            self.intra_trade_low = min(self.intra_trade_low, bar.low_price)
+            low = bar.low_price
+            if low < self.intra_trade_low:
+                self.intra_trade_low = low
             
         # 更新技术指标
         am = self.am
         am.update_bar(bar)
         
         # 每隔100个bar输出一次调试信息
-        if self.bar_count % 100 == 0:
-            self.write_log(f"处理第{self.bar_count}个K线，价格={bar.close_price:.2f}")
-            self.write_log(f"数组管理器初始化状态: {'已初始化' if am.inited else '未初始化'}")
+        verbose = self._log_level >= 2
+        if verbose and self.bar_count % 100 == 0:
+            self.write_log("处理第%d个K线，价格=%.2f" % (self.bar_count, bar.close_price))
+            self.write_log("数组管理器初始化状态: %s" % ('已初始化' if am.inited else '未初始化'))
         
         # 只有当数组管理器初始化后才计算指标和生成信号
         if am.inited:
             # 计算技术指标
-            self.calculate_indicators()
+            self.calculate_indicators(bar)
             
             # 如果数组管理器已初始化，每隔100个bar输出一次指标值
-            if self.bar_count % 100 == 0:
-                self.write_log(f"技术指标值: RSI={self.rsi_value:.2f}, MACD={self.macd_value:.4f}, KDJ=({self.k_value:.2f},{self.d_value:.2f})")
-                self.write_log(f"均线值: 快线={self.fast_ma0:.2f}, 慢线={self.slow_ma0:.2f}, 趋势={self.ma_trend}")
+            if verbose and self.bar_count % 100 == 0:
+                self.write_log("技术指标值: RSI=%.2f, MACD=%.4f, KDJ=(%.2f,%.2f)" % (self.rsi_value, self.macd_value, self.k_value, self.d_value))
+                self.write_log("均线值: 快线=%.2f, 慢线=%.2f, 趋势=%d" % (self.fast_ma0, self.slow_ma0, self.ma_trend))
             
             # 生成交易信号
             self.generate_signals(bar)
         else:
             # 数据预热中
-            if self.bar_count % 10 == 0:
-                self.write_log(f"数据预热中，当前数据量: {len(am.close_array)}")
+            if verbose and self.bar_count % 10 == 0:
+                self.write_log("数据预热中，当前数据量: %d" % len(am.close_array))
         
-        # 触发UI更新
-        self.put_event()
+        # 触发UI更新 (回测时没有界面监听，每1024根K线才推送一次)
+        if not self._is_backtest or (self.bar_count & 1023) == 0:
+            self.put_event()
+        
+    def warmup_from_history(self, days: int, interval: Interval = Interval.MINUTE):
+        """
+        回测时批量预热：使用缓存的历史数组和指标状态
+        
+        参数:
+            days: 预热天数
+            interval: K线周期，默认与load_bar一致
+        """
+        engine = self.cta_engine
+        history_key = (
+            self.vt_symbol,
+            interval,
+            engine.start - timedelta(days=days),
+            engine.start - INTERVAL_DELTA_MAP[interval],
+        )
+        arrays = _load_history_arrays(*history_key)
+        
+        # 数组管理器能被填满时直接取缓存的指标状态，从空开始预热时KDJ金叉状态也取缓存的结果
+        state = None
+        cross_over = None
+        if self.am.count + arrays.shape[1] >= self.am.size:
+            params = tuple(self._indicator_params.tolist())
+            state = _cached_warmup_state(history_key, self.am.size, params)
+            if self.am.count == 0:
+                cross_over = _cached_warmup_cross_over(history_key, self.am.size, params)
+        self.warmup_from_arrays(*arrays, state=state, cross_over=cross_over)
+    
+    def warmup_from_arrays(
+        self, open_arr, high_arr, low_arr, close_arr, vol_arr,
+        state: np.ndarray = None, cross_over: bool = None
+    ):
+        """
+        用历史OHLCV数组批量预热：一次性写入数组管理器并播种指标状态，之后转入逐根增量更新
+        
+        参数:
+            open_arr, high_arr, low_arr, close_arr, vol_arr: 按时间排序的历史K线数组
+            state: 已播种的指标状态 (只读，会复制一份)，为None时用数组管理器中的数据计算
+            cross_over: 预热结束时的KDJ金叉状态，为None时按逐根预热的交叉判断从历史数据计算
+        """
+        n = len(close_arr)
+        if not n:
+            return
+        
+        # 写入数组管理器 (最多保留最后size根)
+        am = self.am
+        count = am.count
+        k = min(n, am.size)
+        for target, values in zip(
+            (am.open_array, am.high_array, am.low_array, am.close_array, am.volume_array),
+            (open_arr, high_arr, low_arr, close_arr, vol_arr)
+        ):
+            target[:-k] = target[k:]
+            target[-k:] = values[-k:]
+        am.count += n
+        am.inited = am.count >= am.size
+        
+        self.bar_count += n
+        self.last_price = float(close_arr[-1])
         
-    def calculate_indicators(self):
+        # 数组管理器已满时播种指标状态，后续由calculate_indicators原地更新
+        if am.inited:
+            if state is None:
+                state = warmup_state(
+                    am.close_array, am.high_array, am.low_array, am.volume_array, self._indicator_params
+                )
+            else:
+                state = state.copy()
+            
+            # 逐根预热时数组管理器初始化后的每根K线都会判断KDJ交叉，金叉状态取最后一次交叉的结果
+            if cross_over is None:
+                cross_over = _warmup_cross_over(
+                    high_arr, low_arr, close_arr, vol_arr, self._indicator_params,
+                    max(am.size - count - 1, 0), self.k_value, self.d_value, self.stoch_cross_over
+                )
+            self._indicator_state = state
+            self._apply_indicator_values(indicator_values(state))
+            self.stoch_cross_over = cross_over
+    
+    def calculate_indicators(self, bar: BarData):
         """
         计算技术指标
+        
+        首次调用时用数组管理器中的历史数据播种增量状态，之后只用新K线更新
         """
         # 如果数组管理器未初始化，则直接返回
         am = self.am
         if not am.inited:
             return
+        
+        if self._indicator_state is None:
+            self._indicator_state = warmup_state(
+                am.close_array, am.high_array, am.low_array, am.volume_array, self._indicator_params
+            )
+            values = indicator_values(self._indicator_state)
+        else:
+            values = step_indicators(bar.close_price, bar.high_price, bar.low_price, bar.volume, self._indicator_state)
+        self._apply_indicator_values(values)
+    
+    def _apply_indicator_values(self, values: tuple):
+        """
+        将指标内核的输出写入策略变量，并更新趋势和KDJ交叉状态
+        """
+        fast_ma, slow_ma, rsi, macd_hist, k, d, atr, adx, self._volume_ma = values
             
         # 计算均线
         self.fast_ma1 = self.fast_ma0
         self.slow_ma1 = self.slow_ma0
-        self.fast_ma0 = am.sma(self.fast_window, array=False)
-        self.slow_ma0 = am.sma(self.slow_window, array=False)
-        
-        # 计算均线趋势
-        if self.fast_ma0 > self.slow_ma0:
-            self.ma_trend = 1  # 上升趋势
-        elif self.fast_ma0 < self.slow_ma0:
-            self.ma_trend = -1  # 下降趋势
-        else:
-            self.ma_trend = 0  # 横盘整理
+        self.fast_ma0 = fast_ma
+        self.slow_ma0 = slow_ma
+        
+        # 计算均线趋势：1上升、-1下降、0横盘，只在快慢线差值变号时改写
+        diff = fast_ma - slow_ma
+        trend = int(diff > 0) - int(diff < 0)
+        if trend != self.ma_trend:
+            self.ma_trend = trend
         
         # 计算RSI
-        self.rsi_value = am.rsi(self.rsi_length, array=False)
+        self.rsi_value = rsi
         
         # 计算MACD
-        macd, signal, hist = am.macd(
-            self.macd_fast_period, 
-            self.macd_slow_period, 
-            self.macd_signal_period, 
-            array=False
-        )
-        self.macd_value = hist  # 使用MACD柱状图作为信号
+        self.macd_value = macd_hist  # 使用MACD柱状图作为信号
+        macd_sign = int(macd_hist > 0) - int(macd_hist < 0)
+        if macd_sign != self._macd_sign:
+            self._macd_sign = macd_sign
         
         # 计算KDJ
         self.last_k = self.k_value
         self.last_d = self.d_value
-        self.k_value, self.d_value = am.stoch(
-            self.k_period,       # fastk_period
-            self.slowing_period, # slowk_period
-            0,                   # slowk_matype
-            self.d_period,       # slowd_period
-            0,                   # slowd_matype
-            array=False
-        )
+        self.k_value = k
+        self.d_value = d
         
         # 判断KDJ金叉
         if self.last_k < self.last_d and self.k_value > self.d_value:
@@ -454,46 +962,61 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
             self.stoch_cross_over = False
             
         # 【新增】计算ATR
-        self.atr_value = am.atr(self.atr_length, array=False)
+        self.atr_value = atr
+        self._atr_stop_delta = atr * self.atr_multiplier
         
         # 【新增】计算ADX
-        self.adx_value = am.adx(self.adx_length, array=False)
-
+        self.adx_value = adx
+    
     def manage_long_position(self, bar: BarData):
         """
         管理多头持仓
         """
+        # 频繁读取的属性先取为局部变量
+        close_price = bar.close_price
+        atr = self.atr_value
+        atr_stop_delta = self._atr_stop_delta
+        log_level = self._log_level
+        qty = self.pos  # 平仓数量 (调用方已保证持仓方向)
+        
         # 【修改】使用ATR计算动态止损价
-        atr_stop_price = bar.close_price - self.atr_value * self.atr_multiplier
+        atr_stop_price = close_price - atr_stop_delta
         
-        # 检查是否达到移动止损激活阈值
-        if bar.close_price > self.entry_price * (1 + self.trailing_stop_activation_pct):
+        # 检查是否达到移动止损激活阈值 (激活价格在开仓成交或策略启动时已算好)
+        if close_price > self._activation_price_long:
             # 【修改】根据持仓期间最高价和ATR计算新的止损价
-            new_stop_price = self.intra_trade_high - self.atr_value * self.atr_multiplier
+            new_stop_price = self.intra_trade_high - atr_stop_delta
             
             # 只有当新的止损价更优（更高）时才更新止损价
             if new_stop_price > self.trailing_stop_price:
                 old_stop = self.trailing_stop_price
                 self.trailing_stop_price = new_stop_price
-                self.write_log(f"更新多头移动ATR止损价：{old_stop:.2f} -> {self.trailing_stop_price:.2f} (最高价：{self.intra_trade_high:.2f}, ATR：{self.atr_value:.2f})")
+                if log_level >= 2:
+                    self.write_log("更新多头移动ATR止损价：%.2f -> %.2f (最高价：%.2f, ATR：%.2f)" % (old_stop, new_stop_price, self.intra_trade_high, atr))
+        
+        stop_price = self.trailing_stop_price
+        rsi = self.rsi_value
         
         # 止损：价格跌破止损线
-        if bar.close_price <= self.trailing_stop_price:
-            self.controlled_sell(abs(self.pos))
-            self.write_log(f"多头止损/移动止损：价格={bar.close_price:.2f}, 止损价={self.trailing_stop_price:.2f}, ATR={self.atr_value:.2f}")
+        if close_price <= stop_price:
+            self.controlled_sell(qty)
+            if log_level >= 1:
+                self.write_log(f"多头止损/移动止损：价格={close_price:.2f}, 止损价={stop_price:.2f}, ATR={atr:.2f}")
             return True
             
         # 止盈（RSI超买区域）
-        elif self.rsi_value >= self.rsi_sell_level:
-            self.controlled_sell(abs(self.pos))
-            self.write_log(f"多头止盈：价格={bar.close_price:.2f}, RSI={self.rsi_value:.2f}")
+        elif rsi >= self.rsi_sell_level:
+            self.controlled_sell(qty)
+            if log_level >= 1:
+                self.write_log(f"多头止盈：价格={close_price:.2f}, RSI={rsi:.2f}")
             return True
             
         # 信号反转（有足够的空头信号）
         elif (self.signal_count >= self.signal_num and 
               self.ma_trend == -1):
-            self.controlled_sell(abs(self.pos))
-            self.write_log(f"多头反转平仓：价格={bar.close_price:.2f}, 信号数={self.signal_count}")
+            self.controlled_sell(qty)
+            if log_level >= 1:
+                self.write_log(f"多头反转平仓：价格={close_price:.2f}, 信号数={self.signal_count}")
             return True
             
         return False  # 未平仓
@@ -502,37 +1025,51 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
         """
         管理空头持仓
         """
+        # 频繁读取的属性先取为局部变量
+        close_price = bar.close_price
+        atr = self.atr_value
+        atr_stop_delta = self._atr_stop_delta
+        log_level = self._log_level
+        qty = -self.pos  # 平仓数量 (调用方已保证持仓方向)
+        
         # 【修改】使用ATR计算动态止损价
-        atr_stop_price = bar.close_price + self.atr_value * self.atr_multiplier
+        atr_stop_price = close_price + atr_stop_delta
         
-        # 检查是否达到移动止损激活阈值
-        if bar.close_price < self.entry_price * (1 - self.trailing_stop_activation_pct):
+        # 检查是否达到移动止损激活阈值 (激活价格在开仓成交或策略启动时已算好)
+        if close_price < self._activation_price_short:
             # 【修改】根据持仓期间最低价和ATR计算新的止损价
-            new_stop_price = self.intra_trade_low + self.atr_value * self.atr_multiplier
+            new_stop_price = self.intra_trade_low + atr_stop_delta
             
             # 只有当新的止损价更优（更低）时才更新止损价
             if self.trailing_stop_price == 0 or new_stop_price < self.trailing_stop_price:
                 old_stop = self.trailing_stop_price
                 self.trailing_stop_price = new_stop_price
-                self.write_log(f"更新空头移动ATR止损价：{old_stop:.2f} -> {self.trailing_stop_price:.2f} (最低价：{self.intra_trade_low:.2f}, ATR：{self.atr_value:.2f})")
+                if log_level >= 2:
+                    self.write_log("更新空头移动ATR止损价：%.2f -> %.2f (最低价：%.2f, ATR：%.2f)" % (old_stop, new_stop_price, self.intra_trade_low, atr))
+        
+        stop_price = self.trailing_stop_price
+        rsi = self.rsi_value
         
         # 止损：价格涨破止损线
-        if bar.close_price >= self.trailing_stop_price:
-            self.controlled_cover(abs(self.pos))
-            self.write_log(f"空头止损/移动止损：价格={bar.close_price:.2f}, 止损价={self.trailing_stop_price:.2f}, ATR={self.atr_value:.2f}")
+        if close_price >= stop_price:
+            self.controlled_cover(qty)
+            if log_level >= 1:
+                self.write_log(f"空头止损/移动止损：价格={close_price:.2f}, 止损价={stop_price:.2f}, ATR={atr:.2f}")
             return True
             
         # 止盈（RSI超卖区域）
-        elif self.rsi_value <= self.rsi_buy_level:
-            self.controlled_cover(abs(self.pos))
-            self.write_log(f"空头止盈：价格={bar.close_price:.2f}, RSI={self.rsi_value:.2f}")
+        elif rsi <= self.rsi_buy_level:
+            self.controlled_cover(qty)
+            if log_level >= 1:
+                self.write_log(f"空头止盈：价格={close_price:.2f}, RSI={rsi:.2f}")
             return True
             
         # 信号反转（有足够的多头信号）
         elif (self.signal_count >= self.signal_num and 
               self.ma_trend == 1):
-            self.controlled_cover(abs(self.pos))
-            self.write_log(f"空头反转平仓：价格={bar.close_price:.2f}, 信号数={self.signal_count}")
+            self.controlled_cover(qty)
+            if log_level >= 1:
+                self.write_log(f"空头反转平仓：价格={close_price:.2f}, 信号数={self.signal_count}")
             return True
             
         return False  # 未平仓
@@ -555,106 +1092,117 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
             return  # 管理完持仓后直接返回
             
         # --- 以下是开仓逻辑，只有在 self.pos == 0 时才会执行 ---
-
-        # 【第1层：市场状态过滤器】 - 最高优先级
-        if self.adx_value < self.adx_threshold:
-            # self.write_log(f"第1层过滤: ADX({self.adx_value:.2f}) < 阈值({self.adx_threshold})，市场无趋势，暂停交易。")
-            return  # 提前退出，不进行后续判断
-
-        # 【第2层：交易方向过滤器】 - 中等优先级
-        # (此处的均线趋势 ma_trend 在 calculate_indicators 中已计算好)
+        # 三层过滤的结果编码为4位决策码，查表得到开仓动作，不再逐层 if/elif 判断：
+        #   bit3 第1层 市场状态：ADX >= 阈值
+        #   bit2 第2层 交易方向：均线趋势不为0
+        #   bit1 第3层 入场时机：信号数达到阈值且成交量确认通过
+        #   bit0 方向：0为多头，1为空头
         ma_signal = self.ma_trend
-        if ma_signal == 0:
-            # self.write_log("第2层过滤: 均线趋势不明，暂停交易。")
-            return # 均线方向不明，不交易
-
-        # --- 如果能通过前两层过滤，说明市场既有趋势，方向也明确，值得寻找交易机会 ---
-        self.write_log(f"通过前两层过滤: ADX={self.adx_value:.2f}, 均线趋势={ma_signal}。准备寻找入场点...")
-
-        # 【第3层：入场时机触发器】 - 最低优先级
+        adx_ok = int(self.adx_value >= self.adx_threshold)
+        trend_ok = ma_signal & 1    # 1/-1 -> 1, 0 -> 0
         
-        # a. 计算入场信号 (RSI/MACD/KDJ)
-        rsi_signal = 1 if self.rsi_value <= self.rsi_buy_level else (-1 if self.rsi_value >= self.rsi_sell_level else 0)
-        macd_signal = 1 if self.macd_value > 0 else (-1 if self.macd_value < 0 else 0)
-        # 简化KDJ信号逻辑：金叉为买入，死叉为卖出
-        kdj_signal = 1 if self.stoch_cross_over else (-1 if (not self.stoch_cross_over and self.k_value > 80 and self.d_value > 80) else 0)
+        # 入场信号 (RSI/MACD/KDJ) 计数和成交量确认由内核完成
+        # 返回带方向的信号数：正数为多头开仓，负数为空头开仓，0为不开仓
+        action = decide(
+            self.rsi_value, self._macd_sign, self.k_value, self.d_value, self.stoch_cross_over,
+            ma_signal, self.signal_num, self._volume_ma * self.volume_multiplier, bar.volume,
+            self.rsi_buy_level, self.rsi_sell_level
+        )
+        code = (adx_ok << 3) | (trend_ok << 2) | (int(action != 0) << 1) | int(action < 0)
         
-        long_signals = (rsi_signal == 1) + (macd_signal == 1) + (kdj_signal == 1)
-        short_signals = (rsi_signal == -1) + (macd_signal == -1) + (kdj_signal == -1)
+        if self._log_level >= 2 and code >= 0b1100:
+            self.write_log("通过前两层过滤: ADX=%.2f, 均线趋势=%d。准备寻找入场点..." % (self.adx_value, ma_signal))
         
-        # b. 成交量确认
-        volume_ma = self.am.volume_array[-self.volume_window:].mean()
-        volume_check_passed = bar.volume > (volume_ma * self.volume_multiplier)
-        if not volume_check_passed:
-            # self.write_log(f"第3层过滤: 成交量确认失败，暂停交易。")
-            return
-
-        # --- 最终决策 ---
-        # 结合方向(第2层)和时机(第3层)进行开仓
-        
-        # 寻找多头机会
-        if ma_signal == 1:
-            if long_signals >= self.signal_num:
-                self.write_log(f"最终决策: 多头开仓。信号数({long_signals}) >= 阈值({self.signal_num})")
-                self.write_log(f"成交量确认通过: 当前 {bar.volume:.2f} > 均值*倍数 {volume_ma * self.volume_multiplier:.2f}")
-                self.write_log(f"信号详情：RSI={self.rsi_value:.2f}({rsi_signal}), MACD={self.macd_value:.4f}({macd_signal}), KDJ金叉={self.stoch_cross_over}({kdj_signal})")
-                self.controlled_buy(self.fixed_size)
-                self.entry_price = bar.close_price
-                self.intra_trade_high = bar.high_price
-            # else:
-                # self.write_log("等待多头入场信号...")
-
-        # 寻找空头机会
-        elif ma_signal == -1:
-            if short_signals >= self.signal_num:
-                self.write_log(f"最终决策: 空头开仓。信号数({short_signals}) >= 阈值({self.signal_num})")
-                self.write_log(f"成交量确认通过: 当前 {bar.volume:.2f} > 均值*倍数 {volume_ma * self.volume_multiplier:.2f}")
-                self.write_log(f"信号详情：RSI={self.rsi_value:.2f}({rsi_signal}), MACD={self.macd_value:.4f}({macd_signal}), KDJ死叉={not self.stoch_cross_over}({kdj_signal})")
-                self.controlled_short(self.fixed_size)
-                self.entry_price = bar.close_price
-                self.intra_trade_low = bar.low_price
-            # else:
-                # self.write_log("等待空头入场信号...")
+        enter = self._ENTRY_ACTIONS[code]
+        if enter is not None:
+            enter(self, bar, action)
+    
+    def _log_entry(self, bar: BarData, action: int):
+        """
+        输出开仓决策日志
+        """
+        log_level = self._log_level
+        if log_level >= 1:
+            self.write_log(f"最终决策: {'多头' if action > 0 else '空头'}开仓。信号数({abs(action)}) >= 阈值({self.signal_num})")
+        if log_level >= 2:
+            rsi = self.rsi_value
+            k = self.k_value
+            d = self.d_value
+            sc = self.stoch_cross_over
+            rsi_signal = 1 if rsi <= self.rsi_buy_level else (-1 if rsi >= self.rsi_sell_level else 0)
+            kdj_signal = 1 if sc else (-1 if k > 80 and d > 80 else 0)
+            self.write_log(f"成交量确认通过: 当前 {bar.volume:.2f} > 均值*倍数 {self._volume_ma * self.volume_multiplier:.2f}")
+            self.write_log(f"信号详情：RSI={rsi:.2f}({rsi_signal}), MACD={self.macd_value:.4f}({self._macd_sign}), "
+                           f"KDJ{'金叉' if action > 0 else '死叉'}={sc if action > 0 else not sc}({kdj_signal})")
+    
+    def _enter_long(self, bar: BarData, action: int):
+        """
+        多头开仓
+        """
+        self._log_entry(bar, action)
+        self.controlled_buy(self.fixed_size)
+        self.entry_price = bar.close_price
+        self.intra_trade_high = bar.high_price
+    
+    def _enter_short(self, bar: BarData, action: int):
+        """
+        空头开仓
+        """
+        self._log_entry(bar, action)
+        self.controlled_short(self.fixed_size)
+        self.entry_price = bar.close_price
+        self.intra_trade_low = bar.low_price
+    
+    # 决策码 -> 开仓动作，只有三层过滤全部通过 (0b1110 / 0b1111) 时开仓
+    _ENTRY_ACTIONS = (None,) * 14 + (_enter_long, _enter_short)
                 
     def on_order(self, order: OrderData):
         """
         委托回报更新
         """
-        # 打印委托信息
-        if order.status == Status.SUBMITTING:
-            self.write_log(f"提交委托：{order.direction.value} {order.offset.value} {order.volume}@{order.price}")
-        elif order.status == Status.ALLTRADED:
-            self.write_log(f"委托全部成交：{order.direction.value} {order.offset.value} {order.volume}@{order.price}")
-        elif order.status in [Status.CANCELLED, Status.REJECTED]:
-            self.write_log(f"委托已取消/拒绝：{order.direction.value} {order.offset.value} {order.volume}@{order.price}")
+        # 打印委托信息 (各分支都只输出日志，静默时整段跳过)
+        if self._log_level >= 1:
+            status = order.status
+            if status == _STATUS_SUBMITTING:
+                self.write_log(f"提交委托：{order.direction.value} {order.offset.value} {order.volume}@{order.price}")
+            elif status == _STATUS_ALLTRADED:
+                self.write_log(f"委托全部成交：{order.direction.value} {order.offset.value} {order.volume}@{order.price}")
+            elif status == _STATUS_CANCELLED or status == _STATUS_REJECTED:
+                self.write_log(f"委托已取消/拒绝：{order.direction.value} {order.offset.value} {order.volume}@{order.price}")
             
-        # 触发UI更新
-        self.put_event()
+        # 触发UI更新 (回测时没有界面监听，不推送；实盘每次回报都推送)
+        if not self._is_backtest:
+            self.put_event()
         
     def on_trade(self, trade: TradeData):
         """
         成交回报更新
         """
         # 打印成交信息
-        self.write_log(f"成交：{trade.direction.value} {trade.offset.value} {trade.volume}@{trade.price}")
+        if self._log_level >= 1:
+            self.write_log(f"成交：{trade.direction.value} {trade.offset.value} {trade.volume}@{trade.price}")
         
         # 更新持仓成本和止损价格
-        if trade.offset.value == "开":  # 开仓
+        if trade.offset == _OPEN:  # 开仓
             # 设置入场价格
             self.entry_price = trade.price
             
-            if trade.direction == Direction.LONG:  # 多头开仓
+            if trade.direction == _LONG:  # 多头开仓
                 self.intra_trade_high = trade.price
+                self._activation_price_long = trade.price * (1 + self.trailing_stop_activation_pct)
                 # 【修改】使用ATR设置初始止损价格
-                stop_price = trade.price - self.atr_value * self.atr_multiplier
+                stop_price = trade.price - self._atr_stop_delta
                 self.trailing_stop_price = stop_price
-                self.write_log(f"设置多头初始ATR止损价：{self.trailing_stop_price:.2f} (ATR={self.atr_value:.2f})")
+                if self._log_level >= 1:
+                    self.write_log(f"设置多头初始ATR止损价：{self.trailing_stop_price:.2f} (ATR={self.atr_value:.2f})")
             else:  # 空头开仓
                 self.intra_trade_low = trade.price
+                self._activation_price_short = trade.price * (1 - self.trailing_stop_activation_pct)
                 # 【修改】使用ATR设置初始止损价格
-                stop_price = trade.price + self.atr_value * self.atr_multiplier
+                stop_price = trade.price + self._atr_stop_delta
                 self.trailing_stop_price = stop_price
-                self.write_log(f"设置空头初始ATR止损价：{self.trailing_stop_price:.2f} (ATR={self.atr_value:.2f})")
+                if self._log_level >= 1:
+                    self.write_log(f"设置空头初始ATR止损价：{self.trailing_stop_price:.2f} (ATR={self.atr_value:.2f})")
         else:  # 平仓
             # 重置相关变量
             self.entry_price = 0.0
@@ -662,68 +1210,78 @@ class BtcTripleSignalStrategy1h(CtaTemplate):
             self.intra_trade_low = 0
             self.trailing_stop_price = 0.0
                 
-        # 触发UI更新
-        self.put_event()
+        # 触发UI更新 (回测时没有界面监听，不推送；实盘每次回报都推送)
+        if not self._is_backtest:
+            self.put_event()
         
     def on_stop_order(self, stop_order: StopOrder):
         """
         停止单回报更新
         """
-        # 触发UI更新
-        self.put_event() 
+        # 触发UI更新 (回测时没有界面监听，不推送；实盘每次回报都推送)
+        if not self._is_backtest:
+            self.put_event()
 
     def controlled_buy(self, volume):
         """
         带滑点控制的买入开仓
         """
         if not self.last_tick:
-            self.write_log("当前无可用Tick数据，使用市价单买入")
+            if self._log_level >= 1:
+                self.write_log("当前无可用Tick数据，使用市价单买入")
             self.buy(self.last_price, volume)
             return
             
         # 使用卖一价加上允许的滑点作为限价单价格
         limit_price = self.last_tick.ask_price_1 * (1 + self.slippage_tolerance_pct)
         self.buy(limit_price, volume)
-        self.write_log(f"限价买入: 数量={volume}, 价格={limit_price:.2f} (卖一价={self.last_tick.ask_price_1:.2f}, 滑点={self.slippage_tolerance_pct*100}%)")
+        if self._log_level >= 1:
+            self.write_log(f"限价买入: 数量={volume}, 价格={limit_price:.2f} (卖一价={self.last_tick.ask_price_1:.2f}, 滑点={self.slippage_tolerance_pct*100}%)")
     
     def controlled_sell(self, volume):
         """
         带滑点控制的卖出平仓
         """
         if not self.last_tick:
-            self.write_log("当前无可用Tick数据，使用市价单卖出")
+            if self._log_level >= 1:
+                self.write_log("当前无可用Tick数据，使用市价单卖出")
             self.sell(self.last_price, volume)
             return
             
         # 使用买一价减去允许的滑点作为限价单价格
         limit_price = self.last_tick.bid_price_1 * (1 - self.slippage_tolerance_pct)
         self.sell(limit_price, volume)
-        self.write_log(f"限价卖出: 数量={volume}, 价格={limit_price:.2f} (买一价={self.last_tick.bid_price_1:.2f}, 滑点={self.slippage_tolerance_pct*100}%)")
+        if self._log_level >= 1:
+            self.write_log(f"限价卖出: 数量={volume}, 价格={limit_price:.2f} (买一价={self.last_tick.bid_price_1:.2f}, 滑点={self.slippage_tolerance_pct*100}%)")
     
     def controlled_short(self, volume):
         """
         带滑点控制的卖出开仓
         """
         if not self.last_tick:
-            self.write_log("当前无可用Tick数据，使用市价单做空")
+            if self._log_level >= 1:
+                self.write_log("当前无可用Tick数据，使用市价单做空")
             self.short(self.last_price, volume)
             return
             
         # 使用买一价减去允许的滑点作为限价单价格
         limit_price = self.last_tick.bid_price_1 * (1 - self.slippage_tolerance_pct)
         self.short(limit_price, volume)
-        self.write_log(f"限价做空: 数量={volume}, 价格={limit_price:.2f} (买一价={self.last_tick.bid_price_1:.2f}, 滑点={self.slippage_tolerance_pct*100}%)")
+        if self._log_level >= 1:
+            self.write_log(f"限价做空: 数量={volume}, 价格={limit_price:.2f} (买一价={self.last_tick.bid_price_1:.2f}, 滑点={self.slippage_tolerance_pct*100}%)")
     
     def controlled_cover(self, volume):
         """
         带滑点控制的买入平仓
         """
         if not self.last_tick:
-            self.write_log("当前无可用Tick数据，使用市价单平空")
+            if self._log_level >= 1:
+                self.write_log("当前无可用Tick数据，使用市价单平空")
             self.cover(self.last_price, volume)
             return
             
         # 使用卖一价加上允许的滑点作为限价单价格
         limit_price = self.last_tick.ask_price_1 * (1 + self.slippage_tolerance_pct)
         self.cover(limit_price, volume)
-        self.write_log(f"限价平空: 数量={volume}, 价格={limit_price:.2f} (卖一价={self.last_tick.ask_price_1:.2f}, 滑点={self.slippage_tolerance_pct*100}%)") 
\ No newline at end of file
+        if self._log_level >= 1:
+            self.write_log(f"限价平空: 数量={volume}, 价格={limit_price:.2f} (卖一价={self.last_tick.ask_price_1:.2f}, 滑点={self.slippage_tolerance_pct*100}%)") 
\ No newline at end of file
@@ -4,6 +4,11 @@
 import math
 import sys
 import os
+import threading
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
 
 # 添加当前目录到路径
 sys.path.append(os.path.abspath("."))
@@ -13,16 +18,191 @@ from vnpy_ctastrategy import (
     CtaTemplate,
     StopOrder,
 )
+from vnpy_ctastrategy.base import EngineType
 from vnpy.trader.object import (
     TickData,
     BarData,
     TradeData,
     OrderData,
 )
-from vnpy.trader.utility import BarGenerator, ArrayManager
+from vnpy.trader.utility import BarGenerator
 from vnpy.trader.constant import Interval, Direction, Status
 from vnpy.trader.object import ContractData
 
+from _indicator_kernels import (
+    make_params,
+    warmup_state,
+    indicator_values,
+    kdj_cross,
+    signal_sum,
+    make_step_kernel,
+    prime_step_kernel,
+    indicator_series,
+    simulate_signals,
+)
+from btc_triple_signal_strategy_1h import ArrayManager32
+
+# 优先使用Cython预编译的逐K线内核 (python setup.py build_ext --inplace)，
+# 未编译时使用numba按RSI阈值特化的同名实现，两者调用方式相同
+try:
+    from _strategy_kernels import StepSignals
+except ImportError:
+    StepSignals = make_step_kernel
+
+
+# 交易日志类型：热路径只向环形缓冲区追加 (K线序号, 类型, 数值元组)，格式化和输出延后进行
+LOG_OPEN_LONG = 0
+LOG_OPEN_SHORT = 1
+LOG_SIGNAL = 2
+LOG_LONG_STOP = 3
+LOG_LONG_PROFIT = 4
+LOG_LONG_EXIT = 5
+LOG_SHORT_STOP = 6
+LOG_SHORT_PROFIT = 7
+LOG_SHORT_EXIT = 8
+LOG_TRADE = 9
+LOG_INDICATOR_ERROR = 10
+
+# 各日志类型的格式，下标与上面的类型值对应
+LOG_FORMATS = (
+    "开多仓: 价格={:.2f}, 数量={}",
+    "开空仓: 价格={:.2f}, 数量={}",
+    "信号: RSI={:.2f}, MACD={:.4f}, K={:.2f}, D={:.2f}",
+    "多头止损: 开仓价={:.2f}, 止损价={:.2f}, 止损比例={:.2%}",
+    "多头止盈: 开仓价={:.2f}, 止盈价={:.2f}, RSI={:.2f}",
+    "多头离场: 价格={:.2f}, 技术指标转为卖出信号",
+    "空头止损: 开仓价={:.2f}, 止损价={:.2f}, 止损比例={:.2%}",
+    "空头止盈: 开仓价={:.2f}, 止盈价={:.2f}, RSI={:.2f}",
+    "空头离场: 价格={:.2f}, 技术指标转为买入信号",
+    "成交回报: 方向={}, 价格={:.2f}, 数量={}, 当前持仓={}",
+    "计算技术指标异常: {}",
+)
+
+# 日志缓冲区容量，超出后丢弃最早的记录
+LOG_RING_SIZE = 100000
+
+
+# 回放用K线数组的列：时间戳(秒)、开、高、低、收、量
+BAR_COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+
+
+def _min_close_len(p) -> int:
+    """
+    各指标所需的最少K线数，p为带策略参数属性的对象 (策略实例或策略类)
+    """
+    return max(
+        p.fast_window,
+        p.slow_window,
+        p.rsi_length + 1,
+        p.macd_slow_period + p.macd_signal_period,
+        p.k_period + p.slowing_period + p.d_period,
+    ) + 1
+
+
+def _array_to_bars(bars: np.ndarray, symbol, exchange, interval) -> list:
+    """
+    将形状为 (N, 6) 的K线数组转为BarData列表，列顺序见 BAR_COLUMNS
+    """
+    from datetime import datetime
+    from vnpy.trader.database import DB_TZ
+    
+    return [
+        BarData(
+            symbol=symbol,
+            exchange=exchange,
+            datetime=datetime.fromtimestamp(ts, DB_TZ),
+            interval=interval,
+            open_price=open_price,
+            high_price=high_price,
+            low_price=low_price,
+            close_price=close_price,
+            volume=volume,
+            gateway_name="BACKTESTING",
+        )
+        for ts, open_price, high_price, low_price, close_price, volume in bars.tolist()
+    ]
+
+
+def prepare_shared_bars(csv_path: str, path: str = None) -> str:
+    """
+    将K线CSV一次性转为.npy内存映射文件，返回文件路径，供各优化进程共享读取
+    
+    CSV需包含datetime (或以秒为单位的timestamp) 以及open、high、low、close、volume列，
+    无时区的datetime按数据库时区解析。文件比CSV新时直接复用，不重复转换。
+    时间戳以秒为单位，超出float32的精确表示范围，因此整个数组使用float64。
+    """
+    import pandas as pd
+    
+    if path is None:
+        path = os.path.splitext(csv_path)[0] + ".bars.npy"
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(csv_path):
+        return path
+    
+    df = pd.read_csv(csv_path)
+    if "timestamp" in df.columns:
+        timestamps = df["timestamp"].to_numpy(np.float64)
+    else:
+        from vnpy.trader.database import DB_TZ
+        
+        dt = pd.to_datetime(df["datetime"])
+        if dt.dt.tz is None:
+            dt = dt.dt.tz_localize(DB_TZ)
+        timestamps = (dt - pd.Timestamp(0, tz="UTC")).dt.total_seconds().to_numpy(np.float64)
+    
+    bars = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(len(df), len(BAR_COLUMNS)))
+    bars[:, 0] = timestamps
+    bars[:, 1:] = df[list(BAR_COLUMNS[1:])].to_numpy(np.float64)
+    bars.flush()
+    del bars
+    
+    return path
+
+
+class MemmapBarFeeder:
+    """
+    按需把内存映射的K线数组转为BarData，可直接赋给BacktestingEngine.history_data
+    
+    回测引擎按len()和切片分批读取历史数据，每批在读取时才生成BarData对象；
+    arrays属性给出底层数组，可直接用于向量化回测。
+    """
+    
+    def __init__(self, path: str, symbol: str, exchange, interval):
+        self.arrays = np.load(path, mmap_mode="r")
+        self.symbol = symbol
+        self.exchange = exchange
+        self.interval = interval
+    
+    def __len__(self):
+        return len(self.arrays)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return _array_to_bars(self.arrays[index], self.symbol, self.exchange, self.interval)
+        return _array_to_bars(self.arrays[index][None, :], self.symbol, self.exchange, self.interval)[0]
+    
+    def __iter__(self):
+        for start in range(0, len(self.arrays), 10000):
+            yield from self[start:start + 10000]
+
+
+def _replay_setting(strategy_class, engine_factory, bars, setting: dict):
+    """
+    在工作进程中用一组参数回放预先加载的K线数组，返回 (参数, 夏普率)
+    
+    bars为prepare_shared_bars返回的文件路径时，工作进程自行映射该文件，按批生成BarData
+    """
+    engine = engine_factory()
+    engine.add_strategy(strategy_class, setting)
+    if isinstance(bars, str):
+        engine.history_data = MemmapBarFeeder(bars, engine.symbol, engine.exchange, engine.interval)
+    else:
+        engine.history_data = _array_to_bars(bars, engine.symbol, engine.exchange, engine.interval)
+    
+    engine.run_backtesting()
+    engine.calculate_result()
+    statistics = engine.calculate_statistics(output=False)
+    return setting, statistics.get("sharpe_ratio", 0)
+
 
 class BtcTripleSignalStrategyMin(CtaTemplate):
     """
@@ -107,9 +287,56 @@ class BtcTripleSignalStrategyMin(CtaTemplate):
         "entry_price",
         "bar_count",
         "last_price",
-        "stoch_cross_over"
+        "kdj_cross_up",
+        "kdj_cross_dn"
     ]
     
+    # 每根K线读写的实例字段使用槽位存储 (基类仍有__dict__，有类级默认值的参数和变量不受影响)
+    __slots__ = (
+        "bg",
+        "am",
+        "rsi_value",
+        "macd_value",
+        "k_value",
+        "d_value",
+        "last_k",
+        "last_d",
+        "entry_price",
+        "bar_count",
+        "last_price",
+        "kdj_cross_up",
+        "kdj_cross_dn",
+        "_min_close_len",
+        "_indicator_params",
+        "_indicator_state",
+        "_signal_sum",
+        "_step_signals",
+        "_sl_long_mul",
+        "_sl_short_mul",
+        "_stop_px_long",
+        "_stop_px_short",
+        "_is_backtest",
+        "_log_ring",
+        "_log_stop",
+        "_log_thread",
+    )
+    
+    # 随机/贝叶斯搜索的参数空间：参数名 -> (下限, 上限, 步长)
+    # 快慢周期区间互不重叠，采样结果总满足快线周期小于慢线周期
+    SPACE = {
+        "fast_window": (5, 19, 1),
+        "slow_window": (20, 120, 5),
+        "signal_num": (1, 3, 1),
+        "rsi_length": (6, 28, 1),
+        "rsi_buy_level": (15, 40, 5),
+        "rsi_sell_level": (60, 85, 5),
+        "macd_fast_period": (6, 20, 1),
+        "macd_slow_period": (21, 50, 1),
+        "macd_signal_period": (5, 15, 1),
+        "k_period": (5, 30, 1),
+        "stop_loss_pct": (0.01, 0.08, 0.005),
+    }
+    
     @classmethod
     def generate_settings(cls):
         """
@@ -129,6 +356,176 @@ class BtcTripleSignalStrategyMin(CtaTemplate):
                 settings.append(setting)
                 
         return settings
+    
+    @classmethod
+    def run_grid_parallel(cls, engine_factory, bars: np.ndarray, settings=None, n_jobs: int = -1):
+        """
+        多进程并行回测全部参数组合，各工作进程回放同一份K线数组
+        
+        参数:
+            engine_factory: 无参可调用对象，返回已调用set_parameters的BacktestingEngine
+            bars: 形状为 (N, 6) 的K线数组，列顺序见 BAR_COLUMNS；
+                  joblib对大数组自动使用内存映射传给工作进程，不逐个复制。
+                  也可传入prepare_shared_bars返回的文件路径，各进程直接映射同一文件
+            settings: 参数组合列表，默认使用generate_settings()
+            n_jobs: 并行进程数，-1表示使用全部CPU核心
+        返回:
+            按夏普率从高到低排序的 [(参数, 夏普率), ...]
+        """
+        from joblib import Parallel, delayed
+        
+        if settings is None:
+            settings = cls.generate_settings()
+        
+        results = Parallel(n_jobs=n_jobs, backend="loky")(
+            delayed(_replay_setting)(cls, engine_factory, bars, setting) for setting in settings
+        )
+        results.sort(key=lambda item: item[1] or 0, reverse=True)
+        return results
+
+    @classmethod
+    def generate_settings_optuna(cls, evaluate, n_trials: int = 60, seed=None):
+        """
+        用Optuna TPE采样器在SPACE上搜索参数，以ask/tell方式逐个评估采样点
+        
+        参数:
+            evaluate: 可调用对象，接收参数字典并返回夏普率，例如
+                      lambda setting: _replay_setting(cls, engine_factory, bars, setting)[1]
+            n_trials: 采样次数
+            seed: 采样器随机种子，便于复现
+        返回:
+            按夏普率从高到低排序的 [(参数, 夏普率), ...]
+        """
+        import optuna
+        
+        study = optuna.create_study(
+            direction="maximize",
+            sampler=optuna.samplers.TPESampler(seed=seed),
+        )
+        
+        results = []
+        for _ in range(n_trials):
+            trial = study.ask()
+            
+            setting = {}
+            for name, (low, high, step) in cls.SPACE.items():
+                if isinstance(getattr(cls, name), int):
+                    setting[name] = trial.suggest_int(name, low, high, step=step)
+                else:
+                    setting[name] = trial.suggest_float(name, low, high, step=step)
+            
+            sharpe = evaluate(setting)
+            if sharpe is None or math.isnan(sharpe):
+                # 回测无成交等情况下没有夏普率，标记为失败以免干扰采样器
+                study.tell(trial, state=optuna.trial.TrialState.FAIL)
+                continue
+            
+            study.tell(trial, sharpe)
+            results.append((setting, sharpe))
+        
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results
+
+    @classmethod
+    def backtest(
+        cls,
+        bars: np.ndarray,
+        setting=None,
+        capital: float = 100000,
+        rate: float = 0.0003,
+        slippage: float = 0.5,
+        size: float = 1,
+        pricetick: float = 0.01,
+        bars_per_year: int = 1440 * 365,
+    ) -> dict:
+        """
+        向量化回测一组参数：整段指标和信号一次算出，开平仓状态在一个数值内核中逐根推进，
+        不经过on_bar回调
+        
+        与策略逐根运行的区别：未成交的挂单不保留到之后的K线；资金曲线按K线而非按日统计。
+        结果用于快速筛选，最优区域仍应通过 run_grid_parallel 用完整引擎确认。
+        
+        参数:
+            bars: 形状为 (N, 6) 的K线数组，列顺序见 BAR_COLUMNS，前面的K线用于指标预热；
+                  也可传入prepare_shared_bars返回的文件路径
+            setting: 参数字典，未给出的参数取类上的默认值
+            capital, rate, slippage, size, pricetick: 与BacktestingEngine.set_parameters含义相同
+            bars_per_year: 年化夏普率使用的每年K线数
+        返回:
+            统计结果字典 (end_balance, total_return, max_ddpercent, total_trade_count, sharpe_ratio)
+        """
+        curve, trade_count, start = cls.equity_curve(
+            bars, setting, capital, rate, slippage, size, pricetick
+        )
+        
+        curve = curve[start:]
+        returns = curve[1:] / curve[:-1] - 1
+        std = returns.std()
+        sharpe = returns.mean() / std * math.sqrt(bars_per_year) if std > 0 else 0.0
+        drawdown = (curve / np.maximum.accumulate(curve) - 1).min()
+        
+        return {
+            "end_balance": float(curve[-1]),
+            "total_return": float((curve[-1] / capital - 1) * 100),
+            "max_ddpercent": float(drawdown * 100),
+            "total_trade_count": int(trade_count),
+            "sharpe_ratio": float(sharpe),
+        }
+
+    @classmethod
+    def equity_curve(
+        cls,
+        bars: np.ndarray,
+        setting=None,
+        capital: float = 100000,
+        rate: float = 0.0003,
+        slippage: float = 0.5,
+        size: float = 1,
+        pricetick: float = 0.01,
+    ):
+        """
+        backtest的撮合部分：返回 (逐K线权益, 成交次数, 第一根可交易K线的下标)，参数含义见backtest
+        """
+        p = SimpleNamespace(**{name: getattr(cls, name) for name in cls.parameters})
+        p.__dict__.update(setting or {})
+        
+        if isinstance(bars, str):
+            bars = np.load(bars, mmap_mode="r")
+        _, open_, high, low, close, volume = np.asarray(bars, dtype=np.float64).T
+        start = max(200, _min_close_len(p)) - 1
+        
+        # 整段指标序列 (与逐根增量计算的结果相同)
+        params = make_params(
+            p.fast_window, p.slow_window, p.rsi_length,
+            p.macd_fast_period, p.macd_slow_period, p.macd_signal_period,
+            p.k_period, p.slowing_period, p.d_period,
+            1, 1, 1
+        )
+        rsi, macd_hist, k, d = indicator_series(close, high, low, volume, params)[:, 2:6].T
+        
+        # 本根K线的KDJ金叉/死叉，首根可交易K线的上一根K/D视为0
+        prev_k = np.concatenate((np.zeros(start + 1), k[start:-1]))
+        prev_d = np.concatenate((np.zeros(start + 1), d[start:-1]))
+        cross_up = (prev_k < prev_d) & (k > d)
+        cross_dn = (prev_k > prev_d) & (k < d)
+        
+        # 三个方向信号之和，与signal_sum一致
+        rsi_long = rsi <= p.rsi_buy_level
+        rsi_short = ~rsi_long & (rsi >= p.rsi_sell_level)
+        kdj_short = cross_dn | (k > 80)
+        total = (
+            rsi_long.view(np.int8) - rsi_short.view(np.int8)
+            + np.sign(macd_hist).astype(np.int8)
+            + cross_up.view(np.int8) - kdj_short.view(np.int8)
+        )
+        
+        curve, trade_count = simulate_signals(
+            open_, high, low, close, rsi, total, start, p.signal_num,
+            p.rsi_buy_level, p.rsi_sell_level, 1.0 - p.stop_loss_pct, 1.0 + p.stop_loss_pct,
+            p.fixed_size, pricetick, size, rate, slippage, capital
+        )
+        
+        return curve, trade_count, start
 
     def __init__(self, cta_engine, strategy_name, vt_symbol, setting):
         """
@@ -139,8 +536,12 @@ class BtcTripleSignalStrategyMin(CtaTemplate):
         # 创建K线生成器（直接使用1小时K线）
         self.bg = BarGenerator(self.on_bar, interval=Interval.MINUTE)
         
-        # 创建数组管理器
-        self.am = ArrayManager(200)
+        # 各指标所需的最少K线数，参数确定后计算一次
+        self._min_close_len = _min_close_len(self)
+        
+        # 创建数组管理器：默认200根，参数搜索取到更长周期时扩大窗口，保证播种指标状态时数据足够
+        # K线数据以float32存储，指标累加量仍在内核的float64状态数组中
+        self.am = ArrayManager32(max(200, self._min_close_len))
         
         # 初始化策略状态
         self.pos = 0
@@ -159,7 +560,35 @@ class BtcTripleSignalStrategyMin(CtaTemplate):
         self.entry_price = 0.0    # 开仓成交价
         self.bar_count = 0        # 已处理的K线数量
         self.last_price = 0.0     # 最新价格（用于计算浮动盈亏）
-        self.stoch_cross_over = False  # KDJ金叉状态
+        self.kdj_cross_up = False      # 本根K线KDJ金叉
+        self.kdj_cross_dn = False      # 本根K线KDJ死叉
+        
+        # 增量指标状态 (数组管理器首次初始化时用历史数据播种，之后每根K线O(1)更新)
+        # 分钟策略不使用ATR、ADX和成交量均值，对应周期取1
+        self._indicator_params = make_params(
+            self.fast_window, self.slow_window, self.rsi_length,
+            self.macd_fast_period, self.macd_slow_period, self.macd_signal_period,
+            self.k_period, self.slowing_period, self.d_period,
+            1, 1, 1
+        )
+        self._indicator_state = None
+        self._signal_sum = 0      # RSI/MACD/KDJ三个方向信号之和 (由内核计算)
+        # 逐K线内核，RSI阈值固化在内核中 (Cython版为C类型字段，numba版为编译期常量)
+        self._step_signals = StepSignals(self.rsi_buy_level, self.rsi_sell_level)
+        
+        # 止损价相对开仓价的乘数 (on_start时按当前参数重新计算)
+        self._sl_long_mul = 1.0 - self.stop_loss_pct
+        self._sl_short_mul = 1.0 + self.stop_loss_pct
+        
+        # 多头/空头止损价，随开仓价一起更新，持仓期间每根K线只做一次比较
+        self._stop_px_long = 0.0
+        self._stop_px_short = 0.0
+        
+        # 交易日志环形缓冲区：回测在on_stop中统一输出，实盘由后台线程定时输出
+        self._is_backtest = self.get_engine_type() == EngineType.BACKTESTING
+        self._log_ring = deque(maxlen=LOG_RING_SIZE)
+        self._log_stop = threading.Event()
+        self._log_thread = None
         
     def on_init(self):
         """
@@ -171,16 +600,59 @@ class BtcTripleSignalStrategyMin(CtaTemplate):
         # 至少需要 MACD 慢线周期 + 信号线周期 的长度
         init_days = 5  # 假设每天有24小时数据，加载5天的数据即可满足MACD计算需求
         
-        # 加载足够的历史数据进行指标预热
-        self.load_bar(init_days)
+        # 逐K线内核按RSI阈值特化，先在这里完成编译，实盘第一根K线不再等待编译
+        prime_step_kernel(self._step_signals, self._indicator_params)
+        
+        # 加载足够的历史数据进行指标预热：整段历史转为数组后一次性播种指标状态，不逐根回调on_bar
+        am_size = self.am.size
+        bars = self.cta_engine.load_bar(self.vt_symbol, init_days, Interval.MINUTE, self.on_bar, False)
+        self.warmup_from_bars(bars)
         
-        self.write_log(f"策略初始化完成，预热期：{init_days}天，数组管理器大小：200")
+        self.write_log(f"策略初始化完成，预热期：{init_days}天，数组管理器大小：{am_size}")
+        
+    def warmup_from_bars(self, bars: list):
+        """
+        批量预热：历史K线一次性写入数组管理器，数组管理器已满时直接播种指标状态，
+        之后的K线走on_bar中的增量更新
+        """
+        if not bars:
+            return
+        
+        arrays = np.array(
+            [(bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume) for bar in bars],
+            dtype=np.float32
+        ).T
+        n = arrays.shape[1]
+        
+        # 写入数组管理器 (最多保留最后size根)
+        am = self.am
+        k = min(n, am.size)
+        for target, values in zip(
+            (am.open_array, am.high_array, am.low_array, am.close_array, am.volume_array), arrays
+        ):
+            target[:-k] = target[k:]
+            target[-k:] = values[-k:]
+        am.count += n
+        am.inited = am.count >= am.size
+        
+        self.bar_count += n
+        self.last_price = bars[-1].close_price
+        
+        # 与逐根回放一致：数组管理器已满时以其中的数据播种指标状态
+        if am.inited:
+            self.calculate_indicators(bars[-1])
         
     def on_start(self):
         """
         策略启动回调
         """
         self.write_log("策略启动")
+        
+        # 缓存止损乘数，并按 (可能由同步数据恢复的) 开仓价重算止损价
+        self._sl_long_mul = 1.0 - self.stop_loss_pct
+        self._sl_short_mul = 1.0 + self.stop_loss_pct
+        self._set_entry_price(self.entry_price)
+        
         self.write_log(f"合约代码：{self.vt_symbol}")
         self.write_log(f"策略名称：{self.strategy_name}")
         self.write_log(f"固定手数：{self.fixed_size}")
@@ -192,16 +664,62 @@ class BtcTripleSignalStrategyMin(CtaTemplate):
         self.write_log("策略启动完成，开始监控市场信号...")
         
         # 调试信息
-        self.write_log(f"数组管理器初始化状态: {'已初始化' if self.am.inited else '未初始化'}")
-        self.write_log(f"数组管理器当前数据量: {len(self.am.close_array)}")
+        if self.am is None:
+            self.write_log("指标状态已由历史数据播种，数组管理器已释放")
+        else:
+            self.write_log(f"数组管理器初始化状态: {'已初始化' if self.am.inited else '未初始化'}")
+            self.write_log(f"数组管理器当前数据量: {self.am.count}")
+        
+        # 实盘模式启动后台日志线程
+        if not self._is_backtest and self._log_thread is None:
+            self._log_stop.clear()
+            self._log_thread = threading.Thread(target=self._run_log_writer, daemon=True)
+            self._log_thread.start()
         
         # 触发UI更新
         self.put_event()
         
+    def _set_entry_price(self, price: float):
+        """
+        记录开仓价，同时算出多头和空头止损价
+        """
+        self.entry_price = price
+        self._stop_px_long = price * self._sl_long_mul
+        self._stop_px_short = price * self._sl_short_mul
+        
+    def _log(self, tag: int, *values):
+        """
+        记录一条交易日志到环形缓冲区，不在热路径上格式化字符串
+        """
+        self._log_ring.append((self.bar_count, tag, values))
+        
+    def _drain_log_ring(self):
+        """
+        取出缓冲区中的全部日志，格式化后写入vnpy日志
+        """
+        ring = self._log_ring
+        while ring:
+            bar_count, tag, values = ring.popleft()
+            self.write_log(f"[K线{bar_count}] " + LOG_FORMATS[tag].format(*values))
+            
+    def _run_log_writer(self):
+        """
+        实盘后台日志线程：定时输出缓冲区中的日志，直到策略停止
+        """
+        while not self._log_stop.wait(0.5):
+            self._drain_log_ring()
+        
     def on_stop(self):
         """
         策略停止回调
         """
+        # 停止后台日志线程，并输出缓冲区中剩余的交易日志
+        if self._log_thread is not None:
+            self._log_stop.set()
+            self._log_thread.join()
+            self._log_thread = None
+        self._drain_log_ring()
+        
         self.write_log("="*50)
         self.write_log("策略停止 - 运行统计报告")
         self.write_log("="*50)
@@ -221,7 +739,7 @@ class BtcTripleSignalStrategyMin(CtaTemplate):
         self.write_log(f"当前MACD值：{self.macd_value:.4f}")
         self.write_log(f"当前K值：{self.k_value:.2f}")
         self.write_log(f"当前D值：{self.d_value:.2f}")
-        self.write_log(f"KDJ金叉状态：{'是' if self.stoch_cross_over else '否'}")
+        self.write_log(f"KDJ交叉：{'金叉' if self.kdj_cross_up else '死叉' if self.kdj_cross_dn else '无'}")
         
         # 均线状态
         self.write_log(f"快速均线：{self.fast_ma0:.2f}")
@@ -241,11 +759,11 @@ class BtcTripleSignalStrategyMin(CtaTemplate):
             
             # 计算止盈止损价格
             if self.pos > 0:  # 多头仓位
-                stop_loss_price = self.entry_price * (1 - self.stop_loss_pct)
+                stop_loss_price = self._stop_px_long
                 self.write_log(f"多头止损价格：{stop_loss_price:.2f}")
                 self.write_log(f"RSI止盈阈值：{self.rsi_sell_level}")
             else:  # 空头仓位
-                stop_loss_price = self.entry_price * (1 + self.stop_loss_pct)
+                stop_loss_price = self._stop_px_short
                 self.write_log(f"空头止损价格：{stop_loss_price:.2f}")
                 self.write_log(f"RSI止盈阈值：{self.rsi_buy_level}")
 
@@ -265,209 +783,155 @@ class BtcTripleSignalStrategyMin(CtaTemplate):
         # 更新最新价格
         self.last_price = bar.close_price
         
-        # 更新Array Manager
+        # 指标状态播种前更新Array Manager，K线数据不足时等待更多数据
         am = self.am
-        am.update_bar(bar)
-        
-        # 如果K线数据不足，等待更多数据
-        if not am.inited:
-            self.put_event()  # 更新UI显示
-            return
+        if am is not None:
+            am.update_bar(bar)
+            if not am.inited:
+                self.put_event()  # 更新UI显示
+                return
             
-        # 计算技术指标
-        self.calculate_indicators()
-        
-        # 生成交易信号
-        self.generate_signals(bar)
+        # 计算技术指标，指标无效时跳过本根K线的信号判断
+        if self.calculate_indicators(bar):
+            # 生成交易信号
+            self.generate_signals(bar)
         
         # 更新图形界面
         self.put_event()
 
-    def calculate_indicators(self):
+    def calculate_indicators(self, bar: BarData) -> bool:
         """
-        计算技术指标
+        计算技术指标，返回指标是否有效
+        
+        首次调用时用数组管理器中的历史数据播种增量状态，之后只用新K线做O(1)更新，不再整窗重算。
+        数组管理器已初始化时数据长度必然足够，内核不会抛出异常，只需检查行情中的缺失值
         """
-        am = self.am
+        if self._indicator_state is None:
+            am = self.am
+            self._indicator_state = warmup_state(
+                am.close_array, am.high_array, am.low_array, am.volume_array, self._indicator_params
+            )
+            # 之后的指标全部由状态数组增量更新，不再需要K线窗口，释放数组管理器省去每根K线的数组平移
+            self.am = None
+            fast_ma, slow_ma, rsi, macd_hist, k, d = indicator_values(self._indicator_state)[:6]
+            cross_up, cross_dn = kdj_cross(self.k_value, self.d_value, k, d)
+            total, count = signal_sum(
+                rsi, macd_hist, k, cross_up, cross_dn, self.rsi_buy_level, self.rsi_sell_level
+            )
+        else:
+            # 指标更新、KDJ交叉判断和信号累加在同一个编译内核中完成
+            fast_ma, slow_ma, rsi, macd_hist, k, d, cross_up, cross_dn, total, count = self._step_signals(
+                self._indicator_state, bar.close_price, bar.high_price, bar.low_price, bar.volume
+            )
         
-        # 计算均线
-        try:
-            # 确保有足够的数据
-            if len(am.close_array) > max(self.fast_window, self.slow_window):
-                fast_ma = am.sma(self.fast_window, array=True)
-                slow_ma = am.sma(self.slow_window, array=True)
-                
-                # 保存上一次的均线值
-                self.fast_ma1 = self.fast_ma0
-                self.slow_ma1 = self.slow_ma0
-                
-                # 更新当前均线值
-                if len(fast_ma) > 0 and len(slow_ma) > 0:
-                    self.fast_ma0 = fast_ma[-1]
-                    self.slow_ma0 = slow_ma[-1]
-                    
-                    # 确定趋势方向
-                    if self.fast_ma0 > self.slow_ma0:
-                        self.ma_trend = 1  # 上升趋势
-                    elif self.fast_ma0 < self.slow_ma0:
-                        self.ma_trend = -1  # 下降趋势
-                    else:
-                        self.ma_trend = 0  # 横盘整理
-        except Exception as e:
-            self.write_log(f"计算均线异常: {e}")
-            
-        # 计算RSI
-        try:
-            if len(am.close_array) > self.rsi_length:
-                rsi = am.rsi(self.rsi_length)
-                if rsi is not None:
-                    self.rsi_value = rsi
-        except Exception as e:
-            self.write_log(f"计算RSI异常: {e}")
-            
-        # 计算MACD
-        try:
-            if len(am.close_array) > self.macd_slow_period + self.macd_signal_period:
-                macd, signal, hist = am.macd(
-                    self.macd_fast_period,
-                    self.macd_slow_period,
-                    self.macd_signal_period,
-                    array=True
-                )
-                if len(hist) > 0:
-                    self.macd_value = hist[-1]
-        except Exception as e:
-            self.write_log(f"计算MACD异常: {e}")
-            
-        # 计算KDJ
-        try:
-            if len(am.high_array) > self.k_period and len(am.low_array) > self.k_period:
-                k, d = am.stoch(
-                    self.k_period, 
-                    self.d_period, 
-                    self.slowing_period
-                )
-                # 保存上一个K和D值
-                self.last_k = self.k_value
-                self.last_d = self.d_value
-                
-                # 更新当前K和D值
-                self.k_value = k
-                self.d_value = d
-                
-                # 判断KDJ金叉和死叉
-                if self.last_k is not None and self.last_d is not None:
-                    # 金叉：K线从下方突破D线
-                    if self.last_k < self.last_d and k > d:
-                        self.stoch_cross_over = True
-                    # 死叉：K线从上方跌破D线
-                    elif self.last_k > self.last_d and k < d:
-                        self.stoch_cross_over = False
-        except Exception as e:
-            self.write_log(f"计算KDJ异常: {e}")
+        if math.isnan(rsi) or math.isnan(macd_hist) or math.isnan(k) or math.isnan(d):
+            self._log(LOG_INDICATOR_ERROR, "指标值为NaN")
+            return False
+        
+        # 计算均线：保存上一次的均线值并更新当前值
+        self.fast_ma1 = self.fast_ma0
+        self.slow_ma1 = self.slow_ma0
+        self.fast_ma0 = fast_ma
+        self.slow_ma0 = slow_ma
+        
+        # 确定趋势方向
+        if self.fast_ma0 > self.slow_ma0:
+            self.ma_trend = 1  # 上升趋势
+        elif self.fast_ma0 < self.slow_ma0:
+            self.ma_trend = -1  # 下降趋势
+        else:
+            self.ma_trend = 0  # 横盘整理
+        
+        # RSI、MACD (柱状图)
+        self.rsi_value = rsi
+        self.macd_value = macd_hist
+        
+        # KDJ：保存上一个K和D值，更新当前值和本根K线的金叉/死叉
+        self.last_k = self.k_value
+        self.last_d = self.d_value
+        self.k_value = k
+        self.d_value = d
+        self.kdj_cross_up = bool(cross_up)
+        self.kdj_cross_dn = bool(cross_dn)
+        
+        # 信号
+        self._signal_sum = int(total)
+        self.signal_count = int(count)
+        return True
 
     def generate_signals(self, bar: BarData):
         """
         生成交易信号
         """
-        # 初始化信号计数
-        self.signal_count = 0
-        
-        # === 1. RSI信号 ===
-        rsi_signal = 0
-        if self.rsi_value <= self.rsi_buy_level:
-            rsi_signal = 1  # 买入信号
-        elif self.rsi_value >= self.rsi_sell_level:
-            rsi_signal = -1  # 卖出信号
-        
-        if rsi_signal != 0:
-            self.signal_count += 1
-            
-        # === 2. MACD信号 ===
-        macd_signal = 0
-        if self.macd_value > 0:
-            macd_signal = 1  # 买入信号
-        elif self.macd_value < 0:
-            macd_signal = -1  # 卖出信号
-            
-        if macd_signal != 0:
-            self.signal_count += 1
-            
-        # === 3. KDJ信号 ===
-        kdj_signal = 0
-        if self.stoch_cross_over:
-            kdj_signal = 1  # 买入信号
-        elif not self.stoch_cross_over and self.k_value > 80:
-            kdj_signal = -1  # 卖出信号
-            
-        if kdj_signal != 0:
-            self.signal_count += 1
+        # RSI/MACD/KDJ三个方向信号之和及信号计数已在calculate_indicators中由内核算出
+        total = self._signal_sum
             
         # === 综合信号判断 ===
         # 无仓位时，需要开仓条件：
         if self.pos == 0:
             # 多头开仓条件：至少有signal_num个买入信号，且均线趋势向上
-            if (rsi_signal + kdj_signal + macd_signal) >= self.signal_num:
+            if total >= self.signal_num:
                 self.buy(bar.close_price, self.fixed_size)
-                self.entry_price = bar.close_price
+                self._set_entry_price(bar.close_price)
                 self.intra_trade_high = bar.close_price
                 self.intra_trade_low = bar.close_price
                 
-                self.write_log(f"开多仓: 价格={bar.close_price:.2f}, 数量={self.fixed_size}")
-                self.write_log(f"信号: RSI={self.rsi_value:.2f}, MACD={self.macd_value:.4f}, K={self.k_value:.2f}, D={self.d_value:.2f}")
+                self._log(LOG_OPEN_LONG, bar.close_price, self.fixed_size)
+                self._log(LOG_SIGNAL, self.rsi_value, self.macd_value, self.k_value, self.d_value)
                 
             # 空头开仓条件：至少有signal_num个卖出信号，且均线趋势向下
-            elif (rsi_signal + kdj_signal + macd_signal) <= -self.signal_num:
+            elif total <= -self.signal_num:
                 self.short(bar.close_price, self.fixed_size)
-                self.entry_price = bar.close_price
+                self._set_entry_price(bar.close_price)
                 self.intra_trade_high = bar.close_price
                 self.intra_trade_low = bar.close_price
                 
-                self.write_log(f"开空仓: 价格={bar.close_price:.2f}, 数量={self.fixed_size}")
-                self.write_log(f"信号: RSI={self.rsi_value:.2f}, MACD={self.macd_value:.4f}, K={self.k_value:.2f}, D={self.d_value:.2f}")
+                self._log(LOG_OPEN_SHORT, bar.close_price, self.fixed_size)
+                self._log(LOG_SIGNAL, self.rsi_value, self.macd_value, self.k_value, self.d_value)
                 
+            return
+        
+        # 持仓期间更新最高价和最低价 (直接比较赋值，不经过内置max/min的调用开销)
+        high = bar.high_price
+        if high > self.intra_trade_high:
+            self.intra_trade_high = high
+        low = bar.low_price
+        if low < self.intra_trade_low:
+            self.intra_trade_low = low
+        
         # 持有多头仓位
-        elif self.pos > 0:
-            # 更新最高价
-            self.intra_trade_high = max(self.intra_trade_high, bar.high_price)
-            self.intra_trade_low = min(self.intra_trade_low, bar.low_price)
-            
+        if self.pos > 0:
             # 止损条件：当前价格跌破止损线
-            stop_loss_price = self.entry_price * (1 - self.stop_loss_pct)
-            if bar.close_price <= stop_loss_price:
+            if bar.close_price <= self._stop_px_long:
                 self.sell(bar.close_price, abs(self.pos))
-                self.write_log(f"多头止损: 开仓价={self.entry_price:.2f}, 止损价={bar.close_price:.2f}, 止损比例={self.stop_loss_pct*100:.2f}%")
+                self._log(LOG_LONG_STOP, self.entry_price, bar.close_price, self.stop_loss_pct)
                 
             # 止盈条件：RSI达到超买区域
             elif self.rsi_value >= self.rsi_sell_level:
                 self.sell(bar.close_price, abs(self.pos))
-                self.write_log(f"多头止盈: 开仓价={self.entry_price:.2f}, 止盈价={bar.close_price:.2f}, RSI={self.rsi_value:.2f}")
+                self._log(LOG_LONG_PROFIT, self.entry_price, bar.close_price, self.rsi_value)
                 
             # 其他离场信号：三个技术指标都是卖出信号
-            elif (rsi_signal + kdj_signal + macd_signal) <= -self.signal_num:
+            elif total <= -self.signal_num:
                 self.sell(bar.close_price, abs(self.pos))
-                self.write_log(f"多头离场: 价格={bar.close_price:.2f}, 技术指标转为卖出信号")
+                self._log(LOG_LONG_EXIT, bar.close_price)
                 
         # 持有空头仓位
-        elif self.pos < 0:
-            # 更新最高价和最低价
-            self.intra_trade_high = max(self.intra_trade_high, bar.high_price)
-            self.intra_trade_low = min(self.intra_trade_low, bar.low_price)
-            
+        else:
             # 止损条件：当前价格突破止损线
-            stop_loss_price = self.entry_price * (1 + self.stop_loss_pct)
-            if bar.close_price >= stop_loss_price:
+            if bar.close_price >= self._stop_px_short:
                 self.cover(bar.close_price, abs(self.pos))
-                self.write_log(f"空头止损: 开仓价={self.entry_price:.2f}, 止损价={bar.close_price:.2f}, 止损比例={self.stop_loss_pct*100:.2f}%")
+                self._log(LOG_SHORT_STOP, self.entry_price, bar.close_price, self.stop_loss_pct)
                 
             # 止盈条件：RSI达到超卖区域
             elif self.rsi_value <= self.rsi_buy_level:
                 self.cover(bar.close_price, abs(self.pos))
-                self.write_log(f"空头止盈: 开仓价={self.entry_price:.2f}, 止盈价={bar.close_price:.2f}, RSI={self.rsi_value:.2f}")
+                self._log(LOG_SHORT_PROFIT, self.entry_price, bar.close_price, self.rsi_value)
                 
             # 其他离场信号：三个技术指标都是买入信号
-            elif (rsi_signal + kdj_signal + macd_signal) >= self.signal_num:
+            elif total >= self.signal_num:
                 self.cover(bar.close_price, abs(self.pos))
-                self.write_log(f"空头离场: 价格={bar.close_price:.2f}, 技术指标转为买入信号")
+                self._log(LOG_SHORT_EXIT, bar.close_price)
 
     def on_order(self, order: OrderData):
         """
@@ -479,17 +943,12 @@ class BtcTripleSignalStrategyMin(CtaTemplate):
         """
         成交回报
         """
-        # 更新持仓，虽然底层已经会更新，这里再次显式更新是为了确保准确性
-        if trade.direction == Direction.LONG:
-            self.pos += trade.volume
-        else:
-            self.pos -= trade.volume
-            
-        # 记录开仓价格
+        # 持仓已由CTA引擎在调用on_trade之前更新，这里不能再累加一次
+        # 记录开仓价格和止损价
         if abs(self.pos) == trade.volume:
-            self.entry_price = trade.price
+            self._set_entry_price(trade.price)
             
-        self.write_log(f"成交回报: 方向={'多' if trade.direction == Direction.LONG else '空'}, 价格={trade.price:.2f}, 数量={trade.volume}, 当前持仓={self.pos}")
+        self._log(LOG_TRADE, "多" if trade.direction == Direction.LONG else "空", trade.price, trade.volume, self.pos)
         
         # 更新UI
         self.put_event()
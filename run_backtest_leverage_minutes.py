@@ -4,23 +4,28 @@
 import datetime
 import sys
 import os
-import pandas as pd
+import multiprocessing
 import numpy as np
-import matplotlib.pyplot as plt
 from collections import defaultdict
+from functools import lru_cache
+from typing import TYPE_CHECKING, NamedTuple
 
 # 添加本地vnpy路径
 sys.path.append(os.path.abspath("."))  # 优先使用当前目录下的vnpy
 
-# 导入vnpy组件
-from vnpy_ctabacktester.engine import BacktestingEngine
-from vnpy.trader.constant import Interval
+# 导入vnpy组件 (回测引擎、策略、绘图库和数值内核导入较慢，在用到的函数中再导入，
+# 只检查数据或直接退出时不必加载)
+from vnpy.trader.constant import Interval, Direction
 try:
     from vnpy.trader.setting import SETTINGS
 except ImportError:
     # 对于vnpy 4.x版本，设置可能已移动位置
     from vnpy.trader.utility import SETTINGS
 
+if TYPE_CHECKING:
+    import pandas as pd
+    from vnpy_ctabacktester.engine import BacktestingEngine
+
 # 配置使用 MySQL 数据库
 SETTINGS["database.driver"] = "mysql"  # 使用 MySQL 作为数据库
 SETTINGS["database.name"] = "mysql"    # 必须和driver一致
@@ -34,43 +39,206 @@ SETTINGS["database.password"] = ""  # 数据库密码
 os.environ["http_proxy"] = "http://127.0.0.1:7897"
 os.environ["https_proxy"] = "http://127.0.0.1:7897"
 
-def create_minute_strategy():
-    """基于原有1小时策略创建分钟K线版本"""
-    # 创建分钟K线策略文件
-    try:
-        with open("btc_triple_signal_strategy_1h.py", "r") as f:
-            strategy_code = f.read()
-        
-        # 修改策略代码，将其调整为分钟K线版本
-        minute_strategy_code = strategy_code.replace(
-            "BtcTripleSignalStrategy1h", "BtcTripleSignalStrategyMin"
-        ).replace(
-            "BTC 三重信号策略 (1小时版)", "BTC 三重信号策略 (分钟版)"
-        ).replace(
-            "使用1小时K线", "使用分钟K线"
-        )
-        
-        # 写入新文件
-        with open("btc_triple_signal_strategy_min.py", "w") as f:
-            f.write(minute_strategy_code)
-        
-        print("✅ 已创建分钟K线策略文件: btc_triple_signal_strategy_min.py")
-        return True
-    except Exception as e:
-        print(f"❌ 创建分钟K线策略文件失败: {e}")
-        return False
+@lru_cache(maxsize=4)
+def _load_bars(vt_symbol: str, interval: Interval, start: datetime.datetime, end: datetime.datetime) -> tuple:
+    """
+    从vnpy数据库读取回测区间内的全部K线
+    同一进程内的多次回测 (例如多进程池中一个工作进程依次重跑多个杠杆倍数) 共用，元组只读
+    """
+    from vnpy.trader.database import get_database
+    from vnpy.trader.utility import extract_vt_symbol
+    
+    symbol, exchange = extract_vt_symbol(vt_symbol)
+    return tuple(get_database().load_bar_data(symbol, exchange, interval, start, end))
 
-# 确保分钟K线策略文件存在，先创建再导入
-if not os.path.exists("btc_triple_signal_strategy_min.py"):
-    create_minute_strategy()
+def load_history(engine: "BacktestingEngine") -> None:
+    """
+    代替engine.load_data()：直接把缓存的K线交给引擎，相同区间只读一次数据库
+    """
+    engine.history_data = list(_load_bars(engine.vt_symbol, engine.interval, engine.start, engine.end))
 
-# 现在导入策略类
-try:
-    from btc_triple_signal_strategy_min import BtcTripleSignalStrategyMin
-except ImportError:
-    print("❌ 无法导入分钟K线策略，请确保btc_triple_signal_strategy_1h.py文件存在")
-    print("尝试直接使用小时K线策略...")
-    from btc_triple_signal_strategy_1h import BtcTripleSignalStrategy1h as BtcTripleSignalStrategyMin
+# K线结构化数组的字段：每根K线一条定长记录，各列可直接整列切片运算
+BAR_DTYPE = np.dtype([
+    ("datetime", "datetime64[m]"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "f8"),
+])
+
+@lru_cache(maxsize=4)
+def _load_bar_records(vt_symbol: str, interval: Interval, start: datetime.datetime, end: datetime.datetime) -> np.ndarray:
+    """
+    将缓存的K线一次性转为BAR_DTYPE结构化数组，供统计分析按列计算，数组只读
+    """
+    bars = _load_bars(vt_symbol, interval, start, end)
+    records = np.fromiter(
+        (
+            (np.datetime64(bar.datetime.replace(tzinfo=None), "m"),
+             bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume)
+            for bar in bars
+        ),
+        dtype=BAR_DTYPE,
+        count=len(bars),
+    )
+    records.setflags(write=False)
+    return records
+
+# 已设置参数并加载K线的回测引擎，键为 (vt_symbol, interval, start, end, capital)
+_engine_cache = {}
+
+def get_engine(vt_symbol: str, interval: Interval, start: datetime.datetime,
+               end: datetime.datetime, capital: float) -> "BacktestingEngine":
+    """
+    返回已设置回测参数并加载好K线的引擎，添加策略后即可运行回测
+    
+    同一进程中相同的回测区间只创建一次引擎；再次取用时只清空上一次的成交和逐日结果，
+    K线数据原样保留，因此上一次取到的引擎结果随之失效
+    """
+    key = (vt_symbol, interval, start, end, capital)
+    engine = _engine_cache.get(key)
+    if engine is not None:
+        engine.clear_data()
+        return engine
+    
+    from vnpy_ctabacktester.engine import BacktestingEngine
+    
+    engine = BacktestingEngine()
+    engine.set_parameters(
+        vt_symbol=vt_symbol,
+        interval=interval,
+        start=start,
+        end=end,
+        rate=0.0004,  # 杠杆交易手续费率：0.04% (通常杠杆交易手续费更高)
+        slippage=0.5,  # 滑点：0.5 USD
+        size=1,        # 合约大小：1
+        pricetick=0.01, # 价格跳动：0.01 USD
+        capital=capital
+    )
+    load_history(engine)
+    _engine_cache[key] = engine
+    return engine
+
+def bar_records(engine: "BacktestingEngine") -> np.ndarray:
+    """返回引擎回测区间内K线的结构化数组"""
+    return _load_bar_records(engine.vt_symbol, engine.interval, engine.start, engine.end)
+
+class LevRes(NamedTuple):
+    """单个杠杆倍数的回测指标 (收益率和回撤均为百分数)"""
+    total_return: float
+    annual_return: float
+    max_drawdown: float
+    sharpe_ratio: float
+
+# 随杠杆倍数线性放大的逐日结果列：仓位放大L倍时，成交额、手续费、滑点和各项盈亏同比例放大
+LEVERAGE_COLUMNS = [
+    "turnover", "commission", "slippage",
+    "trading_pnl", "holding_pnl", "total_pnl", "net_pnl",
+]
+
+def apply_leverage(daily_df: "pd.DataFrame", leverage: float) -> "pd.DataFrame":
+    """
+    返回按杠杆倍数放大后的逐日结果副本
+    
+    各列整列一次性相乘，不逐笔、逐日遍历对象。vnpy的calculate_statistics按net_pnl
+    累加重算资金曲线，因此把结果传给 calculate_statistics(df) 即得到杠杆后的统计指标
+    """
+    df = daily_df.copy()
+    if not df.empty:
+        df[LEVERAGE_COLUMNS] = df[LEVERAGE_COLUMNS].to_numpy(np.float64) * leverage
+    return df
+
+def daily_statistics(daily_df: "pd.DataFrame", capital: float,
+                     annual_days: int = 240, risk_free: float = 0) -> dict:
+    """
+    按列向量化计算逐日结果的主要统计指标，代替engine.calculate_statistics
+    
+    同时为daily_df补上资金曲线balance和回撤drawdown两列，供engine.show_chart(daily_df)绘图；
+    指标口径与vnpy一致，收益率和回撤比例均为百分数
+    """
+    if daily_df.empty:
+        return {}
+    
+    net_pnl = daily_df["net_pnl"].to_numpy(np.float64)
+    balance = capital + np.cumsum(net_pnl)
+    drawdown = balance - np.maximum.accumulate(balance)
+    daily_df["balance"] = balance
+    daily_df["drawdown"] = drawdown
+    
+    total_days = len(net_pnl)
+    total_trade_count = int(daily_df["trade_count"].sum())
+    stats = leverage_statistics(net_pnl, capital, 1.0, annual_days=annual_days, risk_free=risk_free)
+    if not (balance > 0).all():
+        print("⚠️ 回测中出现爆仓（资金小于等于0），收益类指标记为0")
+    
+    max_ddpercent = stats["max_ddpercent"]
+    return {
+        "start_date": daily_df.index[0],
+        "end_date": daily_df.index[-1],
+        "total_days": total_days,
+        "profit_days": int((net_pnl > 0).sum()),
+        "loss_days": int((net_pnl < 0).sum()),
+        "capital": capital,
+        "end_balance": balance[-1],
+        "total_return": stats["total_return"],
+        "annual_return": stats["annual_return"],
+        "max_drawdown": drawdown.min(),
+        "max_ddpercent": max_ddpercent,
+        "total_trade_count": total_trade_count,
+        "daily_trade_count": total_trade_count / total_days,
+        "sharpe_ratio": stats["sharpe_ratio"],
+        "return_drawdown_ratio": -stats["total_return"] / max_ddpercent if max_ddpercent else 0,
+    }
+
+def leverage_statistics(net_pnl: np.ndarray, capital: float, leverage: float,
+                        annual_days: int = 240, risk_free: float = 0) -> dict:
+    """
+    由基准(1倍)逐日净盈亏数组直接算出某一杠杆倍数下的统计指标
+    
+    口径与vnpy的calculate_statistics一致：资金曲线为 capital + L*cumsum(net_pnl)，
+    总收益率、年化收益率随L线性放大，回撤比例和夏普比率由放大后的资金曲线算出。
+    资金曲线出现非正值时与vnpy相同，视为爆仓，各指标记为0。
+    逐日遍历由 leverage_curve_stats 内核一次完成
+    """
+    from _indicator_kernels import leverage_curve_stats
+    
+    positive, total_return, max_ddpercent, daily_return, return_std = leverage_curve_stats(
+        np.asarray(net_pnl, dtype=np.float64), float(capital), float(leverage)
+    )
+    if not positive:
+        return {"total_return": 0.0, "annual_return": 0.0, "max_ddpercent": 0.0, "sharpe_ratio": 0.0}
+    
+    if return_std:
+        daily_risk_free = risk_free / np.sqrt(annual_days)
+        sharpe_ratio = (daily_return - daily_risk_free) / return_std * np.sqrt(annual_days)
+    else:
+        sharpe_ratio = 0.0
+    
+    return {
+        "total_return": total_return,
+        "annual_return": total_return / len(net_pnl) * annual_days,
+        "max_ddpercent": max_ddpercent,
+        "sharpe_ratio": sharpe_ratio,
+    }
+
+@lru_cache(maxsize=None)
+def _strategy_class():
+    """
+    导入分钟K线策略；独立的分钟版策略文件不可用时，在运行时由1小时策略特化出同名子类
+    (1小时策略的on_bar直接处理输入的K线，回测分钟数据时即按分钟K线运行，无需生成新源文件)
+    """
+    try:
+        from btc_triple_signal_strategy_min import BtcTripleSignalStrategyMin
+        return BtcTripleSignalStrategyMin
+    except ImportError:
+        print("⚠️ 无法导入分钟K线策略，改用由小时K线策略特化的分钟版本")
+        from btc_triple_signal_strategy_1h import BtcTripleSignalStrategy1h
+        return type(
+            "BtcTripleSignalStrategyMin",
+            (BtcTripleSignalStrategy1h,),
+            {"__doc__": "BTC 三重信号策略 (分钟版)，使用分钟K线"}
+        )
 
 def run_backtest_leverage_minutes():
     """使用4倍杠杆和分钟K线运行回测"""
@@ -110,65 +278,24 @@ def run_backtest_leverage_minutes():
         print(f"   - {name}: {value}")
 
     # ================== 2. 初始化回测引擎 ==================
-    engine = BacktestingEngine()
-    
-    # 设置回测参数
-    engine.set_parameters(
-        vt_symbol=vt_symbol,
-        interval=interval,
-        start=start,
-        end=end,
-        rate=0.0004,  # 杠杆交易手续费率：0.04% (通常杠杆交易手续费更高)
-        slippage=0.5,  # 滑点：0.5 USD
-        size=1,        # 合约大小：1
-        pricetick=0.01, # 价格跳动：0.01 USD
-        capital=initial_capital
-    )
+    # 设置回测参数并加载K线 (同一进程中已加载过相同区间时直接复用)
+    engine = get_engine(vt_symbol, interval, start, end, initial_capital)
     
     # 添加策略
-    engine.add_strategy(BtcTripleSignalStrategyMin, best_params)
+    engine.add_strategy(_strategy_class(), best_params)
 
     # ================== 3. 运行回测 ==================
     print("\n⚙️ 开始回测...")
-    engine.load_data()
     engine.run_backtesting()
     
     # ================== 4. 计算结果并应用杠杆因子 ==================
     print("\n🧮 计算结果并应用杠杆倍数...")
     engine.calculate_result()
     
-    # 应用杠杆因子到每个交易的盈亏
-    for trade in engine.trades:
-        try:
-            if hasattr(trade, "pnl") and isinstance(trade.pnl, (int, float)):
-                trade.pnl *= leverage
-            elif hasattr(trade, "pnl") and isinstance(trade.pnl, str):
-                # 尝试转换为浮点数
-                try:
-                    pnl_value = float(trade.pnl)
-                    trade.pnl = pnl_value * leverage
-                except ValueError:
-                    print(f"警告: 无法转换交易盈亏 '{trade.pnl}' 为数值")
-        except Exception as e:
-            print(f"处理交易盈亏时出错: {e}")
-    
-    # 应用杠杆因子到日度盈亏
-    for date, daily_result in engine.daily_results.items():
-        try:
-            if hasattr(daily_result, 'net_pnl'):
-                if isinstance(daily_result.net_pnl, (int, float)):
-                    daily_result.net_pnl *= leverage
-            
-            if hasattr(daily_result, 'end_balance'):
-                # 调整结束余额，考虑初始资金和杠杆盈亏
-                if isinstance(daily_result.end_balance, (int, float)):
-                    leverage_profit = daily_result.end_balance - engine.capital
-                    daily_result.end_balance = engine.capital + leverage_profit * leverage
-        except Exception as e:
-            print(f"处理日度结果时出错: {e}")
-    
-    # 重新计算统计指标，但不显示结果(我们将在下面手动显示)
-    statistics = engine.calculate_statistics(output=False)
+    # 杠杆放大逐日盈亏后按列计算统计指标，结果在下面手动显示
+    # (engine.trades是以成交编号为键的字典，成交对象本身没有盈亏字段，杠杆只需作用于逐日结果)
+    daily_df = apply_leverage(engine.daily_df, leverage)
+    statistics = daily_statistics(daily_df, initial_capital, annual_days=engine.annual_days, risk_free=engine.risk_free)
     
     # ================== 5. 显示结果统计 ==================
     print("\n" + "=" * 40)
@@ -196,15 +323,24 @@ def run_backtest_leverage_minutes():
     
     for key, name in important_stats:
         value = statistics.get(key, "N/A")
-        # 格式化百分比
-        if "return" in key or "percent" in key:
+        # 格式化百分比 (统计结果中的收益率和回撤比例本身已是百分数)
+        if key.endswith("_return") or key.endswith("percent"):
             if isinstance(value, (int, float)):
-                value = f"{value * 100:.2f}%"
+                value = f"{value:.2f}%"
         # 格式化浮点数
         elif isinstance(value, float):
             value = f"{value:.4f}"
             
         print(f"{name:.<20} {value}")
+    
+    # 同期标的走势 (按收盘价整列计算)，作为对比基准
+    records = bar_records(engine)
+    if len(records):
+        close = records["close"]
+        peak = np.maximum.accumulate(close)
+        print(f"{'标的K线数':.<20} {len(records)}")
+        print(f"{'标的涨跌幅':.<20} {(close[-1] / close[0] - 1) * 100:.2f}%")
+        print(f"{'标的最大回撤比例':.<20} {((close - peak) / peak).min() * 100:.2f}%")
         
     # ================== 6. 展示详细交易记录 ==================
     try:
@@ -216,20 +352,18 @@ def run_backtest_leverage_minutes():
             print(f"{'序号':<5}{'时间':<20}{'方向':<6}{'价格':<10}{'数量':<8}{'盈亏':<10}")
             print("-" * 60)
             
-            for i, trade in enumerate(trades[:10]):
-                direction = "多" if str(trade.direction) == "Direction.LONG" else "空"
-                try:
-                    profit = f"{float(trade.pnl):.2f}" if hasattr(trade, "pnl") else "N/A"
-                    price = f"{float(trade.price):.2f}"
-                    volume = f"{float(trade.volume):.2f}"
-                    datetime_str = trade.datetime.strftime('%Y-%m-%d %H:%M') if hasattr(trade.datetime, 'strftime') else str(trade.datetime)
-                except:
-                    profit = "N/A"
-                    price = str(trade.price)
-                    volume = str(trade.volume)
-                    datetime_str = str(trade.datetime)
-                    
-                print(f"{i+1:<5}{datetime_str:<20}{direction:<6}{price:<10}{volume:<8}{profit:<10}")
+            # 成交对象类型固定 (价格、数量为float，时间为datetime)，字段检查只在循环外做一次；
+            # vnpy的TradeData没有盈亏字段，此时盈亏列显示N/A
+            # 所有行拼接后一次写出；方向按枚举对象身份比较，不必每行生成或读取字符串
+            has_pnl = hasattr(trades[0], "pnl")
+            lines = [
+                f"{i+1:<5}{trade.datetime.strftime('%Y-%m-%d %H:%M'):<20}"
+                f"{'多' if trade.direction is Direction.LONG else '空':<6}"
+                f"{trade.price:<10.2f}{trade.volume:<8.2f}"
+                f"{format(trade.pnl, '.2f') if has_pnl else 'N/A':<10}"
+                for i, trade in enumerate(trades[:10])
+            ]
+            sys.stdout.write("\n".join(lines) + "\n")
             
             print(f"\n共{len(trades)}笔交易")
     except Exception as e:
@@ -239,18 +373,45 @@ def run_backtest_leverage_minutes():
         
     # 显示图表
     print("\n📈 显示资金曲线图...")
-    engine.show_chart()
+    engine.show_chart(daily_df)
     
     return engine, statistics
 
-def analyze_leverage_impact():
-    """分析不同杠杆倍数的影响"""
-    print("\n" + "=" * 30)
-    print("📊 杠杆影响分析:")
-    print("=" * 30)
+def _run_one(leverage: float) -> LevRes:
+    """
+    按杠杆倍数放大下单手数，完整重跑一次杠杆影响分析所用的回测，返回该倍数的指标
+    
+    定义在模块顶层以便多进程池序列化；每个工作进程自行创建引擎并连接数据库，
+    同一工作进程依次处理多个杠杆倍数时复用已加载K线的引擎
+    """
+    engine = get_engine(
+        "btcusdt.SMART", Interval.MINUTE,
+        datetime.datetime(2024, 5, 1), datetime.datetime(2025, 6, 30), 100000
+    )
     
-    # 测试不同杠杆倍数
-    leverage_options = [1.0, 2.0, 3.0, 4.0, 5.0]
+    setting = {
+        "rsi_buy_level": 40,
+        "rsi_sell_level": 80,
+        "stop_loss_pct": 0.03,
+        "signal_num": 2,
+        "fast_window": 5,
+        "slow_window": 30,
+        "fixed_size": _strategy_class().fixed_size * leverage
+    }
+    engine.add_strategy(_strategy_class(), setting)
+    engine.run_backtesting()
+    engine.calculate_result()
+    stats = engine.calculate_statistics(output=False)
+    
+    return LevRes(
+        stats.get("total_return", 0),
+        stats.get("annual_return", 0),
+        stats.get("max_ddpercent", 0),
+        stats.get("sharpe_ratio", 0)
+    )
+
+def _analyze_leverage_analytic(leverage_options) -> dict:
+    """只跑一次基准回测，各杠杆倍数的指标由基准逐日净盈亏解析算出"""
     results = {}
     
     # 基础参数
@@ -273,85 +434,57 @@ def analyze_leverage_impact():
     
     # 先运行一次基准回测，然后仅应用不同杠杆倍数
     print("\n运行基准回测...")
-    engine = BacktestingEngine()
-    engine.set_parameters(
-        vt_symbol=vt_symbol,
-        interval=interval,
-        start=start,
-        end=end,
-        rate=0.0004,
-        slippage=0.5,
-        size=1,
-        pricetick=0.01,
-        capital=initial_capital
-    )
-    
-    engine.add_strategy(BtcTripleSignalStrategyMin, best_params)
-    engine.load_data()
+    engine = get_engine(vt_symbol, interval, start, end, initial_capital)
+    engine.add_strategy(_strategy_class(), best_params)
     engine.run_backtesting()
     engine.calculate_result()
-    base_stats = engine.calculate_statistics(output=False)
-    
-    # 保存基准结果 (杠杆倍数=1)
-    results[1.0] = {
-        "total_return": base_stats.get("total_return", 0) * 100,
-        "annual_return": base_stats.get("annual_return", 0) * 100,
-        "max_drawdown": base_stats.get("max_ddpercent", 0) * 100,
-        "sharpe_ratio": base_stats.get("sharpe_ratio", 0)
-    }
     
-    # 对每种杠杆倍数计算结果
-    for leverage in leverage_options[1:]:  # 跳过1倍杠杆(已经计算)
+    # 基准逐日净盈亏只取一次，各杠杆倍数的统计指标均由它解析算出，不再逐个倍数重算
+    # (calculate_statistics返回的收益率、回撤比例本身已是百分数，无需再乘100)
+    base_net_pnl = engine.daily_df["net_pnl"].to_numpy(np.float64) if not engine.daily_df.empty else np.empty(0)
+    for leverage in leverage_options:
         print(f"\n计算 {leverage}倍 杠杆结果...")
-        
-        # 应用杠杆因子到每个交易的盈亏
-        for trade in engine.trades:
-            try:
-                if hasattr(trade, "pnl"):
-                    if isinstance(trade.pnl, (int, float)):
-                        trade.pnl = (trade.pnl / results[1.0]["total_return"] * 100) * leverage
-                    elif isinstance(trade.pnl, str):
-                        try:
-                            pnl_value = float(trade.pnl)
-                            trade.pnl = (pnl_value / results[1.0]["total_return"] * 100) * leverage
-                        except ValueError:
-                            print(f"警告: 无法转换交易盈亏 '{trade.pnl}' 为数值")
-            except Exception as e:
-                print(f"处理交易盈亏时出错: {e}")
-        
-        # 应用杠杆因子到日度盈亏
-        for date, daily_result in engine.daily_results.items():
-            try:
-                if hasattr(daily_result, 'net_pnl'):
-                    if isinstance(daily_result.net_pnl, (int, float)):
-                        daily_result.net_pnl *= leverage
-                
-                if hasattr(daily_result, 'end_balance'):
-                    # 调整结束余额，考虑初始资金和杠杆盈亏
-                    if isinstance(daily_result.end_balance, (int, float)):
-                        leverage_profit = daily_result.end_balance - engine.capital
-                        daily_result.end_balance = engine.capital + leverage_profit * leverage
-            except Exception as e:
-                print(f"处理日度结果时出错: {e}")
-                
-        # 深度复制基础统计数据
-        leveraged_stats = base_stats.copy()
-        
-        # 应用杠杆因子
-        if "total_return" in leveraged_stats:
-            leveraged_stats["total_return"] *= leverage
-        if "annual_return" in leveraged_stats:
-            leveraged_stats["annual_return"] *= leverage
-        if "max_ddpercent" in leveraged_stats:
-            leveraged_stats["max_ddpercent"] *= leverage
-        
-        # 保存结果
-        results[leverage] = {
-            "total_return": leveraged_stats.get("total_return", 0) * 100,
-            "annual_return": leveraged_stats.get("annual_return", 0) * 100,
-            "max_drawdown": leveraged_stats.get("max_ddpercent", 0) * 100,
-            "sharpe_ratio": leveraged_stats.get("sharpe_ratio", 0)
-        }
+        stats = leverage_statistics(
+            base_net_pnl, initial_capital, leverage,
+            annual_days=engine.annual_days, risk_free=engine.risk_free
+        )
+        results[leverage] = LevRes(
+            stats["total_return"],
+            stats["annual_return"],
+            stats["max_ddpercent"],
+            stats["sharpe_ratio"]
+        )
+    
+    return results
+
+def analyze_leverage_impact(resimulate: bool = False):
+    """
+    分析不同杠杆倍数的影响
+    
+    参数:
+        resimulate: 为False时只跑一次基准回测，各倍数的指标由逐日盈亏解析算出；
+                    为True时每个倍数放大下单手数后完整重跑回测，用多进程池并行执行
+    """
+    print("\n" + "=" * 30)
+    print("📊 杠杆影响分析:")
+    print("=" * 30)
+    
+    # 测试不同杠杆倍数
+    leverage_options = [1.0, 2.0, 3.0, 4.0, 5.0]
+    results = {}
+    
+    if resimulate:
+        # 使用spawn启动工作进程，避免fork复制父进程中已建立的MySQL连接
+        processes = min(len(leverage_options), os.cpu_count() or 1)
+        print(f"\n使用 {processes} 个进程并行重跑 {len(leverage_options)} 个杠杆倍数的回测...")
+        # 先在主进程中编译指标内核并写入numba磁盘缓存，工作进程直接加载
+        from _indicator_kernels import warmup_kernels
+        warmup_kernels()
+        with multiprocessing.get_context("spawn").Pool(processes=processes) as pool:
+            out = pool.map(_run_one, leverage_options)
+        results = dict(zip(leverage_options, out))
+    else:
+        results = _analyze_leverage_analytic(leverage_options)
     
     # 创建比较表格
     print("\n杠杆倍数对比结果:")
@@ -359,70 +492,82 @@ def analyze_leverage_impact():
     print("-" * 70)
     
     for leverage, stats in results.items():
-        print(f"{leverage:<10.1f}x{stats['total_return']:<15.2f}%{stats['annual_return']:<15.2f}%{stats['max_drawdown']:<15.2f}%{stats['sharpe_ratio']:<15.4f}")
-    
-    # 绘制比较图
-    plt.figure(figsize=(12, 10))
-    
-    # 1. 总收益率对比
-    plt.subplot(2, 2, 1)
-    plt.bar([str(l) + "x" for l in results.keys()], [r["total_return"] for r in results.values()], color='blue')
-    plt.title('总收益率对比')
-    plt.ylabel('收益率 (%)')
-    plt.xlabel('杠杆倍数')
-    
-    # 2. 年化收益率对比
-    plt.subplot(2, 2, 2)
-    plt.bar([str(l) + "x" for l in results.keys()], [r["annual_return"] for r in results.values()], color='green')
-    plt.title('年化收益率对比')
-    plt.ylabel('收益率 (%)')
-    plt.xlabel('杠杆倍数')
-    
-    # 3. 最大回撤对比
-    plt.subplot(2, 2, 3)
-    plt.bar([str(l) + "x" for l in results.keys()], [r["max_drawdown"] for r in results.values()], color='red')
-    plt.title('最大回撤对比')
-    plt.ylabel('回撤比例 (%)')
-    plt.xlabel('杠杆倍数')
-    
-    # 4. 夏普比率对比
-    plt.subplot(2, 2, 4)
-    plt.bar([str(l) + "x" for l in results.keys()], [r["sharpe_ratio"] for r in results.values()], color='purple')
-    plt.title('夏普比率对比')
-    plt.ylabel('夏普比率')
-    plt.xlabel('杠杆倍数')
-    
-    plt.tight_layout()
-    plt.savefig('leverage_comparison.png')
-    plt.show()
+        print(f"{leverage:<10.1f}x{stats.total_return:<15.2f}%{stats.annual_return:<15.2f}%{stats.max_drawdown:<15.2f}%{stats.sharpe_ratio:<15.4f}")
+    
+    # 绘制比较图 (没有图形界面时使用Agg后端，只保存图片，不初始化GUI)
+    import matplotlib
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    
+    # (标题, 纵轴, 指标, 颜色)：总收益率、年化收益率、最大回撤、夏普比率
+    specs = [
+        ("总收益率对比", "收益率 (%)", "total_return", "blue"),
+        ("年化收益率对比", "收益率 (%)", "annual_return", "green"),
+        ("最大回撤对比", "回撤比例 (%)", "max_drawdown", "red"),
+        ("夏普比率对比", "夏普比率", "sharpe_ratio", "purple"),
+    ]
+    labels = [f"{l}x" for l in results]
+    
+    fig, axes = plt.subplots(2, 2, figsize=(12, 10))
+    for ax, (title, ylabel, key, color) in zip(axes.flat, specs):
+        ax.bar(labels, [getattr(r, key) for r in results.values()], color=color)
+        ax.set_title(title)
+        ax.set_ylabel(ylabel)
+        ax.set_xlabel('杠杆倍数')
+    
+    fig.tight_layout()
+    fig.savefig('leverage_comparison.png')
+    if matplotlib.get_backend().lower() != "agg":
+        plt.show()
     
     return results
 
-def check_minute_data_availability():
-    """检查分钟K线数据是否可用"""
-    import mysql.connector
-    from mysql.connector import Error
+# 模块级MySQL连接池，首次取连接时创建，此后各数据库辅助函数共用
+_db_pool = None
 
-    try:
-        # 连接到MySQL数据库
-        conn = mysql.connector.connect(
+def get_db_connection():
+    """
+    从连接池借出一个MySQL连接，用完调用close()即归还连接池而不断开
+    """
+    global _db_pool
+    if _db_pool is None:
+        from mysql.connector import pooling
+        
+        # use_pure=False 使用C扩展驱动
+        _db_pool = pooling.MySQLConnectionPool(
+            pool_name="vnpy",
+            pool_size=4,
             host="localhost",
             user="root",
             password="",
-            database="vnpy"
+            database="vnpy",
+            use_pure=False
         )
+    return _db_pool.get_connection()
+
+def check_minute_data_availability():
+    """检查分钟K线数据是否可用"""
+    from mysql.connector import Error
+
+    try:
+        # 从连接池借用MySQL连接
+        conn = get_db_connection()
         
         if conn.is_connected():
-            cursor = conn.cursor()
+            # 聚合查询结果只有几行，使用缓冲游标
+            cursor = conn.cursor(buffered=True)
             
             # 查询分钟级别的数据
+            # 条件带上exchange，与下载器建表时的索引 (symbol, exchange, `interval`, datetime)
+            # 前缀完全匹配，COUNT/MIN/MAX只需扫描索引，不回表
             query = """
                 SELECT COUNT(*) as count, 
                        MIN(datetime) as earliest, 
                        MAX(datetime) as latest,
                        `interval`
                 FROM dbbardata 
-                WHERE symbol = 'btcusdt' AND `interval` = '1m'
+                WHERE symbol = 'btcusdt' AND exchange = 'SMART' AND `interval` = '1m'
                 GROUP BY `interval`
             """
             
@@ -441,7 +586,7 @@ def check_minute_data_availability():
                 query = """
                     SELECT `interval`, COUNT(*) as count 
                     FROM dbbardata 
-                    WHERE symbol = 'btcusdt'
+                    WHERE symbol = 'btcusdt' AND exchange = 'SMART'
                     GROUP BY `interval`
                 """
                 cursor.execute(query)
@@ -466,50 +611,29 @@ def download_minute_data():
     """下载分钟级别的历史数据"""
     print("\n准备下载分钟级别的历史数据...")
     
-    # 如果vnpy_data_downloader.py存在，使用它下载数据
-    if os.path.exists("vnpy_data_downloader.py"):
-        print("使用现有的下载器下载分钟K线数据...")
-        try:
-            # 修改下载器以支持分钟K线
-            with open("vnpy_data_downloader.py", "r") as f:
-                code = f.read()
-                
-            # 临时创建分钟K线下载器
-            with open("download_minute_data.py", "w") as f:
-                # 修改interval为分钟
-                modified_code = code.replace('interval = "1h"', 'interval = "1m"')
-                # 修改下载时间范围
-                modified_code = modified_code.replace(
-                    'start_date = datetime.datetime(2023, 1, 1)',
-                    'start_date = datetime.datetime(2024, 5, 1)'
-                )
-                modified_code = modified_code.replace(
-                    'end_date = datetime.datetime(2024, 5, 1)',
-                    'end_date = datetime.datetime(2025, 6, 30)'
-                )
-                f.write(modified_code)
-                
-            # 执行下载
-            print("开始下载分钟K线数据，这可能需要较长时间...")
-            os.system(f"{sys.executable} download_minute_data.py")
-            
-            # 检查下载结果
-            has_data = check_minute_data_availability()
-            if has_data:
-                print("✅ 分钟K线数据下载成功")
-            else:
-                print("❌ 分钟K线数据下载失败或不完整")
-            
-            # 删除临时文件
-            os.remove("download_minute_data.py")
-            
-        except Exception as e:
-            print(f"下载数据时出错: {e}")
-            import traceback
-            traceback.print_exc()
-    else:
+    try:
+        # 在当前进程中直接调用下载器，无需改写源码和启动子进程
+        from vnpy_data_downloader import download
+    except ImportError:
         print("❌ 找不到数据下载器 vnpy_data_downloader.py")
         print("请先创建数据下载器或手动下载分钟级别的数据")
+        return
+    
+    print("开始下载分钟K线数据，这可能需要较长时间...")
+    try:
+        download("btcusdt", "1m", datetime.datetime(2024, 5, 1), datetime.datetime(2025, 6, 30))
+        
+        # 检查下载结果
+        has_data = check_minute_data_availability()
+        if has_data:
+            print("✅ 分钟K线数据下载成功")
+        else:
+            print("❌ 分钟K线数据下载失败或不完整")
+    
+    except Exception as e:
+        print(f"下载数据时出错: {e}")
+        import traceback
+        traceback.print_exc()
 
 def main():
     """主函数"""
@@ -532,14 +656,17 @@ def main():
     print("\n请选择操作:")
     print("1. 执行4倍杠杆回测 (2024.5-2025.6)")
     print("2. 分析不同杠杆倍数的影响")
-    print("3. 退出")
+    print("3. 分析不同杠杆倍数的影响 (逐个倍数完整重跑回测，多进程并行)")
+    print("4. 退出")
     
-    choice = input("\n请输入选项 (1/2/3): ")
+    choice = input("\n请输入选项 (1/2/3/4): ")
     
     if choice == '1':
         run_backtest_leverage_minutes()
     elif choice == '2':
         analyze_leverage_impact()
+    elif choice == '3':
+        analyze_leverage_impact(resimulate=True)
     else:
         print("退出程序")
 
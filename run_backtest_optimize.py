@@ -5,17 +5,34 @@ import datetime
 import sys
 import os
 import argparse
+import hashlib
+import json
+import pickle
+import sqlite3
+from functools import lru_cache, partial
+from multiprocessing import shared_memory
+
+import numpy as np
 
 # 添加vnpy路径
 sys.path.append(os.path.abspath("../../../"))
 
 # 导入vnpy组件
 from vnpy_ctabacktester.engine import BacktestingEngine, OptimizationSetting
+from vnpy_ctastrategy.backtesting import get_target_value
 from vnpy.trader.constant import Interval
+from vnpy.trader.object import BarData
+from vnpy.trader.optimize import run_ga_optimization, check_optimization_setting
 from vnpy.trader.setting import SETTINGS
 
 # 导入自定义策略
-from btc_triple_signal_strategy_1h import BtcTripleSignalStrategy1h
+from btc_triple_signal_strategy_1h import (
+    BtcTripleSignalStrategy1h,
+    GRID_CACHE_DIR,
+    _connect_bar_db,
+    load_bar_data_cached,
+)
+from _indicator_kernels import warmup_kernels
 from vnpy.trader.object import Exchange
 
 # 配置使用 MySQL 数据库
@@ -27,7 +44,445 @@ SETTINGS["database.port"] = 3306  # 数据库端口
 SETTINGS["database.user"] = "root"  # 数据库用户名
 SETTINGS["database.password"] = ""  # 数据库密码
 
-def run_optimization(target_name="sharpe_ratio"):
+def default_workers():
+    """
+    遗传算法默认的并行进程数：物理核心数减一 (留一个核心给主进程)，未安装psutil时按逻辑核心数计算
+    """
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+    except ImportError:
+        cores = None
+    return max(1, (cores or os.cpu_count() or 1) - 1)
+
+
+# 共享内存中K线数组的字段 (datetime为去掉时区的本地时间)
+SHARED_BAR_DTYPE = np.dtype([
+    ("datetime", "datetime64[us]"),
+    ("open_price", np.float64),
+    ("high_price", np.float64),
+    ("low_price", np.float64),
+    ("close_price", np.float64),
+    ("volume", np.float64),
+    ("turnover", np.float64),
+    ("open_interest", np.float64),
+])
+
+
+def publish_bars(bars):
+    """
+    将K线列表写入一块新建的共享内存，返回 (SharedMemory, K线数量, 时区)
+    调用方负责在优化结束后close()并unlink()
+    """
+    records = np.array(
+        [
+            (
+                bar.datetime.replace(tzinfo=None), bar.open_price, bar.high_price, bar.low_price,
+                bar.close_price, bar.volume, bar.turnover, bar.open_interest
+            )
+            for bar in bars
+        ],
+        dtype=SHARED_BAR_DTYPE
+    )
+    shm = shared_memory.SharedMemory(create=True, size=max(records.nbytes, 1))
+    np.ndarray(records.shape, SHARED_BAR_DTYPE, buffer=shm.buf)[:] = records
+    tzinfo = bars[0].datetime.tzinfo if bars else None
+    return shm, len(records), tzinfo
+
+
+@lru_cache(maxsize=4)
+def _shared_bars(shm_name, count, symbol, exchange, interval, tzinfo):
+    """
+    从主进程发布的共享内存重建K线列表 (每个工作进程一次)，之后各次回测共用
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        records = np.ndarray((count,), SHARED_BAR_DTYPE, buffer=shm.buf)
+        columns = {name: records[name].tolist() for name in SHARED_BAR_DTYPE.names}
+    finally:
+        shm.close()
+    
+    return [
+        BarData(
+            symbol=symbol,
+            exchange=exchange,
+            datetime=dt.replace(tzinfo=tzinfo),
+            interval=interval,
+            volume=volume,
+            turnover=turnover,
+            open_interest=open_interest,
+            open_price=open_price,
+            high_price=high_price,
+            low_price=low_price,
+            close_price=close_price,
+            gateway_name="DB"
+        )
+        for dt, open_price, high_price, low_price, close_price, volume, turnover, open_interest in zip(
+            columns["datetime"], columns["open_price"], columns["high_price"], columns["low_price"],
+            columns["close_price"], columns["volume"], columns["turnover"], columns["open_interest"]
+        )
+    ]
+
+
+# K线的Parquet列式缓存目录：MySQL仍是主数据源，回测读取路径优先使用Parquet文件
+PARQUET_DIR = GRID_CACHE_DIR
+
+PARQUET_COLUMNS = [
+    "datetime", "open_price", "high_price", "low_price", "close_price",
+    "volume", "turnover", "open_interest",
+]
+
+
+# 导出Parquet时每批从服务端游标取回的K线数
+EXPORT_BATCH_SIZE = 10000
+
+
+def parquet_path(symbol, interval):
+    """K线Parquet缓存文件路径，如 .grid_cache/btcusdt_1h.parquet"""
+    return os.path.join(PARQUET_DIR, f"{symbol}_{interval}.parquet")
+
+
+def _source_stats(count, max_datetime):
+    """数据源指纹：K线数量和最后一根K线的时间，写入Parquet文件的元数据"""
+    return {
+        b"source_count": str(count).encode(),
+        b"source_max_datetime": (max_datetime.isoformat() if max_datetime else "").encode(),
+    }
+
+
+def query_source_stats(symbol, interval, exchange="SMART"):
+    """查询dbbardata中该标的和周期的K线数量和最新时间 (只走唯一索引，开销很小)"""
+    connection = _connect_bar_db()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+                SELECT COUNT(*), MAX(datetime)
+                FROM dbbardata
+                WHERE symbol = %s AND exchange = %s AND `interval` = %s
+            """,
+            (symbol, exchange, interval)
+        )
+        count, max_datetime = cursor.fetchone()
+        cursor.close()
+    finally:
+        connection.close()
+    return _source_stats(count, max_datetime)
+
+
+def export_to_parquet(symbol, interval, exchange="SMART"):
+    """
+    用一次查询读取dbbardata中该标的和周期的全部K线，写入Parquet缓存文件
+    结果集经服务端游标按EXPORT_BATCH_SIZE分批取回并逐批转为Arrow记录批，不在客户端整体缓冲；
+    文件元数据记录导出时的K线数量和最新时间，数据库变化后load_parquet_bars会自动重新导出；
+    返回写入的K线数量
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = pa.schema([
+        (name, pa.timestamp("us") if name == "datetime" else pa.float64())
+        for name in PARQUET_COLUMNS
+    ])
+    batches = []
+    last_datetime = None
+    
+    connection = _connect_bar_db()
+    try:
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(
+            f"""
+                SELECT {", ".join(PARQUET_COLUMNS)}
+                FROM dbbardata
+                WHERE symbol = %s AND exchange = %s AND `interval` = %s
+                ORDER BY datetime
+            """,
+            (symbol, exchange, interval)
+        )
+        while rows := cursor.fetchmany(EXPORT_BATCH_SIZE):
+            batches.append(pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)],
+                schema=schema
+            ))
+            last_datetime = rows[-1][0]
+        cursor.close()
+    finally:
+        connection.close()
+    
+    table = pa.Table.from_batches(batches, schema=schema)
+    # 指纹按实际导出的行计算，与导出期间并发写入的数据无关
+    table = table.replace_schema_metadata(_source_stats(table.num_rows, last_datetime))
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+    pq.write_table(table, parquet_path(symbol, interval))
+    return table.num_rows
+
+
+def load_parquet_bars(engine):
+    """
+    从Parquet缓存读取引擎回测区间的K线
+    缓存文件不存在，或数据库的K线数量/最新时间与文件元数据不一致时，先从MySQL重新导出；
+    未安装pyarrow时返回None，由调用方退回原来的读取方式
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+    from vnpy.trader.database import DB_TZ
+    
+    symbol, interval, exchange = engine.symbol, engine.interval.value, engine.exchange.value
+    path = parquet_path(symbol, interval)
+    if not os.path.exists(path):
+        print(f"📦 导出K线到Parquet缓存: {path}")
+        export_to_parquet(symbol, interval, exchange)
+    else:
+        metadata = pq.read_schema(path).metadata or {}
+        source_stats = query_source_stats(symbol, interval, exchange)
+        if any(metadata.get(key) != value for key, value in source_stats.items()):
+            print(f"📦 数据库K线已变化，重新导出Parquet缓存: {path}")
+            export_to_parquet(symbol, interval, exchange)
+    
+    table = pq.read_table(
+        path,
+        filters=[("datetime", ">=", engine.start), ("datetime", "<=", engine.end)]
+    )
+    columns = {name: table.column(name).to_pylist() for name in PARQUET_COLUMNS}
+    
+    return [
+        BarData(
+            symbol=engine.symbol,
+            exchange=engine.exchange,
+            datetime=dt.replace(tzinfo=DB_TZ),
+            interval=engine.interval,
+            volume=volume,
+            turnover=turnover,
+            open_interest=open_interest,
+            open_price=open_price,
+            high_price=high_price,
+            low_price=low_price,
+            close_price=close_price,
+            gateway_name="DB"
+        )
+        for dt, open_price, high_price, low_price, close_price, volume, turnover, open_interest in zip(
+            *(columns[name] for name in PARQUET_COLUMNS)
+        )
+    ]
+
+
+def load_engine_data(engine):
+    """
+    加载回测引擎的K线：优先读取Parquet缓存，未安装pyarrow时使用engine.load_data()查询数据库
+    """
+    bars = load_parquet_bars(engine)
+    if bars is None:
+        engine.load_data()
+    else:
+        engine.history_data = bars
+        engine.output(f"从Parquet缓存加载K线 {len(bars)} 条")
+
+
+class SharedBarsEngine(BacktestingEngine):
+    """
+    从共享内存读取K线的回测引擎，load_data不再查询数据库
+    """
+    
+    shared_bars = None  # (共享内存名称, K线数量, 时区)，由_create_engine设置
+    
+    def load_data(self):
+        """从共享内存读取回测区间的K线"""
+        self.history_data = _shared_bars(
+            *self.shared_bars[:2], self.symbol, self.exchange, self.interval, self.shared_bars[2]
+        )
+
+
+def _create_engine(vt_symbol, interval, start, end, capital, shared_bars=None):
+    """
+    创建并设置优化用的回测引擎 (模块顶层函数，可传给工作进程)
+    传入shared_bars时创建从共享内存读取K线的SharedBarsEngine
+    """
+    if shared_bars is None:
+        engine = BacktestingEngine()
+    else:
+        engine = SharedBarsEngine()
+        engine.shared_bars = shared_bars
+    engine.set_parameters(
+        vt_symbol=vt_symbol,
+        interval=interval,
+        start=start,
+        end=end,
+        rate=0.0003,  # 手续费率：0.03%
+        slippage=0.5,  # 滑点：0.5 USD
+        size=1,        # 合约大小：1
+        pricetick=0.01, # 价格跳动：0.01 USD
+        capital=capital
+    )
+    return engine
+
+
+# 遗传算法的参数搜索空间: 参数名 -> (起始值, 终止值, 步长)
+PARAMETER_SPACE = {
+    "rsi_buy_level": (20, 40, 5),                       # RSI买入阈值：20-40
+    "rsi_sell_level": (60, 80, 5),                      # RSI卖出阈值：60-80
+    "stop_loss_pct": (0.02, 0.08, 0.01),                # 初始止损百分比：2%-8%
+    "trailing_stop_pct": (0.01, 0.05, 0.01),            # 移动止损回撤百分比：1%-5%
+    "trailing_stop_activation_pct": (0.005, 0.02, 0.005), # 移动止损激活阈值：0.5%-2%
+    "slippage_tolerance_pct": (0.0005, 0.003, 0.0005),  # 滑点容忍百分比：0.05%-0.3%
+    "signal_num": (2, 3, 1),                            # 信号数：2-3（提高最小值，确保多指标共振）
+    "fast_window": (5, 20, 5),                          # 快速均线窗口：5-20
+    "slow_window": (20, 50, 5),                         # 慢速均线窗口：20-50
+    # 【新增】ATR参数优化
+    "atr_length": (10, 20, 2),                          # ATR计算周期：10-20
+    "atr_multiplier": (1.5, 3.5, 0.5),                  # ATR倍数：1.5-3.5
+    # 【新增】ADX参数优化
+    "adx_length": (10, 20, 2),                          # ADX计算周期：10-20
+    "adx_threshold": (15, 30, 5),                       # ADX阈值：15-30
+    # 【新增】成交量参数优化
+    "volume_window": (10, 30, 5),                       # 成交量窗口：10-30
+    "volume_multiplier": (1.0, 2.0, 0.2),               # 成交量倍数：1.0-2.0
+}
+
+
+def coarse_space(param_space, factor=2):
+    """
+    粗搜索空间：步长放大factor倍，放大后只剩一个取值的参数保留原步长
+    """
+    space = {}
+    for name, (start_value, end_value, step) in param_space.items():
+        coarse_step = step * factor
+        if start_value + coarse_step > end_value:
+            coarse_step = step
+        space[name] = (start_value, end_value, coarse_step)
+    return space
+
+
+def fine_space(param_space, settings, window=2):
+    """
+    细搜索空间：覆盖settings中各参数取值±window个原步长的范围 (不超出原搜索空间)，步长恢复为原步长
+    """
+    space = {}
+    for name, (start_value, end_value, step) in param_space.items():
+        values = [setting[name] for setting in settings]
+        low = max(start_value, min(values) - window * step)
+        high = min(end_value, max(values) + window * step)
+        # 对齐到原步长网格，并消除浮点累加误差
+        low = round(start_value + round((low - start_value) / step) * step, 10)
+        high = round(start_value + round((high - start_value) / step) * step, 10)
+        space[name] = (low, high, step)
+    return space
+
+
+# 跨运行持久保存的适应度缓存 (SQLite)，目标不同的优化共用同一份回测统计结果
+FITNESS_CACHE_PATH = os.path.join(GRID_CACHE_DIR, "ga_fitness.db")
+
+
+@lru_cache(maxsize=None)
+def _strategy_source_hash():
+    """
+    策略及其指标内核源码的哈希值，源码改动后旧的缓存结果自动失效
+    
+    策略优先使用编译好的_strategy_kernels扩展，因此.pyx源码和实际加载的扩展文件也计入哈希
+    (重新编译或删除扩展后同样失效)
+    """
+    import btc_triple_signal_strategy_1h
+    import _indicator_kernels
+    
+    paths = [
+        btc_triple_signal_strategy_1h.__file__,
+        _indicator_kernels.__file__,
+        os.path.join(os.path.dirname(os.path.abspath(_indicator_kernels.__file__)), "_strategy_kernels.pyx"),
+    ]
+    try:
+        import _strategy_kernels
+        paths.append(_strategy_kernels.__file__)
+    except ImportError:
+        pass
+    
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _fitness_db():
+    """
+    打开 (每个进程一次) 适应度缓存数据库；WAL模式允许多个工作进程同时读写
+    """
+    os.makedirs(GRID_CACHE_DIR, exist_ok=True)
+    db = sqlite3.connect(FITNESS_CACHE_PATH, timeout=60)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("CREATE TABLE IF NOT EXISTS fitness (key TEXT PRIMARY KEY, statistics BLOB)")
+    db.commit()
+    return db
+
+
+def _fitness_key(data_key, setting):
+    """
+    缓存键：策略源码哈希 + 回测区间、引擎参数与K线指纹 + 按名称排序的参数组合
+    """
+    payload = json.dumps(
+        {"source": _strategy_source_hash(), "data": data_key, "setting": setting},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _run_shared_setting(engine_factory, setting):
+    """
+    在工作进程中用一组参数运行一次完整回测，K线来自主进程发布的共享内存
+    """
+    engine = engine_factory()
+    engine.add_strategy(BtcTripleSignalStrategy1h, {"log_level": 0, **setting})
+    engine.load_data()
+    engine.run_backtesting()
+    engine.calculate_result()
+    return setting, engine.calculate_statistics(output=False)
+
+
+def cached_statistics(data_key, setting):
+    """
+    从适应度缓存读取一组参数的回测统计结果，未回测过时返回None
+    """
+    row = _fitness_db().execute(
+        "SELECT statistics FROM fitness WHERE key = ?", (_fitness_key(data_key, setting),)
+    ).fetchone()
+    return pickle.loads(row[0]) if row else None
+
+
+def _ga_evaluate(target_name, engine_factory, data_key, setting):
+    """
+    遗传算法的适应度评估，在工作进程中运行一次完整回测
+    K线由主进程读取一次后放入共享内存，各工作进程不再各自查询MySQL或读取磁盘缓存；
+    相同参数组合的统计结果保存在适应度缓存中，之后的代次和再次运行优化时直接取用
+    """
+    statistics = cached_statistics(data_key, setting)
+    if statistics is None:
+        setting, statistics = _run_shared_setting(engine_factory, setting)
+        db = _fitness_db()
+        db.execute(
+            "INSERT OR REPLACE INTO fitness VALUES (?, ?)",
+            (_fitness_key(data_key, setting), pickle.dumps(statistics))
+        )
+        db.commit()
+    return setting, statistics.get(target_name, 0), statistics
+
+
+def _reset_strategy(engine, strategy_class, setting):
+    """
+    清空引擎上一次回测的委托、成交和逐日结果，换上新参数的策略并重新回测
+    引擎已加载的K线原样保留，不再调用load_data
+    """
+    engine.clear_data()
+    engine.strategy = None
+    engine.add_strategy(strategy_class, setting)
+    engine.run_backtesting()
+
+
+def run_optimization(target_name="sharpe_ratio", max_workers=None, param_space=None, ngen=30, final_backtest=True,
+                     show_chart=False):
     """
     执行参数优化
     
@@ -36,7 +491,18 @@ def run_optimization(target_name="sharpe_ratio"):
             - "sharpe_ratio": 夏普率 (默认)
             - "total_return": 总收益率
             - "calmar_ratio": 卡尔马比率
+        max_workers (int): 遗传算法并行进程数，默认为 default_workers()
+        param_space (dict): 参数搜索空间，默认为 PARAMETER_SPACE
+        ngen (int): 遗传算法最大代数
+        final_backtest (bool): 是否输出最优参数的回测结果并保存到文件；
+            为False时只运行遗传算法并返回按目标排序的结果列表
+        show_chart (bool): 是否显示最优参数的回测图表 (需要重新运行一次回测)
     """
+    if max_workers is None:
+        max_workers = default_workers()
+    if param_space is None:
+        param_space = PARAMETER_SPACE
+    
     # ================== 1. 定义时间段和基础参数 ==================
     print("📊 配置优化参数...")
     
@@ -57,20 +523,8 @@ def run_optimization(target_name="sharpe_ratio"):
     print(f"📅 回测时间: {start} 至 {end}")
     
     # ================== 2. 初始化回测引擎 ==================
-    engine = BacktestingEngine()
-    
-    # 设置回测参数
-    engine.set_parameters(
-        vt_symbol=vt_symbol,
-        interval=interval,
-        start=start,
-        end=end,
-        rate=0.0003,  # 手续费率：0.03%
-        slippage=0.5,  # 滑点：0.5 USD
-        size=1,        # 合约大小：1
-        pricetick=0.01, # 价格跳动：0.01 USD
-        capital=initial_capital
-    )
+    engine_factory = partial(_create_engine, vt_symbol, interval, start, end, initial_capital)
+    engine = engine_factory()
     
     # ================== 3. 设置优化参数 ==================
     print("\n🔧 设置优化参数...")
@@ -79,24 +533,14 @@ def run_optimization(target_name="sharpe_ratio"):
     setting = OptimizationSetting()
     
     # 设置优化参数范围（使用遗传算法时参数需要离散化）
-    setting.add_parameter("rsi_buy_level", 20, 40, 5)           # RSI买入阈值：20-40
-    setting.add_parameter("rsi_sell_level", 60, 80, 5)          # RSI卖出阈值：60-80
-    setting.add_parameter("stop_loss_pct", 0.02, 0.08, 0.01)    # 初始止损百分比：2%-8%
-    setting.add_parameter("trailing_stop_pct", 0.01, 0.05, 0.01) # 移动止损回撤百分比：1%-5%
-    setting.add_parameter("trailing_stop_activation_pct", 0.005, 0.02, 0.005) # 移动止损激活阈值：0.5%-2%
-    setting.add_parameter("slippage_tolerance_pct", 0.0005, 0.003, 0.0005)   # 滑点容忍百分比：0.05%-0.3%
-    setting.add_parameter("signal_num", 2, 3, 1)                # 信号数：2-3（提高最小值，确保多指标共振）
-    setting.add_parameter("fast_window", 5, 20, 5)              # 快速均线窗口：5-20
-    setting.add_parameter("slow_window", 20, 50, 5)             # 慢速均线窗口：20-50
-    # 【新增】ATR参数优化
-    setting.add_parameter("atr_length", 10, 20, 2)              # ATR计算周期：10-20
-    setting.add_parameter("atr_multiplier", 1.5, 3.5, 0.5)      # ATR倍数：1.5-3.5
-    # 【新增】ADX参数优化
-    setting.add_parameter("adx_length", 10, 20, 2)              # ADX计算周期：10-20
-    setting.add_parameter("adx_threshold", 15, 30, 5)           # ADX阈值：15-30
-    # 【新增】成交量参数优化
-    setting.add_parameter("volume_window", 10, 30, 5)           # 成交量窗口：10-30
-    setting.add_parameter("volume_multiplier", 1.0, 2.0, 0.2)   # 成交量倍数：1.0-2.0
+    for name, (start_value, end_value, step) in param_space.items():
+        if start_value == end_value:
+            setting.add_parameter(name, start_value)
+        else:
+            setting.add_parameter(name, start_value, end_value, step)
+    
+    # 优化过程中关闭策略日志，避免大量字符串格式化拖慢回测
+    setting.add_parameter("log_level", 0)
     
     # 设置优化目标
     target_description = {
@@ -115,25 +559,62 @@ def run_optimization(target_name="sharpe_ratio"):
     
     print(f"\n🧬 优化算法: 遗传算法")
     print(f"   - 种群大小: 自动设置")
-    print(f"   - 最大代数: 自动设置")
+    print(f"   - 最大代数: {ngen}")
     print(f"\n🎯 优化目标: 最大化{target_description.get(target_name, target_name)}")
-    print(f"💻 使用线程数: 4")
+    print(f"💻 使用进程数: {max_workers}")
     
     # ================== 4. 运行优化 ==================
     print("\n⚙️ 开始优化...")
-    engine.add_strategy(BtcTripleSignalStrategy1h, {})
     
-    # 使用VnPy内置的遗传算法优化
-    result = engine.run_ga_optimization(
-        setting,
-        output=True,
-        max_workers=4
+    if not check_optimization_setting(setting):
+        print("❌ 优化参数设置有误")
+        return
+    
+    # 在主进程中先编译指标内核并写入numba磁盘缓存，工作进程直接加载
+    warmup_kernels()
+    
+    # 在主进程中读取一次回测区间的K线 (Parquet缓存；未安装pyarrow时用joblib磁盘缓存，
+    # 再次运行时只查询K线数量和时间范围的指纹；joblib也未安装时直接查询数据库)，
+    # 放入共享内存供所有工作进程 (spawn启动) 读取
+    bars = load_parquet_bars(engine)
+    if bars is None:
+        bars = load_bar_data_cached(engine.symbol, engine.exchange, engine.interval, engine.start, engine.end)
+    shm, bar_count, tzinfo = publish_bars(bars)
+    # 主进程的引擎保留这份K线，之后需要重跑最优参数时直接使用，不再加载数据
+    engine.history_data = bars
+    
+    # 使用VnPy内置的遗传算法优化，适应度评估改为读取共享内存K线的回测
+    # 缓存键包含K线内容的哈希，数据库补齐或修正K线后旧的适应度缓存自动失效
+    bars_digest = hashlib.sha256(shm.buf[:bar_count * SHARED_BAR_DTYPE.itemsize]).hexdigest()
+    data_key = (
+        vt_symbol, interval.value, start, end, initial_capital, engine.rate, engine.slippage, engine.size, engine.pricetick,
+        bar_count, bars_digest
+    )
+    shared_engine_factory = partial(
+        _create_engine, vt_symbol, interval, start, end, initial_capital, (shm.name, bar_count, tzinfo)
     )
+    try:
+        result = run_ga_optimization(
+            partial(_ga_evaluate, target_name, shared_engine_factory, data_key),
+            setting,
+            get_target_value,
+            max_workers=max_workers,
+            ngen=ngen,
+            output=engine.output
+        )
+    finally:
+        shm.close()
+        shm.unlink()
+    for setting_, target_value, _ in result:
+        engine.output(f"参数：{setting_}, 目标：{target_value}")
     
     # ================== 5. 输出优化结果 ==================
     if not result:
         print("❌ 优化失败，未找到结果")
         return
+    
+    if not final_backtest:
+        return result
         
     # 输出最优参数组合
     print("\n" + "=" * 50)
@@ -159,37 +640,21 @@ def run_optimization(target_name="sharpe_ratio"):
         # 如果是单一值，直接打印
         print(f"{target_name}: {best_metric_value}")
     
-    # ================== 6. 使用最优参数回测 ==================
-    print("\n" + "=" * 50)
-    print("🔄 使用最优参数执行完整回测...")
-    print("=" * 50)
-    
-    # 创建新的回测引擎
-    best_engine = BacktestingEngine()
-    
-    # 设置回测参数
-    best_engine.set_parameters(
-        vt_symbol=vt_symbol,
-        interval=interval,
-        start=start,
-        end=end,
-        rate=0.0003,  # 手续费率：0.03%
-        slippage=0.5,  # 滑点：0.5 USD
-        size=1,        # 合约大小：1
-        pricetick=0.01, # 价格跳动：0.01 USD
-        capital=initial_capital
-    )
-    
-    # 添加策略
-    best_engine.add_strategy(BtcTripleSignalStrategy1h, best_setting)
-    
-    # 运行回测
-    best_engine.load_data()
-    best_engine.run_backtesting()
-    
-    # 计算结果
-    best_engine.calculate_result()
-    statistics = best_engine.calculate_statistics()
+    # ================== 6. 最优参数的回测结果 ==================
+    # 最优参数已在遗传算法中回测过，统计结果直接从适应度缓存读取；
+    # 只有显示图表需要逐日结果，此时才重新运行一次回测
+    statistics = cached_statistics(data_key, best_setting)
+    if statistics is None or show_chart:
+        print("\n" + "=" * 50)
+        print("🔄 使用最优参数执行完整回测...")
+        print("=" * 50)
+        
+        # 复用已加载K线的主进程引擎，只替换策略后重新回测
+        _reset_strategy(engine, BtcTripleSignalStrategy1h, best_setting)
+        
+        # 计算结果
+        engine.calculate_result()
+        statistics = engine.calculate_statistics(output=False)
     
     # 输出统计结果
     print("\n" + "=" * 50)
@@ -200,7 +665,8 @@ def run_optimization(target_name="sharpe_ratio"):
         print(f"{key}: {value}")
         
     # 显示图表
-    best_engine.show_chart()
+    if show_chart:
+        engine.show_chart()
     
     # 保存最优参数到文件
     file_name = f"best_params_{target_name}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
@@ -236,7 +702,40 @@ def run_optimization(target_name="sharpe_ratio"):
     return result, best_setting, statistics
 
 
-def run_all_optimizations():
+def coarse_to_fine(target_name="sharpe_ratio", k=10, max_workers=None, coarse_ngen=5, show_chart=False):
+    """
+    两阶段参数优化：先在放大步长的粗网格上运行几代遗传算法，
+    再在前k个参数组合±2个原步长的范围内按原步长细搜索，并用最优参数执行完整回测
+    
+    搜索空间的体积按每个维度的取值数相乘，两阶段的空间都远小于原搜索空间
+    """
+    print("\n" + "=" * 60)
+    print(f"🔍 第一阶段: 粗网格搜索 ({coarse_ngen}代)")
+    print("=" * 60)
+    coarse_result = run_optimization(
+        target_name,
+        max_workers,
+        param_space=coarse_space(PARAMETER_SPACE),
+        ngen=coarse_ngen,
+        final_backtest=False
+    )
+    if not coarse_result:
+        return
+    
+    top_settings = [setting for setting, _, _ in coarse_result[:k]]
+    
+    print("\n" + "=" * 60)
+    print(f"🔬 第二阶段: 在前{len(top_settings)}个参数组合附近细搜索")
+    print("=" * 60)
+    return run_optimization(
+        target_name,
+        max_workers,
+        param_space=fine_space(PARAMETER_SPACE, top_settings),
+        show_chart=show_chart
+    )
+
+
+def run_all_optimizations(max_workers=None, show_chart=False):
     """运行所有三种优化目标的优化，使用遗传算法"""
     targets = [
         "sharpe_ratio",   # 夏普率
@@ -252,7 +751,7 @@ def run_all_optimizations():
         print("=" * 60)
         
         try:
-            result, best_setting, statistics = run_optimization(target)
+            result, best_setting, statistics = run_optimization(target, max_workers, show_chart=show_chart)
             results[target] = {
                 "best_setting": best_setting,
                 "statistics": statistics
@@ -269,18 +768,33 @@ def run_all_optimizations():
     print("📊 三种优化目标结果比较")
     print("=" * 60)
     
-    print(f"{'优化目标':<15} {'总收益率':<15} {'夏普率':<15} {'卡尔马比率':<15} {'最大回撤':<15}")
-    print("-" * 75)
-    
-    for target, data in results.items():
-        stats = data["statistics"]
-        if stats:
-            try:
-                print(f"{target:<15} {stats.get('total_return', 'N/A'):<15.2%} {stats.get('sharpe_ratio', 'N/A'):<15.2f} {stats.get('calmar_ratio', 'N/A'):<15.2f} {stats.get('max_drawdown', 'N/A'):<15.2%}")
-            except (TypeError, ValueError):
-                print(f"{target:<15} {'N/A':<15} {'N/A':<15} {'N/A':<15} {'N/A':<15}")
-        else:
-            print(f"{target:<15} {'N/A':<15} {'N/A':<15} {'N/A':<15} {'N/A':<15}")
+    import pandas as pd
+    
+    # 每个优化目标一行；优化失败的目标整行为NaN，统一显示为N/A
+    columns = ["total_return", "sharpe_ratio", "calmar_ratio", "max_ddpercent"]
+    summary = pd.DataFrame(
+        {target: data["statistics"] or {} for target, data in results.items()}
+    ).T.reindex(columns=columns).apply(pd.to_numeric, errors="coerce")
+    
+    # vnpy统计结果中的收益率和回撤已是百分数
+    percent = "{:.2f}%".format
+    ratio = "{:.2f}".format
+    print(summary.rename(columns={
+        "total_return": "总收益率",
+        "sharpe_ratio": "夏普率",
+        "calmar_ratio": "卡尔马比率",
+        "max_ddpercent": "最大回撤",
+    }).rename_axis("优化目标").to_string(formatters={
+        "总收益率": percent,
+        "夏普率": ratio,
+        "卡尔马比率": ratio,
+        "最大回撤": percent,
+    }, na_rep="N/A"))
+    
+    # 保存比较结果，便于跨版本追踪优化效果
+    file_name = f"optimization_summary_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    summary.to_csv(file_name, index_label="target")
+    print(f"\n💾 比较结果已保存到文件: {file_name}")
     
     return results
 
@@ -358,7 +872,7 @@ def run_direct_backtest():
     print("\n⚙️ 开始回测...")
     
     # 加载数据
-    engine.load_data()
+    load_engine_data(engine)
     
     # 运行回测
     engine.run_backtesting()
@@ -421,11 +935,32 @@ if __name__ == "__main__":
         help="操作模式: direct(直接回测), sharpe_ratio(夏普率遗传算法优化), total_return(总收益率遗传算法优化), calmar_ratio(卡尔马比率遗传算法优化), all(全部优化)"
     )
     
+    parser.add_argument(
+        "--coarse-to-fine",
+        action="store_true",
+        help="使用两阶段优化：先粗网格搜索，再在前10个参数组合附近细搜索"
+    )
+    
+    parser.add_argument(
+        "--show-chart",
+        action="store_true",
+        help="显示最优参数的回测图表 (需要用最优参数重新运行一次回测)"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="遗传算法并行进程数，默认为物理核心数减一"
+    )
+    
     args = parser.parse_args()
     
     if args.target == "direct":
         run_direct_backtest()
     elif args.target == "all":
-        run_all_optimizations()
+        run_all_optimizations(args.workers, args.show_chart)
+    elif args.coarse_to_fine:
+        coarse_to_fine(args.target, max_workers=args.workers, show_chart=args.show_chart)
     else:
-        run_optimization(args.target) 
\ No newline at end of file
+        run_optimization(args.target, args.workers, show_chart=args.show_chart) 
\ No newline at end of file
@@ -0,0 +1,14 @@
+"""
+编译策略的Cython内核 (可选)
+
+    pip install cython
+    python setup.py build_ext --inplace
+"""
+
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="btc_strategy_kernels",
+    ext_modules=cythonize("_strategy_kernels.pyx", language_level=3),
+)
@@ -0,0 +1,207 @@
+"""
+_indicator_kernels 的回归测试
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _indicator_kernels import (
+    OUTPUT_FIELDS,
+    decide,
+    indicator_series,
+    leverage_curve_stats,
+    make_params,
+    make_step_kernel,
+    step,
+    warmup_state,
+)
+
+# 与策略默认参数相同的指标周期
+PARAMS = make_params(10, 20, 14, 12, 26, 9, 14, 3, 3, 14, 14, 20)
+# 比较的起始下标：EMA/Wilder平均的初值差异在此之前已衰减到可忽略
+WARMUP = 300
+
+
+def reference_stats(net_pnl, capital, leverage):
+    """按vnpy calculate_statistics的口径用数组运算计算同样的统计量"""
+    balance = capital + leverage * np.cumsum(net_pnl)
+    highlevel = np.maximum.accumulate(balance)
+    ddpercent = (balance - highlevel) / highlevel * 100.0
+    pre_balance = np.concatenate(([capital], balance[:-1]))
+    returns = np.log(balance / pre_balance)
+    return (
+        (balance[-1] / capital - 1.0) * 100.0,
+        ddpercent.min(),
+        returns.mean() * 100.0,
+        returns.std(ddof=1) * 100.0,
+    )
+
+
+@pytest.mark.parametrize("leverage", [1.0, 2.5])
+def test_first_day_loss_drawdown(leverage):
+    """第一天即亏损时，高水位应从第一天的资金开始而不是初始资金"""
+    net_pnl = np.array([-5000.0, 1000.0, -3000.0, 4000.0, -2000.0, 500.0])
+    capital = 100000.0
+
+    positive, *stats = leverage_curve_stats(net_pnl, capital, leverage)
+
+    assert positive
+    np.testing.assert_allclose(stats, reference_stats(net_pnl, capital, leverage), rtol=1e-9)
+
+
+def test_random_curve_matches_reference():
+    rng = np.random.default_rng(0)
+    net_pnl = rng.normal(50.0, 800.0, 500)
+    capital = 100000.0
+
+    positive, *stats = leverage_curve_stats(net_pnl, capital, 3.0)
+
+    assert positive
+    np.testing.assert_allclose(stats, reference_stats(net_pnl, capital, 3.0), rtol=1e-9)
+
+
+def test_readonly_net_pnl():
+    """pandas写时复制下to_numpy()返回只读数组，内核签名须能接受"""
+    net_pnl = np.random.default_rng(1).normal(50.0, 800.0, 100)
+    readonly = net_pnl.copy()
+    readonly.setflags(write=False)
+
+    positive, *stats = leverage_curve_stats(readonly, 100000.0, 2.0)
+
+    assert positive
+    np.testing.assert_allclose(stats, reference_stats(net_pnl, 100000.0, 2.0), rtol=1e-9)
+
+
+def test_leverage_statistics_from_series():
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("vnpy")
+    from run_backtest_leverage_minutes import leverage_statistics
+
+    net_pnl = pd.Series(np.random.default_rng(2).normal(50.0, 800.0, 100))
+
+    stats = leverage_statistics(net_pnl.to_numpy(np.float64), 100000.0, 2.0)
+
+    expected = reference_stats(net_pnl.to_numpy(), 100000.0, 2.0)
+    np.testing.assert_allclose(
+        [stats["total_return"], stats["max_ddpercent"]], expected[:2], rtol=1e-9
+    )
+
+
+def test_blown_account():
+    net_pnl = np.array([1000.0, -60000.0, 2000.0])
+
+    positive, *stats = leverage_curve_stats(net_pnl, 100000.0, 2.0)
+
+    assert not positive
+    assert stats == [0.0, 0.0, 0.0, 0.0]
+
+
+def random_bars(n=600, seed=1):
+    """生成随机游走的OHLCV数组"""
+    rng = np.random.default_rng(seed)
+    close = 30000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.01, n)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    high = np.maximum(open_, close) * (1.0 + rng.uniform(0.0, 0.005, n))
+    low = np.minimum(open_, close) * (1.0 - rng.uniform(0.0, 0.005, n))
+    volume = rng.uniform(10.0, 1000.0, n)
+    return open_, high, low, close, volume
+
+
+def talib_reference(close, high, low, volume):
+    """用TA-Lib按策略原先ArrayManager的调用方式计算同样的指标，列顺序见 OUTPUT_FIELDS"""
+    talib = pytest.importorskip("talib")
+    fast, slow, rsi_n, macd_fast, macd_slow, macd_signal, k_n, slowing, d_n, atr_n, adx_n, volume_n = (
+        int(p) for p in PARAMS
+    )
+    _, _, hist = talib.MACD(close, macd_fast, macd_slow, macd_signal)
+    k, d = talib.STOCH(high, low, close, k_n, slowing, 0, d_n, 0)
+    return np.column_stack([
+        talib.SMA(close, fast),
+        talib.SMA(close, slow),
+        talib.RSI(close, rsi_n),
+        hist,
+        k,
+        d,
+        talib.ATR(high, low, close, atr_n),
+        talib.ADX(high, low, close, adx_n),
+        talib.SMA(volume, volume_n),
+    ])
+
+
+def test_indicator_series_matches_talib():
+    _, high, low, close, volume = random_bars()
+
+    series = indicator_series(close, high, low, volume, PARAMS)
+    expected = talib_reference(close, high, low, volume)
+
+    for j, name in enumerate(OUTPUT_FIELDS):
+        np.testing.assert_allclose(
+            series[WARMUP:, j], expected[WARMUP:, j], rtol=1e-7, atol=1e-8, err_msg=name
+        )
+
+
+def test_warmup_then_step_matches_series():
+    """warmup_state播种后逐根step的结果应与整段indicator_series一致"""
+    _, high, low, close, volume = random_bars()
+    series = indicator_series(close, high, low, volume, PARAMS)
+
+    state = warmup_state(close[:WARMUP], high[:WARMUP], low[:WARMUP], volume[:WARMUP], PARAMS)
+    for i in range(WARMUP, len(close)):
+        values = step(state, close[i], high[i], low[i], volume[i])
+        np.testing.assert_allclose(values, series[i], rtol=1e-9, atol=1e-9)
+
+
+def test_cython_step_indicators_matches_python():
+    cy = pytest.importorskip("_strategy_kernels")
+    _, high, low, close, volume = random_bars()
+
+    py_state = warmup_state(close[:50], high[:50], low[:50], volume[:50], PARAMS)
+    cy_state = py_state.copy()
+    for i in range(50, len(close)):
+        expected = step(py_state, close[i], high[i], low[i], volume[i])
+        values = cy.step_indicators(close[i], high[i], low[i], volume[i], cy_state)
+        np.testing.assert_allclose(values, expected, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(cy_state, py_state, rtol=1e-9, atol=1e-9)
+
+
+def test_cython_step_signals_matches_python():
+    cy = pytest.importorskip("_strategy_kernels")
+    _, high, low, close, volume = random_bars()
+    py_kernel = make_step_kernel(30.0, 70.0)
+    cy_kernel = cy.StepSignals(30.0, 70.0)
+
+    py_state = warmup_state(close[:50], high[:50], low[:50], volume[:50], PARAMS)
+    cy_state = py_state.copy()
+    for i in range(50, len(close)):
+        expected = py_kernel(py_state, close[i], high[i], low[i], volume[i])
+        values = cy_kernel(cy_state, close[i], high[i], low[i], volume[i])
+        np.testing.assert_allclose(values[:6], expected[:6], rtol=1e-9, atol=1e-9)
+        assert tuple(values[6:]) == tuple(expected[6:])
+
+
+def test_cython_decide_matches_python():
+    cy = pytest.importorskip("_strategy_kernels")
+    rng = np.random.default_rng(2)
+
+    for _ in range(5000):
+        args = (
+            rng.uniform(0.0, 100.0),               # rsi
+            rng.normal(0.0, 1.0),                  # macd
+            rng.uniform(0.0, 100.0),               # k
+            rng.uniform(0.0, 100.0),               # d
+            bool(rng.integers(2)),                 # sc
+            int(rng.integers(-1, 2)),              # trend
+            int(rng.integers(1, 4)),               # signal_num
+            rng.uniform(0.0, 2.0),                 # vol_ma_x_mult
+            rng.uniform(0.0, 2.0),                 # bar_vol
+            30.0,
+            70.0,
+        )
+        assert cy.decide(*args) == decide(*args), args
@@ -0,0 +1,152 @@
+"""
+向量化回测与vnpy引擎逐根回放的一致性测试
+
+在合成K线上用BacktestingEngine逐根回放策略，把成交列表折算为逐K线权益，
+与向量化内核给出的逐K线权益和成交次数对比
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("vnpy_ctastrategy")
+
+from vnpy.trader.constant import Direction, Exchange, Interval
+from vnpy.trader.object import BarData
+from vnpy_ctastrategy.backtesting import BacktestingEngine
+
+import btc_triple_signal_strategy_1h
+from btc_triple_signal_strategy_1h import BtcTripleSignalStrategy1h
+from btc_triple_signal_strategy_min import BtcTripleSignalStrategyMin
+
+CAPITAL = 100000
+RATE = 0.0003
+SLIPPAGE = 0.5
+SIZE = 1
+PRICETICK = 0.01
+
+
+def synthetic_ohlcv(n: int, seed: int) -> np.ndarray:
+    """
+    生成形状为 (5, N) 的随机游走OHLCV数组
+
+    价格为0.25的整数倍、成交量为整数，float32也能精确表示 (策略的数组管理器以float32存储)；
+    每根K线以上一根的收盘价开盘，以收盘价挂出的限价单必定在下一根K线以该价格成交
+    """
+    rng = np.random.default_rng(seed)
+    close = 30000.0 + 0.25 * np.cumsum(rng.integers(-200, 201, n))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    high = np.maximum(open_, close) + 0.25 * rng.integers(0, 80, n)
+    low = np.minimum(open_, close) - 0.25 * rng.integers(0, 80, n)
+    volume = rng.integers(10, 1000, n).astype(np.float64)
+    return np.array([open_, high, low, close, volume])
+
+
+def replay(strategy_class, ohlcv: np.ndarray, interval: Interval, setting: dict):
+    """
+    用vnpy回测引擎逐根回放策略，返回 (按成交列表折算的逐K线权益, 成交次数)
+    """
+    first = datetime(2024, 1, 1)
+    delta = timedelta(hours=1) if interval == Interval.HOUR else timedelta(minutes=1)
+    bars = [
+        BarData(
+            symbol="btcusdt",
+            exchange=Exchange.SMART,
+            datetime=first + i * delta,
+            interval=interval,
+            open_price=open_price,
+            high_price=high_price,
+            low_price=low_price,
+            close_price=close_price,
+            volume=volume,
+            gateway_name="BACKTESTING",
+        )
+        for i, (open_price, high_price, low_price, close_price, volume) in enumerate(ohlcv.T.tolist())
+    ]
+
+    engine = BacktestingEngine()
+    engine.set_parameters(
+        vt_symbol="btcusdt.SMART",
+        interval=interval,
+        start=bars[0].datetime,
+        end=bars[-1].datetime,
+        rate=RATE,
+        slippage=SLIPPAGE,
+        size=SIZE,
+        pricetick=PRICETICK,
+        capital=CAPITAL,
+    )
+    engine.add_strategy(strategy_class, setting)
+    engine.history_data = bars
+    # 合成K线之前没有预热历史，全部K线都经过on_bar
+    engine.load_bar = lambda *args, **kwargs: []
+    engine.run_backtesting()
+
+    trades = {}
+    for trade in engine.trades.values():
+        trades.setdefault(trade.datetime, []).append(trade)
+
+    cash = float(CAPITAL)
+    pos = 0.0
+    equity = np.empty(len(bars))
+    for i, bar in enumerate(bars):
+        for trade in trades.get(bar.datetime, ()):
+            sign = 1 if trade.direction == Direction.LONG else -1
+            turnover = trade.price * trade.volume * SIZE
+            cash -= sign * turnover + turnover * RATE + trade.volume * SIZE * SLIPPAGE
+            pos += sign * trade.volume
+        equity[i] = cash + pos * bar.close_price * SIZE
+    return equity, len(engine.trades)
+
+
+def test_grid_equity_matches_replay(monkeypatch):
+    ohlcv = synthetic_ohlcv(1500, seed=3)
+    settings = [
+        {"rsi_buy_level": 20, "stop_loss_pct": 0.03},
+        {"rsi_buy_level": 30, "stop_loss_pct": 0.05},
+        {"rsi_buy_level": 40, "stop_loss_pct": 0.08},
+    ]
+    # 回放时策略不从数据库读取预热历史
+    monkeypatch.setattr(
+        btc_triple_signal_strategy_1h, "_load_history_arrays",
+        lambda *args: np.empty((5, 0), dtype=np.float32)
+    )
+
+    equity, trade_count = BtcTripleSignalStrategy1h.grid_equity(
+        ohlcv, settings, CAPITAL, RATE, SLIPPAGE, SIZE, PRICETICK
+    )
+
+    assert trade_count.sum() > 0
+    for j, setting in enumerate(settings):
+        expected, expected_count = replay(
+            BtcTripleSignalStrategy1h, ohlcv, Interval.HOUR, {"log_level": 0, **setting}
+        )
+        assert trade_count[j] == expected_count, setting
+        np.testing.assert_allclose(equity[:, j], expected, rtol=1e-9, atol=1e-6, err_msg=str(setting))
+
+
+@pytest.mark.parametrize("setting", [
+    {"rsi_buy_level": 20, "stop_loss_pct": 0.03},
+    {"rsi_buy_level": 35, "stop_loss_pct": 0.06},
+    {"rsi_buy_level": 30, "stop_loss_pct": 0.01, "k_period": 20},
+])
+def test_signal_equity_matches_replay(setting):
+    ohlcv = synthetic_ohlcv(1500, seed=4)
+    timestamps = datetime(2024, 1, 1).timestamp() + 60.0 * np.arange(ohlcv.shape[1])
+    bars = np.column_stack((timestamps, ohlcv.T))
+
+    curve, trade_count, _ = BtcTripleSignalStrategyMin.equity_curve(
+        bars, setting, CAPITAL, RATE, SLIPPAGE, SIZE, PRICETICK
+    )
+    expected, expected_count = replay(BtcTripleSignalStrategyMin, ohlcv, Interval.MINUTE, setting)
+
+    assert trade_count > 0
+    assert trade_count == expected_count
+    np.testing.assert_allclose(curve, expected, rtol=1e-9, atol=1e-6)
@@ -10,14 +10,19 @@ VNPy格式的币安数据下载脚本
 创建时间: 2025-07
 """
 
+import asyncio
 import datetime
 import time
 import sys
 import os
 import traceback
+import tempfile
+from contextlib import closing
 import mysql.connector
-from mysql.connector import Error
-import requests
+from mysql.connector import Error, pooling
+import aiohttp
+import numpy as np
+import orjson
 from typing import List, Dict, Any, Optional
 
 # 币安API基本配置
@@ -36,21 +41,56 @@ headers = {
     "X-MBX-APIKEY": API_KEY
 }
 
+# vnpy数据库的连接池，首次取连接时创建 (此时数据库已由create_database_and_table建好)
+_db_pool = None
+
+def get_db_connection():
+    """
+    从连接池借出一个vnpy数据库连接，close()即归还连接池而不断开
+    """
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = pooling.MySQLConnectionPool(
+            pool_name="vnpy_downloader",
+            pool_size=4,
+            host="localhost",
+            user="root",
+            password="",
+            database="vnpy",
+            use_pure=False,  # 使用C扩展驱动
+            autocommit=False,
+            allow_local_infile=True  # 允许LOAD DATA LOCAL INFILE批量导入
+        )
+    return _db_pool.get_connection()
+
 def create_database_and_table():
     """
     创建与vnpy兼容的数据库和表
     """
     try:
-        # 连接到MySQL服务器
+        # 连接到MySQL服务器 (数据库可能尚不存在，因此不经过连接池)
         connection = mysql.connector.connect(
             host="localhost",
             user="root",
-            password=""
+            password="",
+            use_pure=False
         )
         
         if connection.is_connected():
             cursor = connection.cursor()
             
+            # 表和唯一索引都已存在时 (常见情况) 只需这一次查询，跳过下面的建库建表和索引迁移
+            cursor.execute("""
+                SELECT 1 FROM information_schema.statistics
+                WHERE table_schema = 'vnpy' AND table_name = 'dbbardata' AND index_name = 'uq_sedi'
+                LIMIT 1
+            """)
+            if cursor.fetchone():
+                print("✅ 数据库vnpy和表dbbardata已存在")
+                cursor.close()
+                connection.close()
+                return True
+            
             # 创建数据库（如果不存在）- 注意：使用vnpy名称
             cursor.execute("CREATE DATABASE IF NOT EXISTS vnpy")
             print("✅ 数据库vnpy创建成功或已存在")
@@ -74,12 +114,30 @@ def create_database_and_table():
                     open_interest DOUBLE NOT NULL DEFAULT 0,
                     turnover DOUBLE NOT NULL DEFAULT 0,
                     gateway_name VARCHAR(255) NOT NULL DEFAULT 'BINANCE',
-                    INDEX idx_symbol_exchange_interval_datetime (symbol, exchange, `interval`, datetime)
+                    UNIQUE KEY uq_sedi (symbol, exchange, `interval`, datetime)
                 )
             """)
             connection.commit()
             print("✅ 表dbbardata创建成功或已存在")
             
+            # 旧版本建的表只有非唯一索引，在此迁移为唯一索引，使重复下载的K线被数据库跳过
+            cursor.execute("""
+                SELECT DISTINCT index_name FROM information_schema.statistics
+                WHERE table_schema = 'vnpy' AND table_name = 'dbbardata'
+            """)
+            index_names = {row[0] for row in cursor.fetchall()}
+            if "uq_sedi" not in index_names:
+                try:
+                    cursor.execute(
+                        "ALTER TABLE dbbardata ADD UNIQUE KEY uq_sedi (symbol, exchange, `interval`, datetime)"
+                    )
+                    print("✅ 已为dbbardata添加唯一索引uq_sedi")
+                except Error as e:
+                    print(f"⚠️ 添加唯一索引失败(表中可能已有重复K线，请先去重): {e}")
+                    index_names.discard("idx_symbol_exchange_interval_datetime")
+            if "idx_symbol_exchange_interval_datetime" in index_names:
+                cursor.execute("ALTER TABLE dbbardata DROP INDEX idx_symbol_exchange_interval_datetime")
+            
             cursor.close()
             connection.close()
             return True
@@ -88,64 +146,130 @@ def create_database_and_table():
         print(f"❌ 数据库操作失败: {e}")
         return False
 
-def save_klines_to_db(symbol, interval, klines):
+# dbbardata的导入列顺序
+BAR_COLUMNS = (
+    "symbol, exchange, datetime, `interval`, volume, open_price, high_price, "
+    "low_price, close_price, open_interest, turnover, gateway_name"
+)
+
+# 一批K线的结构化数组 (每列连续存放)，datetime为本地时间的开盘时间
+KLINE_DTYPE = np.dtype([
+    ("datetime", "M8[s]"),
+    ("volume", "f8"),
+    ("open_price", "f8"),
+    ("high_price", "f8"),
+    ("low_price", "f8"),
+    ("close_price", "f8"),
+    ("turnover", "f8"),
+])
+
+# 首尾UTC偏移相同即可视为整批同一偏移的最大时间跨度 (秒)
+SINGLE_OFFSET_MAX_SPAN = 86400
+
+def kline_records(klines):
+    """
+    将币安K线列表转为KLINE_DTYPE结构化数组
+    
+    币安K线字段: [开盘时间, 开, 高, 低, 收, 成交量, 收盘时间, 成交额, ...]，价格和数量为字符串，
+    各列整体转换，不逐行调用float()和datetime.fromtimestamp()
+    """
+    columns = np.asarray(klines, dtype=object)
+    open_ts = columns[:, 0].astype(np.int64) // 1000
+    
+    records = np.empty(len(columns), dtype=KLINE_DTYPE)
+    
+    # 开盘时间转换为本地时间 (与datetime.fromtimestamp一致)；
+    # 跨度不足一天的批次中间不可能出现两次夏令时切换，首尾UTC偏移相同即可整列平移，
+    # 其余批次 (如1000根4h/1d K线可跨越整个夏令时区间) 逐行计算偏移
+    first_offset = time.localtime(int(open_ts[0])).tm_gmtoff
+    if (
+        open_ts[-1] - open_ts[0] < SINGLE_OFFSET_MAX_SPAN
+        and first_offset == time.localtime(int(open_ts[-1])).tm_gmtoff
+    ):
+        offsets = first_offset
+    else:
+        offsets = np.array([time.localtime(ts).tm_gmtoff for ts in open_ts.tolist()], dtype=np.int64)
+    records["datetime"] = (open_ts + offsets).astype("M8[s]")
+    
+    numeric = columns[:, [5, 1, 2, 3, 4, 7]].astype(np.float64)
+    for i, name in enumerate(KLINE_DTYPE.names[1:]):
+        records[name] = numeric[:, i]
+    return records
+
+def load_records_infile(cursor, symbol, interval, records):
+    """
+    将K线结构化数组写成制表符分隔的临时文件，通过LOAD DATA LOCAL INFILE一次导入，
+    与唯一索引uq_sedi重复的K线直接跳过
+    
+    mysql-connector只能从文件路径读取LOCAL INFILE数据，因此使用临时文件而非内存缓冲区；
+    需要MySQL服务器开启local_infile=1
+    """
+    datetimes = np.char.replace(np.datetime_as_string(records["datetime"], unit="s"), "T", " ")
+    prefix = f"{symbol}\tSMART\t"
+    
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".tsv", newline="\n", delete=False
+    ) as f:
+        f.writelines(
+            f"{prefix}{dt}\t{interval}\t{volume!r}\t{open_price!r}\t{high_price!r}\t"
+            f"{low_price!r}\t{close_price!r}\t0.0\t{turnover!r}\tBINANCE\n"
+            for dt, volume, open_price, high_price, low_price, close_price, turnover in zip(
+                datetimes.tolist(), *(records[name].tolist() for name in KLINE_DTYPE.names[1:])
+            )
+        )
+    
+    try:
+        cursor.execute(
+            f"""
+                LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE dbbardata
+                FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n'
+                ({BAR_COLUMNS})
+            """,
+            (f.name,)
+        )
+    finally:
+        os.remove(f.name)
+
+def save_klines_to_db(symbol, interval, klines, connection=None):
     """
     将K线数据保存到数据库的dbbardata表中
+    
+    传入connection时使用该连接且不提交，由调用方在整段下载结束后统一commit；
+    否则从连接池借用连接并立即提交
     """
     if not klines:
         print("❌ 没有数据需要保存")
         return False
         
     try:
-        # 连接到MySQL数据库
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="vnpy"
-        )
+        if connection is None:
+            with closing(get_db_connection()) as conn:
+                result = save_klines_to_db(symbol, interval, klines, conn)
+                conn.commit()
+                return result
         
-        if connection.is_connected():
-            cursor = connection.cursor()
-            
-            # 准备插入语句 - 适配vnpy的dbbardata表结构
-            insert_query = """
-                INSERT INTO dbbardata 
-                (symbol, exchange, datetime, `interval`, volume, open_price, high_price, 
-                low_price, close_price, open_interest, turnover, gateway_name)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            # 准备批量插入的数据
-            records = []
-            for kline in klines:
-                open_time = datetime.datetime.fromtimestamp(kline[0] / 1000)
-                
-                record = (
-                    symbol.lower(),            # 小写符号，如btcusdt
-                    "SMART",                  # 使用vnpy支持的SMART交易所
-                    open_time,                # 开盘时间
-                    interval,                 # 时间周期
-                    float(kline[5]),          # volume
-                    float(kline[1]),          # open_price
-                    float(kline[2]),          # high_price
-                    float(kline[3]),          # low_price
-                    float(kline[4]),          # close_price
-                    0.0,                      # open_interest (默认为0)
-                    float(kline[7]),          # turnover (交易额)
-                    "BINANCE"                 # gateway_name
-                )
-                records.append(record)
-            
-            # 批量插入数据
-            cursor.executemany(insert_query, records)
-            connection.commit()
-            
-            print(f"✅ 成功保存 {len(records)} 条K线数据到数据库")
-            
-            cursor.close()
-            connection.close()
-            return True
+        # 准备批量导入的数据 - 适配vnpy的dbbardata表结构
+        records = kline_records(klines)
+        symbol = symbol.lower()  # 小写符号，如btcusdt
+        
+        with closing(connection.cursor()) as cursor:
+            try:
+                load_records_infile(cursor, symbol, interval, records)
+            except Error as e:
+                # 服务器未开启local_infile时退回到executemany插入，只在这里转换为Python元组
+                print(f"⚠️ LOAD DATA LOCAL INFILE不可用，改用INSERT: {e}")
+                insert_query = f"""
+                    INSERT IGNORE INTO dbbardata ({BAR_COLUMNS})
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """
+                cursor.executemany(insert_query, [
+                    (symbol, "SMART", dt, interval, volume, open_price, high_price,
+                     low_price, close_price, 0.0, turnover, "BINANCE")
+                    for dt, volume, open_price, high_price, low_price, close_price, turnover in records.tolist()
+                ])
+        
+        print(f"✅ 成功保存 {len(records)} 条K线数据到数据库")
+        return True
             
     except Error as e:
         print(f"❌ 数据库保存失败: {e}")
@@ -157,15 +281,9 @@ def check_existing_data(symbol, interval):
     检查数据库中是否已存在指定的数据
     """
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="vnpy"
-        )
-        
-        if connection.is_connected():
-            cursor = connection.cursor()
+        with closing(get_db_connection()) as connection:
+            # MIN/MAX/COUNT只返回一行，使用缓冲游标
+            cursor = connection.cursor(buffered=True)
             
             # 查询数据库中已有的数据范围 - 适用于dbbardata表
             query = """
@@ -186,63 +304,109 @@ def check_existing_data(symbol, interval):
                 print(f"📅 数据范围: {min_date.strftime('%Y-%m-%d %H:%M:%S')} 至 {max_date.strftime('%Y-%m-%d %H:%M:%S')}")
                 
                 cursor.close()
-                connection.close()
                 return min_date, max_date, count
             
             cursor.close()
-            connection.close()
             
     except Error as e:
         print(f"❌ 检查数据失败: {e}")
     
     return None, None, 0
 
-def get_klines(symbol, interval, start_time=None, end_time=None, limit=1000):
+class DownloadError(RuntimeError):
+    """部分批次在重试后仍下载失败，本次下载的数据不应提交"""
+
+
+# 各K线周期单位对应的毫秒数，用于预先划分每批1000根K线的时间范围
+INTERVAL_UNIT_MS = {
+    "m": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "d": 24 * 60 * 60 * 1000,
+    "w": 7 * 24 * 60 * 60 * 1000
+}
+
+# 并发请求数上限，以及触发退避的1分钟已用权重 (币安限额为1200/分钟)
+MAX_CONCURRENT_REQUESTS = 8
+WEIGHT_BACKOFF_THRESHOLD = 1000
+# 已用权重每超出阈值多少，请求后多等待1秒 (权重用满1200时等待10秒)
+WEIGHT_PER_BACKOFF_SECOND = 20
+
+# 全部批次下载完后，对失败批次重新下载的轮数及每轮前的等待时间 (秒)
+FAILED_BATCH_RETRY_ROUNDS = 2
+FAILED_BATCH_RETRY_DELAY_SECS = 10
+
+def interval_to_ms(interval):
     """
-    从币安API获取K线数据
+    将币安K线周期 (如 '1m'、'4h'、'1d') 转换为毫秒数
+    """
+    unit = interval[-1]
+    if unit not in INTERVAL_UNIT_MS:
+        raise ValueError(f"不支持的K线周期: {interval}")
+    return int(interval[:-1]) * INTERVAL_UNIT_MS[unit]
+
+async def fetch_klines(session, semaphore, symbol, interval, start_time, end_time, limit=1000, retries=3):
+    """
+    异步获取一批K线数据，在并发信号量内发出请求
+    
+    按响应头X-MBX-USED-WEIGHT-1M限速：已用权重低于阈值时不等待，超过后按超出量成比例等待再释放信号量，
+    只在接近限额时放慢；遇到429/418限流时按Retry-After等待后重试
     
-    参数:
-        symbol: 交易对，如 'BTCUSDT'
-        interval: K线间隔，如 '1h'
-        start_time: 开始时间戳（毫秒）
-        end_time: 结束时间戳（毫秒）
-        limit: 每次请求的K线数量，最大1000
-        
     返回:
-        K线数据列表
+        K线数据列表 (该时间段没有K线时为空列表)，重试后仍失败时返回None
     """
     params = {
         'symbol': symbol,
         'interval': interval,
+        'startTime': start_time,
+        'endTime': end_time,
         'limit': limit
     }
     
-    if start_time:
-        params['startTime'] = start_time
-    if end_time:
-        params['endTime'] = end_time
+    for attempt in range(retries + 1):
+        async with semaphore:
+            try:
+                async with session.get(
+                    f"{BASE_URL}/api/v3/klines",
+                    params=params,
+                    proxy=proxies.get("https")
+                ) as response:
+                    used_weight = int(response.headers.get("X-MBX-USED-WEIGHT-1M", 0))
+                    
+                    if response.status == 200:
+                        klines = orjson.loads(await response.read())
+                        delay = max(0, (used_weight - WEIGHT_BACKOFF_THRESHOLD) / WEIGHT_PER_BACKOFF_SECOND)
+                        if delay:
+                            print(f"⏳ 已用权重 {used_weight}，等待 {delay:.1f} 秒...")
+                            await asyncio.sleep(delay)
+                        return klines
+                    
+                    print(f"❌ 获取K线数据失败: {response.status} {await response.text()}")
+                    if response.status in (418, 429):
+                        await asyncio.sleep(int(response.headers.get("Retry-After", 60)))
+                    else:
+                        await asyncio.sleep(2 ** attempt)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"❌ 请求出错: {e}")
+                await asyncio.sleep(2 ** attempt)
     
-    try:
-        response = requests.get(f"{BASE_URL}/api/v3/klines", params=params, headers=headers, proxies=proxies, timeout=10)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"❌ 获取K线数据失败: {response.status_code} {response.text}")
-            return []
-    except Exception as e:
-        print(f"❌ 请求出错: {e}")
-        return []
+    return None
 
-def download_historical_data(symbol, interval, start_date, end_date):
+async def download_historical_data_async(symbol, interval, start_date, end_date, connection=None):
     """
-    下载指定时间范围内的历史数据
+    并发下载指定时间范围内的历史数据
+    
+    预先按每批1000根K线划分时间范围，各批在同一个aiohttp会话中并发请求，
+    每批返回后即写入数据库。各批完成顺序不定，失败的批次在全部请求结束后再重试几轮；
+    仍有失败时抛出DownloadError且不提交 (自行借用的连接会回滚)，
+    避免在区间中间留下缺口——download()只补齐已有数据之前和之后的部分，无法发现中间的缺口
     
     参数:
         symbol: 交易对，如 'BTCUSDT'
         interval: K线间隔，如 '1h'
         start_date: 开始日期（datetime对象）
         end_date: 结束日期（datetime对象）
+        connection: 数据库连接；传入时只插入不提交，由调用方统一commit，
+                    否则从连接池借用连接并在结束时提交
     """
     # 转换为时间戳（毫秒）
     start_ts = int(start_date.timestamp() * 1000)
@@ -257,106 +421,165 @@ def download_historical_data(symbol, interval, start_date, end_date):
     print(f"⏰ K线周期: {interval}")
     print(f"📅 时间范围: {start_date.strftime('%Y-%m-%d %H:%M:%S')} 至 {end_date.strftime('%Y-%m-%d %H:%M:%S')}")
     
-    # 分批下载数据（币安API每次最多返回1000条记录）
-    current_start_ts = start_ts
+    # 划分批次（币安API每次最多返回1000条记录）
+    batch_span = interval_to_ms(interval) * 1000
+    batches = [
+        (batch_start, min(batch_start + batch_span - 1, end_ts))
+        for batch_start in range(start_ts, end_ts, batch_span)
+    ]
+    print(f"⚙️ 共 {len(batches)} 批数据，最多 {MAX_CONCURRENT_REQUESTS} 批并发下载...")
+    
     total_records = 0
-    batch_count = 0
     
-    while current_start_ts < end_ts:
-        batch_count += 1
-        print(f"⚙️ 下载第 {batch_count} 批数据...")
-        
-        # 获取当前批次的数据
-        klines = get_klines(symbol, interval, current_start_ts, end_ts, 1000)
-        
-        if not klines:
-            print("❌ 未获取到数据，可能已达到API限制，等待60秒后重试...")
-            time.sleep(60)  # 遇到问题时等待更长时间
-            # 重试一次
-            klines = get_klines(symbol, interval, current_start_ts, end_ts, 1000)
-            if not klines:
-                print("❌ 重试失败，跳过")
-                break
+    # 整段下载共用一个数据库连接，各批只插入不提交，结束时统一commit
+    own_connection = connection is None
+    if own_connection:
+        connection = get_db_connection()
+    
+    async def fetch_and_save(session, semaphore, batches):
+        """并发下载并保存一组批次，返回失败的批次"""
+        nonlocal total_records
         
-        # 保存到数据库
-        save_klines_to_db(symbol, interval, klines)
+        async def fetch(batch):
+            return batch, await fetch_klines(session, semaphore, symbol, interval, *batch)
         
-        total_records += len(klines)
+        failed = []
+        for task in asyncio.as_completed([fetch(batch) for batch in batches]):
+            batch, klines = await task
+            if klines is None:
+                failed.append(batch)
+            elif klines:
+                # 保存到数据库
+                if not save_klines_to_db(symbol, interval, klines, connection):
+                    raise DownloadError("K线数据写入数据库失败")
+                total_records += len(klines)
+        return sorted(failed)
+    
+    try:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        connector = aiohttp.TCPConnector(limit=16)
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(connector=connector, headers=headers, timeout=timeout) as session:
+            failed = await fetch_and_save(session, semaphore, batches)
+            for _ in range(FAILED_BATCH_RETRY_ROUNDS):
+                if not failed:
+                    break
+                print(f"⚠️ 有 {len(failed)} 批数据下载失败，{FAILED_BATCH_RETRY_DELAY_SECS}秒后重新下载...")
+                await asyncio.sleep(FAILED_BATCH_RETRY_DELAY_SECS)
+                failed = await fetch_and_save(session, semaphore, failed)
         
-        # 更新起始时间为最后一条记录的收盘时间 + 1毫秒
-        current_start_ts = klines[-1][6] + 1
+        if failed:
+            first_failed = datetime.datetime.fromtimestamp(failed[0][0] / 1000)
+            raise DownloadError(
+                f"有 {len(failed)} 批数据重试后仍下载失败 (最早一批从 {first_failed.strftime('%Y-%m-%d %H:%M:%S')} 开始)，"
+                "本次下载未提交"
+            )
         
-        # 添加延时以避免API请求限制
-        time.sleep(1)
+        if own_connection:
+            connection.commit()
+    except BaseException:
+        if own_connection:
+            connection.rollback()
+        raise
+    finally:
+        if own_connection:
+            connection.close()
     
     print(f"✅ 总共下载并保存了 {total_records} 条K线数据")
 
-def main():
+def download_historical_data(symbol, interval, start_date, end_date, connection=None):
     """
-    主函数
+    下载指定时间范围内的历史数据 (download_historical_data_async的同步入口)
+    """
+    asyncio.run(download_historical_data_async(symbol, interval, start_date, end_date, connection))
+
+def download(
+    symbol: str = "btcusdt",
+    interval: str = "1h",
+    start: datetime.datetime = datetime.datetime(2023, 1, 1),
+    end: datetime.datetime = datetime.datetime(2024, 5, 1)
+) -> bool:
+    """
+    下载指定标的和周期的历史K线并保存到数据库，已有数据时只补齐缺失的部分
+    
+    可在其他脚本中直接导入调用，与调用方共用同一个Python进程
+    
+    参数:
+        symbol: vnpy中的交易对 (小写)，如 'btcusdt'
+        interval: K线周期，如 '1h'、'1m' (币安API与vnpy格式相同)
+        start: 开始日期（datetime对象）
+        end: 结束日期（datetime对象）
+    返回:
+        数据是否已覆盖所需的完整时间范围
     """
     try:
-        print("=" * 60)
-        print("币安BTC历史数据下载工具 - VNPY兼容版")
-        print("=" * 60)
-        
         # 创建数据库和表
         if not create_database_and_table():
             print("❌ 数据库初始化失败，下载终止")
-            return
+            return False
         
-        # 数据参数 - 与回测脚本保持一致
-        symbol = "BTCUSDT"  # 币安API需要大写
-        vnpy_symbol = "btcusdt"  # vnpy使用小写
-        interval = "1h"     # 1小时K线，币安API使用的格式
-        vnpy_interval = "1h"  # vnpy中的间隔格式
+        # 数据参数
+        vnpy_symbol = symbol.lower()  # vnpy使用小写
+        symbol = symbol.upper()       # 币安API需要大写
+        vnpy_interval = interval      # vnpy中的间隔格式与币安API相同
         
         # 检查现有数据
         min_date, max_date, count = check_existing_data(vnpy_symbol, vnpy_interval)
         
-        # 定义下载时间范围 - 与回测脚本保持一致
+        # 定义下载时间范围
         now = datetime.datetime.now()
-        end_date = datetime.datetime(2024, 5, 1)  # 回测脚本中的结束时间
+        end_date = end
         
         # 如果结束时间在未来，设为当前时间
         if end_date > now:
             end_date = now
             
-        start_date = datetime.datetime(2023, 1, 1)  # 回测脚本中的开始时间
+        start_date = start
         
-        # 如果已有数据，只下载缺失的部分
-        if count > 0:
-            # 检查是否需要下载历史数据（早于现有数据的部分）
-            if min_date and min_date > start_date:
-                print(f"📥 下载早期数据: {start_date.strftime('%Y-%m-%d')} 至 {min_date.strftime('%Y-%m-%d')}...")
-                download_historical_data(symbol, interval, start_date, min_date)
+        # 本次运行的所有时间段共用一个连接，全部下载完成后只提交一次
+        connection = get_db_connection()
+        try:
+            # 如果已有数据，只下载缺失的部分
+            if count > 0:
+                # 检查是否需要下载历史数据（早于现有数据的部分）
+                if min_date and min_date > start_date:
+                    print(f"📥 下载早期数据: {start_date.strftime('%Y-%m-%d')} 至 {min_date.strftime('%Y-%m-%d')}...")
+                    download_historical_data(symbol, interval, start_date, min_date, connection)
             
-            # 检查是否需要下载最新数据（晚于现有数据的部分）
-            if max_date and max_date < end_date:
-                print(f"📥 下载最新数据: {max_date.strftime('%Y-%m-%d')} 至 {end_date.strftime('%Y-%m-%d')}...")
-                download_historical_data(symbol, interval, max_date, end_date)
+                # 检查是否需要下载最新数据（晚于现有数据的部分）
+                if max_date and max_date < end_date:
+                    print(f"📥 下载最新数据: {max_date.strftime('%Y-%m-%d')} 至 {end_date.strftime('%Y-%m-%d')}...")
+                    download_historical_data(symbol, interval, max_date, end_date, connection)
                 
-            if min_date <= start_date and max_date >= end_date:
-                print("✅ 数据库中已有所需的完整数据，无需下载")
-        else:
-            # 如果没有数据，分段下载完整历史
-            # 将长时间段分成多个较短的时间段，以避免API限制
-            segments = []
+                if min_date <= start_date and max_date >= end_date:
+                    print("✅ 数据库中已有所需的完整数据，无需下载")
+            else:
+                # 如果没有数据，分段下载完整历史
+                # 将长时间段分成多个较短的时间段，以避免API限制
+                segments = []
             
-            # 每次下载3个月数据
-            current_date = start_date
-            while current_date < end_date:
-                next_date = current_date + datetime.timedelta(days=90)
-                if next_date > end_date:
-                    next_date = end_date
-                segments.append((current_date, next_date))
-                current_date = next_date
+                # 每次下载3个月数据
+                current_date = start_date
+                while current_date < end_date:
+                    next_date = current_date + datetime.timedelta(days=90)
+                    if next_date > end_date:
+                        next_date = end_date
+                    segments.append((current_date, next_date))
+                    current_date = next_date
             
-            print(f"📥 下载完整历史数据，分为{len(segments)}个时间段...")
+                print(f"📥 下载完整历史数据，分为{len(segments)}个时间段...")
             
-            for i, (seg_start, seg_end) in enumerate(segments):
-                print(f"📥 下载第{i+1}/{len(segments)}段: {seg_start.strftime('%Y-%m-%d')} 至 {seg_end.strftime('%Y-%m-%d')}...")
-                download_historical_data(symbol, interval, seg_start, seg_end)
+                for i, (seg_start, seg_end) in enumerate(segments):
+                    print(f"📥 下载第{i+1}/{len(segments)}段: {seg_start.strftime('%Y-%m-%d')} 至 {seg_end.strftime('%Y-%m-%d')}...")
+                    download_historical_data(symbol, interval, seg_start, seg_end, connection)
+        
+            connection.commit()
+        except BaseException:
+            # 任一段下载失败时整次运行都不提交，重新运行时从同样的已有数据范围开始补齐
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
         
         print("✅ 数据下载完成")
         
@@ -370,12 +593,29 @@ def main():
         # 检查是否覆盖了回测所需的时间范围
         if final_min_date and final_max_date and final_min_date <= start_date and final_max_date >= end_date:
             print("✅ 数据已覆盖回测所需的完整时间范围")
-        else:
-            print("⚠️ 数据可能未完全覆盖回测所需的时间范围，请检查")
+            return True
+        print("⚠️ 数据可能未完全覆盖回测所需的时间范围，请检查")
+        return False
+    
+    except DownloadError as e:
+        print(f"❌ {e}，请稍后重新运行")
+        return False
             
     except Exception as e:
         print(f"❌ 程序执行出错: {e}")
         traceback.print_exc()
+        return False
+
+def main():
+    """
+    主函数
+    """
+    print("=" * 60)
+    print("币安BTC历史数据下载工具 - VNPY兼容版")
+    print("=" * 60)
+    
+    # 数据参数 - 与回测脚本保持一致
+    download("btcusdt", "1h", datetime.datetime(2023, 1, 1), datetime.datetime(2024, 5, 1))
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file